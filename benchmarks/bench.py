@@ -0,0 +1,354 @@
+"""**romscom benchmark suite**
+
+Times the main romscom code paths (cold start of the package and of the
+romscom command, parameter file reading, standard input rendering, time
+conversion, log parsing, restart and history file lookup, and a dry-run
+runtodate cycle) on synthetic inputs, and saves the results to a
+JSON file named for the current git commit, so different commits can be
+compared:
+
+    python benchmarks/bench.py                      # quick scale
+    python benchmarks/bench.py --scale full         # large inputs (multi-GB log)
+    python benchmarks/bench.py --compare benchmarks/results/<old>.json
+
+Synthetic inputs are generated once per scale (under --workdir) and reused.
+Only the baseline romscom functions and signatures are used, so the script can
+be run against older commits too.  Everything runs offline.
+"""
+
+import argparse
+import contextlib
+import copy
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import netCDF4 as nc
+import numpy as np
+import yaml
+
+import romscom.romscom as rc
+import romscom.rcutils as r
+
+here = os.path.dirname(os.path.abspath(__file__))
+example = os.path.join(here, '..', 'examples', 'bio_toy', 'roms_bio_toy_npzd.yaml')
+
+scales = {
+    'quick': {'grids': 3, 'stations': 1000, 'frcfiles': 20, 'frcparts': 50,
+              'logmb': 20, 'nrst': 50, 'nhis': 100, 'repeat': 5},
+    'full':  {'grids': 10, 'stations': 5000, 'frcfiles': 50, 'frcparts': 200,
+              'logmb': 2048, 'nrst': 300, 'nhis': 500, 'repeat': 3},
+}
+
+# Synthetic input generation
+
+def makeparams(grids, stations, frcfiles, frcparts):
+    """
+    Parameter dictionary with many nested grids, stations, and forcing files
+
+    Args:
+        grids (int): number of nested grids
+        stations (int): number of POS stations
+        frcfiles (int): number of forcing files (NFFILES)
+        frcparts (int): number of files in each forcing multi-file entry
+
+    Returns:
+        (OrderedDict): ROMS parameter dictionary (ROMS format)
+    """
+    d = rc.readparamfile(example)
+
+    # Per-grid values: scalars become one value per grid, lists are repeated
+    skip = set(d['no_plural']) | set(r.timefieldlist(d)) | {'DT', 'DSTART', 'TIME_REF'}
+    for k, v in d.items():
+        if k in skip or isinstance(v, str):
+            continue
+        if isinstance(v, (bool, int, float)):
+            d[k] = [v]*grids
+        elif isinstance(v, list):
+            d[k] = v*grids
+        elif isinstance(v, dict):
+            for kk, vv in v.items():
+                v[kk] = vv*grids if isinstance(vv, list) else [vv]*grids
+    d['Ngrids'] = grids
+
+    rng = np.random.default_rng(0)
+    pos = []
+    for ii in range(stations):
+        if ii % 2:
+            pos.append([1, 1, float(rng.uniform(-180, 180)), float(rng.uniform(-90, 90))])
+        else:
+            pos.append([1, 0, int(rng.integers(0, 500)), int(rng.integers(0, 500))])
+    d['NSTATION'] = stations
+    d['POS'] = pos
+
+    d['NFFILES'] = frcfiles
+    d['FRCNAME'] = [[f"Data/frc_{ii:03d}_{jj:04d}.nc" for jj in range(frcparts)]
+                    for ii in range(frcfiles)]
+    return d
+
+def makelog(fname, mb):
+    """
+    Synthetic ROMS standard output log
+
+    Args:
+        fname (string): file name
+        mb (int): approximate size, in MB
+    """
+    header = " STEP   Day HH:MM:SS  KINETIC_ENRG   POTEN_ENRG    TOTAL_ENRG    NET_VOLUME\n"
+    row = "{:9d} {:5d} {:02d}:{:02d}:00  1.234567E-03  6.469846E+02  6.469846E+02  8.000000E+03\n"
+    target = mb*1024**2
+    step = 0
+    with open(fname, 'w') as f:
+        f.write(" Model Input Parameters:  ROMS/TOMS version 4.1\n\n" + header)
+        while f.tell() < target:
+            lines = []
+            for ii in range(100000):
+                lines.append(row.format(step, step//24, step % 24, 0))
+                step += 1
+                if step % 10000 == 0:
+                    lines.append(f"       DEF_HIS     - creating history file,  bench_his_{step//10000:04d}.nc\n")
+            f.write(''.join(lines))
+        f.write("\n Elapsed CPU time (seconds):\n\n Node   #  0 CPU:     100.000\n"
+                " Total:               100.000\n\n ROMS/TOMS: DONE... \n")
+
+def makeoutput(folder, simname, nrst, nhis):
+    """
+    Folder of synthetic restart and history files
+
+    Args:
+        folder (string): output folder
+        simname (string): simulation name
+        nrst (int): number of restart files (simname_XX_rst.nc)
+        nhis (int): number of history files (simname_his_XXXX.nc), 10
+            daily records each
+
+    Returns:
+        (string): initialization file name
+    """
+    os.makedirs(folder, exist_ok=True)
+    units = 'seconds since 1900-01-01 00:00:00'
+    t0 = (datetime(2000, 1, 1) - datetime(1900, 1, 1)).total_seconds()
+
+    def write(fn, times):
+        with nc.Dataset(fn, 'w') as f:
+            f.createDimension('ocean_time', None)
+            v = f.createVariable('ocean_time', 'f8', ('ocean_time',))
+            v.units = units
+            v.calendar = 'proleptic_gregorian'
+            v[:] = times
+
+    for ii in range(nhis):
+        write(os.path.join(folder, f"{simname}_his_{ii:04d}.nc"),
+              t0 + (np.arange(10) + ii*10)*86400.0)
+    for ii in range(nrst):
+        write(os.path.join(folder, f"{simname}_{ii+1:02d}_rst.nc"),
+              t0 + np.array([ii+1, ii+1.5])*86400.0)
+
+    ini = os.path.join(folder, '..', 'ini.nc')
+    write(ini, [t0])
+    return os.path.abspath(ini)
+
+def makeinputs(workdir, params):
+    """
+    Generate (or reuse) all synthetic inputs in a folder
+
+    Args:
+        workdir (string): folder for inputs
+        params (dict): scale parameters (see scales)
+
+    Returns:
+        (dict): input file and folder names
+    """
+    files = {'yaml': os.path.join(workdir, 'params.yaml'),
+             'log': os.path.join(workdir, 'log.txt'),
+             'sim': os.path.join(workdir, 'sim'),
+             'ini': os.path.join(workdir, 'sim', 'ini.nc')}
+    stamp = os.path.join(workdir, 'inputs.json')
+    if os.path.isfile(stamp):
+        with open(stamp) as f:
+            if json.load(f) == params:
+                return files
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+
+    print(f"Generating synthetic inputs in {workdir}")
+    d = makeparams(params['grids'], params['stations'], params['frcfiles'], params['frcparts'])
+    with open(files['yaml'], 'w') as f:
+        yaml.safe_dump(json.loads(json.dumps(d)), f, sort_keys=False)
+    makelog(files['log'], params['logmb'])
+    makeoutput(os.path.join(files['sim'], 'Out'), 'bench', params['nrst'], params['nhis'])
+
+    with open(stamp, 'w') as f:
+        json.dump(params, f)
+    return files
+
+# Timing
+
+def timeit(fn, setup=None, repeat=5):
+    """
+    Time a function
+
+    Args:
+        fn (function): function to time, called with the arguments returned
+            by setup
+        setup (function, optional): called (untimed) before each repetition;
+            returns a tuple of arguments for fn
+        repeat (int, optional): number of repetitions
+
+    Returns:
+        (dict): `min` and `median` times (seconds), and `repeat`
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+    return {'min': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+def runbenchmarks(files, repeat):
+    """
+    Run all benchmarks
+
+    Args:
+        files (dict): synthetic inputs (see makeinputs)
+        repeat (int): repetitions per benchmark
+
+    Returns:
+        (dict): timing results (see timeit), keyed by benchmark name
+    """
+    d = rc.readparamfile(files['yaml'])
+    dtime = copy.deepcopy(d)
+    rc.converttimes(dtime, "time")
+    out = os.path.join(files['sim'], 'Out')
+    sidecar = os.path.join(out, '.romscom_timeindex.json')
+
+    def nosidecar():
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+        return ()
+
+    def dryrun():
+        o = copy.deepcopy(dtime)
+        o['ININAME'] = files['ini']
+        with contextlib.redirect_stdout(io.StringIO()):
+            rc.runtodate(o, files['sim'], 'bench', o['DSTART'] + timedelta(days=1000),
+                         dryrunflag=True)
+
+    def subprocess_(*cmd):
+        # Cold start: a fresh interpreter, so import costs are included
+        return lambda: subprocess.run([sys.executable] + list(cmd), check=True,
+                                      stdout=subprocess.DEVNULL)
+
+    benches = [
+        ('python_startup', subprocess_('-c', 'pass'), None),
+        ('import_cold', subprocess_('-c', 'import romscom.romscom'), None),
+        ('readparamfile', lambda: rc.readparamfile(files['yaml']), None),
+        ('stringifyvalues', lambda: rc.stringifyvalues(d), None),
+        ('stringifyvalues_compress', lambda: rc.stringifyvalues(d, compress=True), None),
+        ('dict2standardin', lambda: rc.dict2standardin(d), None),
+        ('converttimes_time', lambda x: rc.converttimes(x, "time"), lambda: (copy.deepcopy(d),)),
+        ('converttimes_roms', lambda x: rc.converttimes(x, "ROMS"), lambda: (copy.deepcopy(dtime),)),
+        ('parseromslog', lambda: r.parseromslog(files['log']), None),
+        ('parserst', lambda: r.parserst(os.path.join(out, 'bench')), None),
+        ('findclosesttime_cold', lambda: r.findclosesttime(out, datetime(2001, 6, 1)), nosidecar),
+        ('findclosesttime_warm', lambda: r.findclosesttime(out, datetime(2001, 6, 1)), None),
+        ('runtodate_dryrun', dryrun, None),
+    ]
+    if importlib.util.find_spec('romscom.cli'):
+        benches.insert(2, ('cli_render_cold', subprocess_('-m', 'romscom.cli', 'render', files['yaml'],
+                                                          '-o', os.devnull), None))
+
+    results = {}
+    for name, fn, setup in benches:
+        res = timeit(fn, setup=setup, repeat=repeat)
+        results[name] = res
+        print(f"  {name:28s} min {res['min']:10.4f} s   median {res['median']:10.4f} s")
+    return results
+
+def gitcommit():
+    """
+    Current git commit of the repository
+
+    Returns:
+        (string): short commit hash, with '-dirty' appended if there are
+            uncommitted changes to tracked files ('unknown' outside git)
+    """
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=here, capture_output=True, text=True).stdout.strip()
+        return sha + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(new, old):
+    """
+    Print a comparison of two benchmark result files
+
+    Args:
+        new (dict): current results
+        old (dict): reference results
+    """
+    print(f"\nComparison with {old['commit']} (median, new/old):")
+    for name, res in new['results'].items():
+        if name in old['results']:
+            ratio = res['median']/old['results'][name]['median']
+            print(f"  {name:28s} {old['results'][name]['median']:10.4f} -> {res['median']:10.4f} s  ({ratio:6.2f}x)")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Time romscom hot paths on synthetic inputs")
+    p.add_argument('--scale', choices=sorted(scales), default='quick',
+                   help="size of synthetic inputs (default quick)")
+    p.add_argument('--workdir', default=None,
+                   help="folder for synthetic inputs (default: system temp folder)")
+    p.add_argument('--results', default=os.path.join(here, 'results'),
+                   help="folder for result files (default benchmarks/results)")
+    p.add_argument('--repeat', type=int, default=None, help="repetitions per benchmark")
+    p.add_argument('--compare', default=None, help="earlier result file to compare against")
+    for k in ('grids', 'stations', 'frcfiles', 'frcparts', 'logmb', 'nrst', 'nhis'):
+        p.add_argument(f'--{k}', type=int, default=None, help=f"override scale's {k}")
+    args = p.parse_args(argv)
+
+    params = dict(scales[args.scale])
+    for k in params:
+        if getattr(args, k, None) is not None:
+            params[k] = getattr(args, k)
+    repeat = params.pop('repeat')
+
+    workdir = args.workdir or os.path.join(os.environ.get('TMPDIR', '/tmp'), f"romscom-bench-{args.scale}")
+    files = makeinputs(workdir, params)
+
+    commit = gitcommit()
+    print(f"Running benchmarks (commit {commit}, scale {args.scale})")
+    warnings.simplefilter('ignore')
+    results = runbenchmarks(files, repeat)
+
+    rec = {'commit': commit, 'date': datetime.now().isoformat(timespec='seconds'),
+           'scale': args.scale, 'params': params,
+           'python': platform.python_version(), 'platform': platform.platform(),
+           'numpy': np.__version__, 'netCDF4': nc.__version__, 'pyyaml': yaml.__version__,
+           'results': results}
+
+    os.makedirs(args.results, exist_ok=True)
+    fname = os.path.join(args.results, f"{commit}_{args.scale}.json")
+    with open(fname, 'w') as f:
+        json.dump(rec, f, indent=1)
+    print(f"Results saved to {fname}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(rec, json.load(f))
+
+if __name__ == '__main__':
+    main()
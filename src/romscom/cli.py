@@ -0,0 +1,214 @@
+"""**ROMS Communication Module command line interface**
+
+This module provides the `romscom` command, installed with the package, which
+exposes the most common romscom tasks without writing a python script:
+
+- `romscom render PARAMFILE`: convert a YAML parameter file to ROMS standard
+  input (see romscom.writestandardin)
+- `romscom status SIMDIR SIMNAME`: summarize the progress of a runtodate
+  simulation, from its run-state manifest
+- `romscom run PARAMFILE SIMDIR SIMNAME ENDDATE`: run a simulation through
+  the end date (see romscom.runtodate)
+- `romscom dry-run PARAMFILE SIMDIR SIMNAME ENDDATE`: same as run, but only
+  prepare the I/O, without calling ROMS
+
+Run `romscom <command> --help` for the options of each command.  The command
+starts quickly because only the modules needed by the chosen command are
+loaded (e.g. netCDF4 and numpy are never imported to render a typical
+parameter file).
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+
+def main(argv=None):
+    """
+    Entry point of the romscom command
+
+    Args:
+        argv (list of strings, optional): command line arguments, not
+            including the program name.  Default is sys.argv[1:]
+
+    Returns:
+        (int): exit status; 0 on success (or completed dry run), 1 otherwise
+    """
+    args = _parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # Output piped to a command that stopped reading (e.g. head); silence
+        # the error python would otherwise raise again when flushing stdout
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+def _parser():
+    # Argument parser, with one subcommand per task
+
+    p = argparse.ArgumentParser(prog='romscom',
+                                description="ROMS Communication Toolbox")
+    sub = p.add_subparsers(dest='command', metavar='command', required=True)
+
+    pr = sub.add_parser('render', help="convert a YAML parameter file to ROMS standard input",
+                        description="Convert a YAML parameter file to ROMS standard input")
+    pr.add_argument('paramfile', help="YAML parameter file")
+    pr.add_argument('-o', '--output', default='-',
+                    help="standard input file to write (default: print to stdout)")
+    pr.add_argument('--compress', action='store_true',
+                    help="compress repeated values (e.g. T T T -> 3*T)")
+    pr.add_argument('--no-cache', dest='cache', action='store_false',
+                    help="always parse the YAML, rather than reusing a cached parse (see rcutils.cachedparse)")
+    pr.set_defaults(func=_render)
+
+    ps = sub.add_parser('status', help="summarize the progress of a simulation",
+                        description="Summarize the progress of a runtodate simulation")
+    ps.add_argument('simdir', help="simulation folder")
+    ps.add_argument('simname', help="simulation base name")
+    ps.add_argument('--json', action='store_true',
+                    help="print the status as JSON")
+    ps.set_defaults(func=_status)
+
+    for name, dry in (('run', False), ('dry-run', True)):
+        desc = ("Prepare the I/O for a simulation through the end date, without calling ROMS" if dry else
+                "Run a simulation through the end date, restarting where it left off")
+        pp = sub.add_parser(name, help=desc[0].lower() + desc[1:], description=desc)
+        pp.add_argument('paramfile', help="YAML parameter file")
+        pp.add_argument('simdir', help="folder where I/O subfolders are found/created")
+        pp.add_argument('simname', help="simulation base name")
+        pp.add_argument('enddate', type=datetime.fromisoformat,
+                        help="simulation end date (ISO format, e.g. 2010-01-01)")
+        pp.add_argument('--romscmd', default="mpirun romsM",
+                        help="command used to call the ROMS executable (default: '%(default)s')")
+        pp.add_argument('--dtslow', type=float,
+                        help="time step used during slow-stepping periods, seconds (default: half of DT)")
+        pp.add_argument('--addcounter', default='most',
+                        help="output types to add a counter to: all, most (default), none, or a comma-separated list of prefixes")
+        pp.add_argument('--count', type=int, default=1,
+                        help="starting index for the file counter (default: 1)")
+        pp.add_argument('--compress', action='store_true',
+                        help="compress repeated values in the standard input files")
+        pp.add_argument('--no-runpastblowup', dest='runpastblowup', action='store_false',
+                        help="stop at the first blowup, rather than reducing the time step")
+        pp.add_argument('--monitor', action='store_true',
+                        help="watch the ROMS log while it runs, and stop ROMS as soon as it blows up")
+        pp.add_argument('--maxke', type=float,
+                        help="when monitoring, kinetic energy above which ROMS is treated as blown up")
+        pp.add_argument('--prometheus', action='store_true',
+                        help="also write block metrics in Prometheus text format")
+        pp.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="always parse the YAML, rather than reusing a cached parse (see rcutils.cachedparse)")
+        pp.set_defaults(func=_run, dryrunflag=dry)
+
+    return p
+
+def _render(args):
+    import romscom.romscom as rc
+
+    d = rc.readparamfile(args.paramfile, cache=args.cache)
+    if args.output == '-':
+        rc.writestandardin(d, sys.stdout, compress=args.compress)
+    else:
+        rc.writestandardin(d, args.output, compress=args.compress)
+    return 0
+
+def _status(args):
+    import romscom.rcutils as r
+    import romscom.romscom as rc
+
+    fol = rc.simfolders(args.simdir)
+    filebase = os.path.join(fol['out'], args.simname)
+    m = r.readmanifest(os.path.join(fol['log'], f"{args.simname}_manifest.json"))
+
+    # Restart file from the manifest, falling back on a scan of the restart
+    # files if the manifest is missing or out of date
+
+    rst = r.manifestrestart(m, filebase)
+    if rst is None:
+        rst = r.parserst(filebase)
+        rst = {'lastfile': rst['lastfile'] or None, 'count': rst['count'], 'time': None}
+        source = 'restart files'
+    else:
+        source = 'manifest'
+
+    blocks = m['blocks'] if m else []
+    status = {
+        'simname': args.simname,
+        'simdir': os.path.abspath(args.simdir),
+        'source': source,
+        'restartfile': rst['lastfile'],
+        'count': rst['count'],
+        'time': rst['time'].isoformat() if rst['time'] else None,
+        'blocks': len(blocks),
+        'laststatus': blocks[-1]['status'] if blocks else None,
+        'blowups': sum(1 for b in blocks if b['status'] == 'blowup'),
+        'slowsteps': m['slowsteps'] if m else [],
+        'lastmetrics': _lastline(os.path.join(fol['log'], f"{args.simname}_metrics.jsonl")),
+    }
+
+    if args.json:
+        json.dump(status, sys.stdout, indent=1)
+        print()
+        return 0
+
+    print(f"Simulation:   {status['simname']} ({status['simdir']})")
+    if status['restartfile']:
+        print(f"Restart file: {status['restartfile']} (from {source})")
+        print(f"Model time:   {status['time'] or 'unknown'}")
+    else:
+        print("Restart file: none")
+    print(f"Next counter: {status['count']}")
+    print(f"Blocks run:   {status['blocks']} ({status['blowups']} blowups)" +
+          (f", last {status['laststatus']}" if blocks else ""))
+    for t1, t2, dt in status['slowsteps']:
+        print(f"Slow-step:    {t1} to {t2}, dt = {dt:g} s")
+    mt = status['lastmetrics']
+    if mt:
+        print(f"Last block:   {mt.get('start')} to {mt.get('end')}, {mt.get('status')}, "
+              f"{mt.get('walltime', 0):.1f} s wall time")
+        if mt.get('modeldaysperhour'):
+            print(f"Throughput:   {mt['modeldaysperhour']:.2f} model days/hour")
+    return 0
+
+def _lastline(fname):
+    # Last JSON record of a metrics file, or None
+
+    if not os.path.isfile(fname):
+        return None
+    with open(fname, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 65536))
+        lines = f.read().splitlines()
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
+
+def _run(args):
+    import romscom.romscom as rc
+
+    ocean = rc.readparamfile(args.paramfile, cache=args.cache)
+    addcounter = args.addcounter
+    if addcounter not in ('all', 'most', 'none'):
+        addcounter = addcounter.split(',')
+
+    result = rc.runtodate(ocean, args.simdir, args.simname, args.enddate,
+                          dtslow=timedelta(seconds=args.dtslow) if args.dtslow else None,
+                          addcounter=addcounter,
+                          compress=args.compress,
+                          romscmd=args.romscmd.split(),
+                          dryrunflag=args.dryrunflag,
+                          count=args.count,
+                          runpastblowup=args.runpastblowup,
+                          monitor=args.monitor,
+                          maxke=args.maxke,
+                          prometheus=args.prometheus)
+    print(result)
+    return 0 if result in ('success', 'dryrun') else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,19 +4,37 @@ This module provides a number of small helper functions used by the primary roms
 functions.
 """
 
+import concurrent.futures
+import contextlib
 import glob
+import hashlib
+import json
 import os
+import pickle
 import re
+import signal
+import subprocess
+import threading
 import warnings
 from collections import OrderedDict
 from datetime import datetime, timedelta
 
-import netCDF4 as nc
-import numpy as np
-import yaml
+# Heavy dependencies (netCDF4, numpy, yaml) are imported inside the functions
+# that use them, so that importing romscom (e.g. for the command line tool)
+# stays fast
 
+_orderedloaders = {}
 
-def ordered_load(stream, Loader=yaml.SafeLoader, object_pairs_hook=OrderedDict):
+def _fastloader():
+    """
+    Fastest available YAML loader: libyaml-backed CSafeLoader when PyYAML was
+    built with it, pure-python SafeLoader otherwise
+    """
+    import yaml
+
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def ordered_load(stream, Loader=None, object_pairs_hook=OrderedDict):
     """
     This function was pulled from https://stackoverflow.com/questions/5121931/.
     It makes sure YAML dictionary loads preserve order, even in older
@@ -24,7 +42,8 @@ def ordered_load(stream, Loader=yaml.SafeLoader, object_pairs_hook=OrderedDict):
 
     Args:
         stream: input stream
-        loader: loader (default: yaml.SafeLoader)
+        loader: loader (default: yaml.CSafeLoader if available, otherwise
+            yaml.SafeLoader)
 
     usage example:
     ordered_load(stream, yaml.SafeLoader)
@@ -33,16 +52,142 @@ def ordered_load(stream, Loader=yaml.SafeLoader, object_pairs_hook=OrderedDict):
         (OrderedDict): dictionary
 
     """
+    import yaml
+
+    if Loader is None:
+        Loader = _fastloader()
+
+    # Build the ordered subclass once per loader/hook combination
+
+    key = (Loader, object_pairs_hook)
+    if key not in _orderedloaders:
+        class OrderedLoader(Loader):
+            pass
+        def construct_mapping(loader, node):
+            loader.flatten_mapping(node)
+            return object_pairs_hook(loader.construct_pairs(node))
+        OrderedLoader.add_constructor(
+            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+            construct_mapping)
+        _orderedloaders[key] = OrderedLoader
+
+    return yaml.load(stream, _orderedloaders[key])
+
+def defaultcachedir():
+    """
+    Default location of the romscom parse cache
+
+    Returns:
+        (string): value of the ROMSCOM_CACHE environment variable if set,
+            otherwise ~/.cache/romscom
+    """
+    return os.environ.get('ROMSCOM_CACHE',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'romscom'))
+
+def cachedparse(filename, parser, cachedir=None, maxbytes=256*1024**2):
+    """
+    Parse a file, reusing a serialized copy of the result when the file is
+    unchanged
+
+    Parsed results are pickled to the cache folder, keyed by the file's
+    absolute path and the name of the parser.  An entry is reused without
+    reading the source file if the file's modification time and size match
+    those recorded in the entry; otherwise the file contents are hashed, and the
+    entry is reused only if the hash matches.  When the cache folder grows
+    beyond maxbytes, the least-recently-used entries are removed.
+
+    Args:
+        filename (string): name of file to parse
+        parser (function): function that accepts the file contents (bytes) and
+            returns the parsed data.  Must be a named function (the name is
+            part of the cache key) and its output must be picklable.
+        cachedir (string, optional): cache folder.  Default is given by
+            defaultcachedir()
+        maxbytes (int, optional): size limit of the cache folder, in bytes.
+            Default = 256 MB
+
+    Returns:
+        parsed data, as returned by parser
+    """
+    if cachedir is None:
+        cachedir = defaultcachedir()
+
+    fname = os.path.abspath(filename)
+    st = os.stat(fname)
+    key = hashlib.sha1(f"{fname}|{parser.__module__}.{parser.__qualname__}".encode()).hexdigest()
+    entry = os.path.join(cachedir, f"{key}.pkl")
+
+    # Entries hold a small header followed by the pickled data, so staleness
+    # can be checked without unpickling the data
 
-    class OrderedLoader(Loader):
-        pass
-    def construct_mapping(loader, node):
-        loader.flatten_mapping(node)
-        return object_pairs_hook(loader.construct_pairs(node))
-    OrderedLoader.add_constructor(
-        yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-        construct_mapping)
-    return yaml.load(stream, OrderedLoader)
+    hdr = None
+    if os.path.isfile(entry):
+        try:
+            with open(entry, 'rb') as f:
+                hdr = pickle.load(f)
+                if (hdr['mtime'] == st.st_mtime_ns) and (hdr['size'] == st.st_size):
+                    data = pickle.load(f)
+                    os.utime(entry)
+                    return data
+        except Exception:
+            hdr = None
+
+    with open(fname, 'rb') as f:
+        content = f.read()
+    fhash = hashlib.sha256(content).hexdigest()
+
+    data = None
+    if (hdr is not None) and (hdr['hash'] == fhash):
+        try:
+            with open(entry, 'rb') as f:
+                pickle.load(f)
+                data = pickle.load(f)
+        except Exception:
+            data = None
+    if data is None:
+        data = parser(content)
+
+    # Write entry atomically, then trim the cache
+
+    hdr = {'path': fname, 'mtime': st.st_mtime_ns, 'size': st.st_size, 'hash': fhash}
+    try:
+        os.makedirs(cachedir, exist_ok=True)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(hdr, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, entry)
+        trimcache(cachedir, maxbytes)
+    except OSError as e:
+        warnings.warn(f"Could not write parse cache entry for {fname}: {e}")
+
+    return data
+
+def trimcache(cachedir, maxbytes):
+    """
+    Remove least-recently-used entries from a parse cache folder
+
+    Args:
+        cachedir (string): cache folder
+        maxbytes (int): maximum total size of cache entries, in bytes
+    """
+    entries = []
+    for fn in glob.glob(os.path.join(cachedir, "*.pkl")):
+        try:
+            st = os.stat(fn)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, fn))
+
+    total = sum(x[1] for x in entries)
+    for _, sz, fn in sorted(entries):
+        if total <= maxbytes:
+            break
+        try:
+            os.remove(fn)
+            total -= sz
+        except OSError:
+            pass
 
 def bool2str(x):
     """
@@ -97,11 +242,34 @@ def consecutive(data, stepsize=0):
         >>> consecutive([1, 1, 1, 2, 2, 4, 5], 1)
         [[1], [1], [1, 2], [2], [4, 5]]
     """
+    import numpy as np
+
     data = np.array(data)
     tmp = np.split(data, np.where(np.diff(data) != stepsize)[0]+1)
     tmp = [x.tolist() for x in tmp]
     return tmp
 
+def floats2str(x):
+    """
+    Formats a list of floats as Fortran-style double-precision strings
+
+    Equivalent to [float2str(i) for i in x], without the per-element function
+    call overhead.
+
+    Args:
+        x (list of floats): input values
+
+    Returns:
+        (list of strings): values in Fortran double-precision syntax
+    """
+    return [y.replace('e','d') if 'e' in y else y + 'd0' for y in map(repr, x)]
+
+# Lists at least this long are grouped with numpy (see list2str); shorter ones,
+# the vast majority in a parameter file, are faster (and don't need numpy
+# loaded) in pure python
+
+_list2strvectorized = 256
+
 def list2str(tmp, consecstep=-99999):
     """
     Convert list of bools, floats, or integers to string
@@ -116,37 +284,125 @@ def list2str(tmp, consecstep=-99999):
     Returns:
         (string): ROMS-appropriate string version of list values
     """
-    if not (all(isinstance(x, float) for x in tmp) or
-            all(isinstance(x, bool)  for x in tmp) or
-            all(isinstance(x, int)   for x in tmp) or
-            all(isinstance(x, str)   for x in tmp)):
+    # Type detection: one pass over the elements, then checks on the (usually
+    # single) element type found
+
+    types = set(map(type, tmp))
+    if not (all(issubclass(t, float) for t in types) or
+            all(issubclass(t, bool)  for t in types) or
+            all(issubclass(t, int)   for t in types) or
+            all(issubclass(t, str)   for t in types)):
         warnings.warn(f"Mixed data types found in list ({tmp}); skipping string conversion", stacklevel=2)
         return tmp
 
     if isinstance(tmp[0], str):
-        y = ' '.join(tmp)
+        return ' '.join(tmp)
+
+    # Bools mixed with integers are written as integers (True -> 1), as
+    # numpy would convert them
+
+    if (bool in types) and (len(types) > 1):
+        tmp = [int(x) for x in tmp]
+
+    # Run lengths of consecutive groups (see consecutive), and the first value
+    # of each group
+
+    if len(tmp) < _list2strvectorized:
+        starts = [0]
+        if isinstance(tmp[0], bool):
+            starts += [ii for ii in range(1, len(tmp)) if (tmp[ii] != tmp[ii-1]) != consecstep]
+        else:
+            starts += [ii for ii in range(1, len(tmp)) if tmp[ii] - tmp[ii-1] != consecstep]
+        counts = [b - a for a, b in zip(starts, starts[1:] + [len(tmp)])]
+        vals = [float(tmp[ii]) if isinstance(tmp[ii], float) else tmp[ii] for ii in starts]
     else:
+        import numpy as np
 
-        consec = consecutive(tmp, stepsize=consecstep)
+        data = np.array(tmp)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(data) != consecstep)+1))
+        counts = np.diff(np.append(starts, len(data))).tolist()
+        vals = data[starts].tolist()
 
-        consecstr = [None]*len(consec)
+    if isinstance(tmp[0], float):
+        vals = floats2str(vals)
+    elif isinstance(tmp[0], bool):
+        vals = [bool2str(x) for x in vals]
 
-        for ii in range(0, len(consec)):
-            n = len(consec[ii])
-            if isinstance(tmp[0], float):
-                sampleval = float2str(consec[ii][0])
-            elif isinstance(tmp[0], bool):
-                sampleval = bool2str(consec[ii][0])
-            else:
-                sampleval = consec[ii][0]
+    return ' '.join([f"{n}*{v}" if n > 1 else f"{v}" for n, v in zip(counts, vals)])
 
-            if n > 1:
-                consecstr[ii] = '{num}*{val}'.format(num=n,val=sampleval)
-            else:
-                consecstr[ii] = '{val}'.format(val=sampleval)
+_intpattern = re.compile(r"[+-]?\d+$")
+_floatpattern = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eEdD][+-]?\d+)?$")
 
-        y = ' '.join(consecstr)
-    return y
+def str2value(x):
+    """
+    Convert a single ROMS standard input value to its python equivalent
+
+    Args:
+        x (string): value in ROMS syntax, e.g. 'T', '30', or '1.0d-6'
+
+    Returns:
+        (bool, int, float, or string): T/F converted to booleans, integers to
+            int, Fortran-style floats (with d or e exponents) to float; any
+            other string is returned unchanged
+    """
+    if x == 'T':
+        return True
+    elif x == 'F':
+        return False
+    elif _intpattern.match(x):
+        return int(x)
+    elif _floatpattern.match(x):
+        return float(x.replace('d','e').replace('D','e'))
+    return x
+
+def str2list(x):
+    """
+    Convert a ROMS standard input value string to a list of python values
+
+    Repeated-value notation is expanded (e.g., '3*T F' -> [True, True, True,
+    False]).
+
+    Args:
+        x (string): whitespace-delimited values in ROMS syntax
+
+    Returns:
+        (list): values converted via str2value
+    """
+    vals = []
+    for tok in x.split():
+        n, star, v = tok.partition('*')
+        if star and n.isdigit():
+            vals.extend([str2value(v)]*int(n))
+        else:
+            vals.append(str2value(tok))
+    return vals
+
+def str2multifile(x):
+    """
+    Convert a ROMS multi-file string to a (possibly nested) list of file names
+
+    This is the inverse of multifile2str: file names separated by backslashes
+    are separate entries, and those joined by vertical bars are grouped into a
+    sub-list.
+
+    Args:
+        x (string): multi-file value from standard input
+
+    Returns:
+        (string or list): file name if only one is present, otherwise a list of
+            file names and lists of file names
+    """
+    groups = [[]]
+    for tok in re.findall(r"\\|\||[^\s\\|]+", x):
+        if tok == '\\':
+            groups.append([])
+        elif tok != '|':
+            groups[-1].append(tok)
+
+    files = [g[0] if len(g) == 1 else g for g in groups if g]
+    if len(files) == 1:
+        return files[0]
+    return files
 
 def multifile2str(tmp):
     """
@@ -168,6 +424,141 @@ def multifile2str(tmp):
     newstr = delim.join(tmp)
     return newstr
 
+def multifilelist(groups, timeref=None, nproc=None):
+    """
+    Build a multi-file parameter value from file name patterns
+
+    Each forcing group (one per input file counted by NFFILES, NBCFILES, or
+    NCLMFILES) is given as a glob pattern (or list of patterns and file
+    names).  The matching files are ordered by the time coverage of their time
+    variables (see readtimeaxes, which reads the files in parallel and caches
+    the results), so e.g. daily or monthly files are listed in the order ROMS
+    will need them regardless of their names.  A warning is issued if two
+    consecutive files in a group overlap in time.
+
+    Example:
+
+        ocean['FRCNAME'] = multifilelist(['frc/wind_*.nc', 'frc/rad_*.nc',
+                                          'frc/runoff_clim.nc'])
+        ocean['NFFILES'] = 3
+
+    Args:
+        groups (string or list): glob pattern, or list with one entry per
+            group, each a glob pattern or list of patterns/file names
+        timeref (datetime, optional): reference time for time variables whose
+            units don't include a reference date (ROMS TIME_REF)
+        nproc (int, optional): maximum number of processes used to read
+            files.  Default is the number of CPUs.
+
+    Returns:
+        (string or list): file name, or list with one entry per group, each a
+            file name (single-file groups) or a list of file names, in the
+            format used for multi-file parameters (see multifile2str)
+
+    Raises:
+        ValueError: if a pattern matches no files, or a file can't be read
+    """
+    import netCDF4 as nc
+
+    if isinstance(groups, str):
+        groups = [groups]
+
+    files = []
+    for g in groups:
+        pats = [g] if isinstance(g, str) else g
+        gfiles = []
+        for pat in pats:
+            matches = sorted(glob.glob(pat)) if glob.has_magic(pat) else [pat]
+            if not matches or not os.path.exists(matches[0]):
+                raise ValueError(f"No files match {pat}")
+            gfiles.extend(matches)
+        files.append(list(OrderedDict.fromkeys(gfiles)))
+
+    axes = readtimeaxes([f for g in files for f in g], nproc=nproc)
+
+    value = []
+    for g in files:
+        span = {}
+        for f in g:
+            if isinstance(axes[f], BaseException):
+                raise ValueError(f"Could not read time variables from {f}: {axes[f]}")
+            t = []
+            for ax in axes[f].values():
+                if ax['nrec'] == 0:
+                    continue
+                units = ax['units']
+                if 'since' not in units:
+                    if timeref is None:
+                        raise ValueError(f"Time units of {f} ({units}) need a reference time (timeref)")
+                    units = f"{units.strip()} since {timeref.strftime('%Y-%m-%d %H:%M:%S')}"
+                t.extend(nc.num2date([ax['min'], ax['max']], units, calendar=ax['calendar']))
+            span[f] = (min(t), max(t)) if t else None
+
+        # Files with time coverage in time order, then any without, by name
+
+        timed = sorted((f for f in g if span[f]), key=lambda f: (span[f][0], span[f][1], f))
+        g = timed + [f for f in g if not span[f]]
+        for f0, f1 in zip(timed[:-1], timed[1:]):
+            if span[f1][0] < span[f0][1]:
+                warnings.warn(f"Files {f0} and {f1} overlap in time")
+        value.append(g[0] if len(g) == 1 else g)
+
+    if len(value) == 1 and isinstance(value[0], str):
+        return value[0]
+    return value
+
+def readstationtable(fname):
+    """
+    Read a station (POS) table from file
+
+    Supported formats, chosen by file extension:
+
+    - .csv: comma-separated columns GRID, FLAG, X-POS, Y-POS.  If the first
+      line is a header, columns are matched by name (case-insensitive, any of
+      grid, flag, xpos/x-pos/x, ypos/y-pos/y); otherwise the first four
+      columns are used.
+    - .npy: an N x 4 array, or a structured array with fields grid, flag,
+      xpos, ypos
+    - .nc: variables grid, flag, xpos, ypos
+
+    Args:
+        fname (string): file name
+
+    Returns:
+        (numpy.ndarray): N x 4 array of GRID, FLAG, X-POS, Y-POS values
+    """
+    import numpy as np
+
+    names = {'grid': 0, 'flag': 1, 'xpos': 2, 'x-pos': 2, 'x': 2, 'ypos': 3, 'y-pos': 3, 'y': 3}
+    ext = os.path.splitext(fname)[1].lower()
+
+    if ext == '.csv':
+        with open(fname) as f:
+            first = f.readline()
+        hdr = [x.strip().lower() for x in first.split(',')]
+        if all(_floatpattern.match(x) for x in hdr if x):
+            return np.loadtxt(fname, delimiter=',', ndmin=2)[:, :4]
+        cols = [None]*4
+        for ii, x in enumerate(hdr):
+            if x in names and cols[names[x]] is None:
+                cols[names[x]] = ii
+        if None in cols:
+            raise ValueError(f"Could not find GRID, FLAG, X-POS, and Y-POS columns in {fname}")
+        return np.loadtxt(fname, delimiter=',', skiprows=1, usecols=cols, ndmin=2)
+
+    elif ext == '.npy':
+        tbl = np.load(fname)
+        if tbl.dtype.names:
+            return np.column_stack([tbl[x] for x in ('grid', 'flag', 'xpos', 'ypos')]).astype(float)
+        return np.asarray(tbl, dtype=float).reshape(-1, 4)
+
+    elif ext in ('.nc', '.nc4', '.cdf'):
+        with ncopen(fname) as f:
+            return np.column_stack([np.ma.filled(f.variables[x][:].astype(float), np.nan)
+                                    for x in ('grid', 'flag', 'xpos', 'ypos')])
+
+    raise ValueError(f"Unrecognized station table format: {fname}")
+
 def checkforstring(x, prefix=''):
     """
     Check that all dictionary entries have been stringified, and print the keys cooresponding
@@ -204,6 +595,171 @@ def formatkeyvalue(kw, val, singular):
     else:
         return '{:s} == {}\n'.format(kw,val)
 
+def formatentry(kw, val, singular):
+    """
+    Format a stringified dictionary entry as one or more ROMS parameter
+    assignments
+
+    Args:
+        kw (string): key
+        val (string, list of strings, or dict of strings): stringified value.
+            Lists produce one assignment per element, and dictionaries one
+            `kw(subkey)` assignment per entry.
+        singular (list of strings): list of keys that should be treated as
+            unvarying across ROMS grids (i.e. uses a = assignment vs ==)
+
+    Yields:
+        (string): key/value lines of text, e.g. 'key == value'
+    """
+    if isinstance(val, list):
+        for i in val:
+            yield formatkeyvalue(kw, i, singular)
+    elif isinstance(val, dict):
+        for i in val:
+            yield formatkeyvalue('{}({})'.format(kw,i), val[i], singular)
+    else:
+        yield formatkeyvalue(kw, val, singular)
+
+class NCPool:
+    """
+    Bounded cache of open, read-only netCDF file handles
+
+    Handles are borrowed via the open context manager, and stay open after
+    use so repeated reads of the same file don't reopen it.  Once more than
+    maxopen files are open, the least recently used ones not currently in use
+    are closed.  A cached handle is replaced if its file has changed on disk
+    (by inode, modification time, or size) since it was opened.
+
+    Most code should use the shared pool via ncopen rather than creating its
+    own.
+
+    Example:
+
+        with ncopen("his.nc") as f:
+            t = f.variables['ocean_time'][:]
+
+    Args:
+        maxopen (int, optional): maximum number of idle handles kept open.
+            Default = 32
+
+    Attributes:
+        stats (dict): counters of handle `opens`, cache `hits`, `evictions`
+            (closed to stay under maxopen), and `invalidations` (closed
+            because the file changed)
+    """
+
+    def __init__(self, maxopen=32):
+        self.maxopen = maxopen
+        self.stats = {'opens': 0, 'hits': 0, 'evictions': 0, 'invalidations': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @contextlib.contextmanager
+    def open(self, fname):
+        """
+        Borrow a read-only handle to a netCDF file
+
+        The handle must not be closed by the caller, and should not be used
+        after the with block ends.
+
+        Args:
+            fname (string): netCDF file name
+
+        Yields:
+            (netCDF4.Dataset): open dataset
+        """
+        ent = self._acquire(fname)
+        try:
+            yield ent['ds']
+        finally:
+            self._release(ent)
+
+    def close(self, fname=None):
+        """
+        Close cached handles
+
+        Handles currently in use are closed as soon as they're released.
+        This should be called before a file in the pool is modified by another
+        process (e.g. before running ROMS), to avoid HDF5 file lock conflicts.
+
+        Args:
+            fname (string, optional): file to close.  Default closes all.
+        """
+        with self._lock:
+            names = list(self._entries) if fname is None else [os.path.abspath(fname)]
+            for fn in names:
+                if fn in self._entries:
+                    self._drop(fn)
+
+    def _acquire(self, fname):
+        import netCDF4 as nc
+
+        fname = os.path.abspath(fname)
+        st = os.stat(fname)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            ent = self._entries.get(fname)
+            if (ent is not None) and (ent['key'] == key):
+                self._entries.move_to_end(fname)
+                self.stats['hits'] += 1
+            else:
+                if ent is not None:
+                    self._drop(fname)
+                    self.stats['invalidations'] += 1
+                ent = {'ds': nc.Dataset(fname, 'r'), 'key': key, 'refs': 0, 'cached': True}
+                self.stats['opens'] += 1
+                self._entries[fname] = ent
+            ent['refs'] += 1
+            self._evict()
+            return ent
+
+    def _release(self, ent):
+        with self._lock:
+            ent['refs'] -= 1
+            if (ent['refs'] == 0) and (not ent['cached']):
+                ent['ds'].close()
+            self._evict()
+
+    def _drop(self, fname):
+        ent = self._entries.pop(fname)
+        ent['cached'] = False
+        if ent['refs'] == 0:
+            ent['ds'].close()
+
+    def _evict(self):
+        for fn in [fn for fn, e in self._entries.items() if e['refs'] == 0]:
+            if len(self._entries) <= self.maxopen:
+                break
+            self._drop(fn)
+            self.stats['evictions'] += 1
+
+    def _forget(self):
+        # In a forked child, the parent's HDF5 handles can't be safely used or
+        # closed; just drop them
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+ncpool = NCPool()
+if hasattr(os, 'register_at_fork'):  # not available on Windows (which doesn't fork)
+    os.register_at_fork(after_in_child=ncpool._forget)
+
+def ncopen(fname):
+    """
+    Borrow a read-only netCDF file handle from the shared pool
+
+    See NCPool.open; the shared pool is rcutils.ncpool.
+
+    Args:
+        fname (string): netCDF file name
+
+    Returns:
+        context manager yielding a netCDF4.Dataset
+    """
+    return ncpool.open(fname)
+
 def parserst(filebase):
     """
     Parse restart counters from ROMS simulation restart files
@@ -231,8 +787,9 @@ def parserst(filebase):
     # we need to back up one counter
 
     while len(allrst) > 0:
-        f = nc.Dataset(allrst[-1], 'r')
-        if len(f.variables['ocean_time']) > 0:
+        with ncopen(allrst[-1]) as f:
+            nrec = len(f.variables['ocean_time'])
+        if nrec > 0:
             break
         else:
             allrst.pop()
@@ -252,6 +809,94 @@ def parserst(filebase):
 
     return {'lastfile': rst, 'count': cnt}
 
+def readmanifest(fname):
+    """
+    Read a runtodate run-state manifest
+
+    Args:
+        fname (string): manifest file name
+
+    Returns:
+        (dict): manifest contents (see writemanifest), or None if the file is
+            missing or unreadable
+    """
+    try:
+        with open(fname) as f:
+            m = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Ignoring unreadable run manifest {fname}: {e}")
+        return None
+    if not isinstance(m, dict) or m.get('version') != 1:
+        warnings.warn(f"Ignoring run manifest {fname} with unknown format")
+        return None
+    return m
+
+def writemanifest(fname, m):
+    """
+    Write a runtodate run-state manifest
+
+    The manifest is written to a temporary file that is then renamed over the
+    old one, so a crash or kill at any point leaves either the old or the new
+    manifest intact, never a partial one.
+
+    Args:
+        fname (string): manifest file name
+        m (dict): manifest, with the following keys:
+
+            Key        |Value type|Value description
+            -----------|----------|-----------------
+            `version`  |`int`     |manifest format version (1)
+            `simname`  |`string`  |simulation base name
+            `restart`  |`dict`    |latest restart file, with keys `lastfile` (full path), `count` (counter to restart with), `time` (ISO-format last model time in file, or None if not known), `mtime` (modification time, ns), and `size` (bytes); None if no restart file has been written
+            `blocks`   |`list`    |one dict per completed simulation block, with keys `count`, `start` and `end` (ISO-format model times), `dt` (time step, seconds), and `status` ('success' or 'blowup')
+            `slowsteps`|`list`    |slow-stepping periods, each a list of ISO-format start and end times and the time step (seconds)
+    """
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(m, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fname)
+
+def manifestrestart(m, filebase):
+    """
+    Restart info from a runtodate manifest, if still valid
+
+    The manifest is considered stale (and None returned) if the restart file it
+    points to is missing or has been modified since the manifest was written,
+    or if a restart file with the next counter exists (i.e. a later block
+    started writing restarts without the manifest being updated).  Only the
+    files named in the manifest are checked, so this takes constant time
+    regardless of the number of restart files.
+
+    Args:
+        m (dict): manifest, as returned by readmanifest
+        filebase (string): base name for restart files (can include full path)
+
+    Returns:
+        (dict): same keys as the manifest `restart` entry (see writemanifest),
+            with `time` converted to a datetime, or None if the manifest is
+            stale or holds no restart file
+    """
+    rst = m.get('restart') if m else None
+    if not rst or not rst.get('lastfile'):
+        return None
+    try:
+        st = os.stat(rst['lastfile'])
+    except OSError:
+        return None
+    if (st.st_mtime_ns != rst['mtime']) or (st.st_size != rst['size']):
+        return None
+    if os.path.exists(f"{filebase}_{rst['count']:02d}_rst.nc"):
+        return None
+
+    rst = dict(rst)
+    if rst.get('time'):
+        rst['time'] = datetime.fromisoformat(rst['time'])
+    return rst
+
 def fieldsaretime(d):
     """
     True if all time-related fields are in datetime/timedelta format
@@ -310,19 +955,19 @@ def timefieldlist(d):
 
     return timeflds
 
-def inputfilesexist(ocean):
+def inputfiles(ocean):
     """
-    Check that all ROMS input files exist.  If a filename starts with the string
-    "placeholder", it is ignored in this check (this allows you to keep unused
-    parameters in the YAML files, but clearly indicates that these files will
-    not be required)
+    List ROMS input files, by parameter
+
+    Files whose names start with the string "placeholder" are left out (see
+    inputfilesexist).
 
     Args:
         ocean (dict): ROMS parameter dictionary
 
     Returns:
-        (boolean): True if all files exist (or are marked as placeholders),
-            False otherwise
+        (OrderedDict): keys are the input file parameters present in ocean
+            (GRDNAME, ININAME, FRCNAME, etc.), values are lists of file names
     """
 
     fkey = ['GRDNAME','ININAME','ITLNAME','IRPNAME','IADNAME','FWDNAME',
@@ -331,21 +976,127 @@ def inputfilesexist(ocean):
            'APARNAM','SPOSNAM','FPOSNAM','IPARNAM','BPARNAM','SPARNAM',
            'USRNAME']
 
-    rem = []
+    files = OrderedDict()
     for x in fkey:
-        if not x in ocean:
-            rem.append(x)
+        if x in ocean:
+            files[x] = [f for f in flatten([ocean[x]]) if not f.startswith('placeholder')]
+    return files
+
+def inputfilesexist(ocean):
+    """
+    Check that all ROMS input files exist.  If a filename starts with the string
+    "placeholder", it is ignored in this check (this allows you to keep unused
+    parameters in the YAML files, but clearly indicates that these files will
+    not be required)
 
-    fkey = [x for x in fkey if x not in rem]
+    Args:
+        ocean (dict): ROMS parameter dictionary
 
-    files = flatten([ocean[x] for x in fkey])
+    Returns:
+        (boolean): True if all files exist (or are marked as placeholders),
+            False otherwise
+    """
+
+    files = flatten(list(inputfiles(ocean).values()))
     flag = True
 
     for f in files:
-        if (not f.startswith('placeholder')) and (not os.path.exists(f)):
+        if not os.path.exists(f):
             warnings.warn(f"Cannot find file {f}")
             flag = False
 
+    return flag
+
+_timeaxes = {}
+
+def _readtimeaxes(fname):
+    # Time variables of one file, reading only their values (see readtimeaxes)
+    import numpy as np
+
+    axes = {}
+    with ncopen(fname) as f:
+        for name, v in f.variables.items():
+            units = getattr(v, 'units', None)
+            if (v.ndim != 1) or (not isinstance(units, str)):
+                continue
+            u = units.strip().lower()
+            if ('since' not in u) and (u not in ('day', 'days', 'second', 'seconds')):
+                continue
+            t = np.ma.compressed(np.ma.masked_invalid(np.ma.asarray(v[:], dtype=float)))
+            axes[name] = {'units': units,
+                          'calendar': getattr(v, 'calendar', 'standard'),
+                          'cycle': hasattr(v, 'cycle_length'),
+                          'nrec': int(t.size),
+                          'min': float(t.min()) if t.size else None,
+                          'max': float(t.max()) if t.size else None}
+    return axes
+
+def readtimeaxes(files, nproc=None):
+    """
+    Read the time axes of a set of netCDF input files
+
+    A time axis is any 1D variable with units of the form "<units> since
+    <date>", or with units of days or seconds alone (which ROMS interprets
+    relative to TIME_REF).  Only the time variables themselves are read.
+    Results are cached per file (until the file changes), and files not yet in
+    the cache are read in parallel.
+
+    Args:
+        files (list of strings): file names
+        nproc (int, optional): maximum number of processes used to read
+            files.  Default is the number of CPUs.
+
+    Returns:
+        (dict): keys are the file names, values are either the exception
+            raised when trying to read the file, or a dictionary with one
+            entry per time variable, itself a dictionary with the following
+            keys:
+
+            Key       |Value type|Value description
+            ----------|----------|-----------------
+            `units`   |`string`  |time units
+            `calendar`|`string`  |calendar ('standard' if not specified)
+            `cycle`   |`bool`    |True if the variable has a cycle_length attribute (i.e. is a climatology)
+            `nrec`    |`int`     |number of (valid) records
+            `min`     |`float`   |earliest time, in the variable's units (None if no records)
+            `max`     |`float`   |latest time, in the variable's units (None if no records)
+    """
+    out = {}
+    todo = []
+    for fn in files:
+        try:
+            st = os.stat(fn)
+        except OSError as e:
+            out[fn] = e
+            continue
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        c = _timeaxes.get(os.path.abspath(fn))
+        if c and c[0] == key:
+            out[fn] = c[1]
+        else:
+            todo.append((fn, key))
+
+    names = [x[0] for x in todo]
+    if len(todo) > 1 and nproc != 1:
+        nproc = min(nproc or os.cpu_count() or 1, len(todo))
+        with concurrent.futures.ProcessPoolExecutor(nproc) as ex:
+            futs = [ex.submit(_readtimeaxes, fn) for fn in names]
+        results = [fut.exception() or fut.result() for fut in futs]
+    else:
+        results = []
+        for fn in names:
+            try:
+                results.append(_readtimeaxes(fn))
+            except Exception as e:
+                results.append(e)
+
+    for (fn, key), res in zip(todo, results):
+        out[fn] = res
+        if not isinstance(res, BaseException):
+            _timeaxes[os.path.abspath(fn)] = (key, res)
+
+    return out
+
 def flatten(A):
     """
     Recursively flatten a list of lists (of lists of lists...)
@@ -364,13 +1115,75 @@ def flatten(A):
         else: rt.append(i)
     return rt
 
-def parseromslog(fname):
+def foldersizes(folder):
+    """
+    Sizes of the files in a folder
+
+    Args:
+        folder (string): folder name
+
+    Returns:
+        (dict): file sizes (bytes), keyed by file name.  Empty if the folder
+            doesn't exist.
+    """
+    try:
+        with os.scandir(folder) as it:
+            return {e.name: e.stat().st_size for e in it if e.is_file()}
+    except FileNotFoundError:
+        return {}
+
+def writemetrics(record, jsonlfile=None, promfile=None, labels=None, hooks=None,
+                 prefix='romscom_block_'):
+    """
+    Send a metrics record to one or more sinks
+
+    Args:
+        record (dict): metrics, with string, numeric, or boolean values
+        jsonlfile (string, optional): JSON-lines file; the record is appended
+            as one line
+        promfile (string, optional): Prometheus text-format file (e.g. for the
+            node exporter textfile collector); replaced with one gauge per
+            numeric or boolean value of the record
+        labels (dict, optional): Prometheus labels added to every gauge
+        hooks (list of functions, optional): each is called with the record.
+            Errors raised by a hook are turned into warnings.
+        prefix (string, optional): Prometheus metric name prefix.  Default =
+            'romscom_block_'
+    """
+    if jsonlfile:
+        with open(jsonlfile, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    if promfile:
+        lbl = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                       for k, v in (labels or {}).items())
+        lbl = '{' + lbl + '}' if lbl else ''
+        lines = []
+        for k, v in record.items():
+            if isinstance(v, (bool, int, float)):
+                name = prefix + re.sub(r'\W', '_', k)
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{lbl} {float(v)!r}")
+        tmp = f"{promfile}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, promfile)
+
+    for hook in (hooks or []):
+        try:
+            hook(record)
+        except Exception as e:
+            warnings.warn(f"Metrics hook {hook!r} failed: {e!r}")
+
+def parseromslog(fname, log=None):
     """
     Parse ROMS standard output log for some details about the success (or not) of a ROMS
     simulation
 
     Args
         fname (string): name of file with ROMS standard output
+        log (dict, optional): output of readromslog for this file, if already
+            read (only data appended since is read)
 
     Returns:
         (dict): dictionary with the following fields:
@@ -383,49 +1196,585 @@ def parseromslog(fname):
             `lasthis`  |`string`  | Name of last history file defined
     """
 
-    with open(fname, 'r') as f:
-        lines = f.read()
-        lnnum = lines.find('ROMS/TOMS: DONE')
-        cleanrun = lnnum != -1
-
-        lnnum1 = lines.find('Blowing-up: Saving latest model state into  RESTART file')
-        lnnum2 = lines.find('MAIN: Abnormal termination: BLOWUP')
-        blowup = (lnnum1 != -1) | (lnnum2 != -1)
+    log = readromslog(fname, log=log)
 
     step = []
     lasthis = []
-    if cleanrun:
-        with open(fname, 'r') as f:
+    if log['cleanrun']:
+        if len(log['step']) > 0:
+            step = int(log['step'][-1])
+        his = [e['file'] for e in log['events'] if e['event'] == 'DEF_HIS' and e['file']]
+        if his:
+            lasthis = his[-1]
+
+    return {'cleanrun': log['cleanrun'], 'blowup': log['blowup'], 'laststep': step, 'lasthis':lasthis}
+
+_logfields = ['step', 'day', 'time', 'kinetic', 'potential', 'total', 'volume']
+_logheadpattern = re.compile(rb"STEP   Day HH:MM:SS  KINETIC_ENRG")
+_logendpattern = re.compile(rb"Elapsed CPU time \(seconds\):")
+_logrowpattern = re.compile(rb"^[ \t]*(\d+)[ \t]+(\d+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]*\r?$", re.M)
+_logeventpattern = re.compile(rb"^[ \t]*DEF_\w+.*$", re.M)
+
+def _str2float(x):
+    try:
+        return float(x)
+    except ValueError:
+        return float('nan')
+
+def readromslog(fname, log=None, chunksize=16*1024**2):
+    """
+    Read the energy diagnostics and file events from a ROMS standard output log
 
-            datablock = False
+    The log is read in a single pass, in chunks, so memory use does not depend
+    on the size of the log.  Passing the output of a previous call as the log
+    argument resumes reading where that call stopped, so repeated checks on a
+    running (or restarted) simulation only read data appended since the last
+    check.  Only complete lines are consumed.
 
-            for line in f:
-                if line.find('STEP   Day HH:MM:SS  KINETIC_ENRG   POTEN_ENRG    TOTAL_ENRG    NET_VOLUME') != -1:
-                    datablock = True
-                elif line.find('Elapsed CPU time (seconds):') != -1:
-                    datablock = False
-                elif datablock:
-                    tmp = line.split() #string.split(line.strip())
-                    if len(tmp) == 7 and tmp[0].isdigit():
-                        step = int(tmp[0])
-                    if len(tmp) == 6 and tmp[0] == 'DEF_HIS':
-                        lasthis = tmp[-1]
+    Args:
+        fname (string): name of file with ROMS standard output
+        log (dict, optional): output of a previous call to readromslog on the
+            same file.  Default (None) reads from the beginning of the file.
+        chunksize (int, optional): bytes read at a time.  Default = 16 MB
+
+    Returns:
+        (dict): dictionary with the following fields:
+
+            Key        |Value type     |Value description
+            -----------|---------------|-----------------
+            `step`     |`int array`    | time step index (STEP column of the energy table)
+            `day`      |`int array`    | model day (Day column)
+            `time`     |`string array` | time of day (HH:MM:SS column)
+            `kinetic`  |`float array`  | KINETIC_ENRG column (NaN if unreadable)
+            `potential`|`float array`  | POTEN_ENRG column
+            `total`    |`float array`  | TOTAL_ENRG column
+            `volume`   |`float array`  | NET_VOLUME column
+            `events`   |`list`         | one dict per DEF_* line, with keys `event` (e.g. 'DEF_HIS'), `step` (last step read before the event, or None), `file` (file name, if the line ends with one), and `text` (the full line)
+            `cleanrun` |`boolean`      | True if the simulation ran without errors
+            `blowup`   |`boolean`      | True if the simulation blew up
+            `abort`    |`boolean`      | True if ROMS has reported an abnormal termination due to a blowup
+            `offset`   |`int`          | byte offset up to which the file has been read
+    """
+    import numpy as np
+
+    if log is None:
+        log = {k: [] for k in _logfields}
+        log.update(events=[], cleanrun=False, blowup=False, abort=False,
+                   offset=0, datablock=False)
+    else:
+        log = dict(log, events=list(log['events']))
+
+    rows = []
+    laststep = int(log['step'][-1]) if len(log['step']) > 0 else None
+    datablock = log['datablock']
+
+    with open(fname, 'rb') as f:
+        f.seek(log['offset'])
+        while True:
+            chunk = f.read(chunksize)
+            if not chunk:
+                break
+            iend = chunk.rfind(b'\n')
+            while iend == -1: # line longer than chunk
+                more = f.read(chunksize)
+                if not more:
+                    break
+                chunk += more
+                iend = chunk.rfind(b'\n')
+            if iend == -1:
+                break # incomplete final line
+            chunk = chunk[:iend+1]
+            f.seek(log['offset'] + iend + 1)
+            log['offset'] += iend + 1
+
+            # Status messages
+
+            if chunk.find(b'ROMS/TOMS: DONE') != -1:
+                log['cleanrun'] = True
+            if chunk.find(b'Blowing-up: Saving latest model state into  RESTART file') != -1:
+                log['blowup'] = True
+            if chunk.find(b'MAIN: Abnormal termination: BLOWUP') != -1:
+                log['blowup'] = True
+                log['abort'] = True
+
+            # Energy table rows, from the parts of the chunk between the table
+            # header and the end-of-run timing report
+
+            marks = sorted([(m.start(), True) for m in _logheadpattern.finditer(chunk)] +
+                           [(m.start(), False) for m in _logendpattern.finditer(chunk)])
+            pos = 0
+            for mpos, state in marks:
+                if datablock:
+                    rows.extend(_logrowpattern.findall(chunk, pos, mpos))
+                pos = mpos
+                datablock = state
+            if datablock:
+                rows.extend(_logrowpattern.findall(chunk, pos))
+
+            # File definition events, tagged with the last step preceding them
+
+            for m in _logeventpattern.finditer(chunk):
+                prev = _logrowpattern.findall(chunk, max(0, m.start()-2048), m.start())
+                step = int(prev[-1][0]) if prev else laststep
+                tmp = m.group(0).decode('utf-8', errors='replace').split()
+                fn = tmp[-1] if tmp[-1].endswith('.nc') else None
+                log['events'].append({'event': tmp[0], 'step': step, 'file': fn,
+                                      'text': ' '.join(tmp)})
+            if rows:
+                laststep = int(rows[-1][0])
+
+    log['datablock'] = datablock
+
+    # Append new table rows to the arrays
+
+    tbl = np.array(rows, dtype=bytes).reshape(-1, 7)
+    new = {'step': tbl[:,0].astype(int), 'day': tbl[:,1].astype(int),
+           'time': tbl[:,2].astype(str)}
+    try:
+        vals = tbl[:,3:].astype(float)
+    except ValueError: # e.g., Fortran overflow asterisks
+        vals = np.array([[_str2float(x) for x in row] for row in tbl[:,3:]]).reshape(-1, 4)
+    new.update(kinetic=vals[:,0], potential=vals[:,1], total=vals[:,2], volume=vals[:,3])
+
+    for k in _logfields:
+        log[k] = np.concatenate((np.asarray(log[k], dtype=new[k].dtype), new[k])) if len(log[k]) else new[k]
+
+    return log
+
+_profnodepattern = re.compile(r"^\s*Node\s*#\s*(\d+)\s+CPU:\s+(\S+)")
+_profsectionpattern = re.compile(r"^\s*(.*?(?:profile|Profile))\s*,\s*Grid:\s*(\d+)")
+_profregionpattern = re.compile(r"^\s*(.*?)\s*\.{2,}\s+(\S+)\s+\(?\s*([-\d.]+)\s*%?\s*\)?\s*%?\s*$")
+_proftotalpattern = re.compile(r"^\s*Total:\s+(\S+)(?:\s+(\S+))?")
+_profreftotalpattern = re.compile(r"respect to total time\s*=\s*(\S+)")
+
+def readromsprofile(fname, tailsize=1024**2):
+    """
+    Read the end-of-run timing profile from a ROMS standard output log
 
-    return {'cleanrun': cleanrun, 'blowup': blowup, 'laststep': step, 'lasthis':lasthis}
+    ROMS ends its standard output with an "Elapsed CPU time" report: CPU time
+    per node, then one or more profile sections per grid (e.g. the nonlinear
+    model elapsed time per code region, and the MPI message passage times),
+    each listing regions as "Region name ........  seconds  (percent %)".
+    Only the end of the file is read, so this is fast even for large logs.
 
-def findclosesttime(folder, targetdate, pattern='*his*.nc'):
+    Args:
+        fname (string): name of file with ROMS standard output
+        tailsize (int, optional): bytes read from the end of the file at a
+            time while looking for the report.  Default = 1 MB
+
+    Returns:
+        (list of dicts): one row per timing entry (empty if the log has no
+            report), with the following keys:
+
+            Key       |Value type|Value description
+            ----------|----------|-----------------
+            `section` |`string`  |'Elapsed CPU time' for per-node times, 'Summary' for the profiled/non-profiled totals, otherwise the profile section title (e.g. 'Nonlinear model elapsed CPU time profile')
+            `grid`    |`int`     |nested grid number (None for per-node times and summary)
+            `region`  |`string`  |code region, 'Node N' for per-node times, or 'Total' for section totals
+            `seconds` |`float`   |time in seconds
+            `percent` |`float`   |percentage of total time, where reported (otherwise None)
+    """
+    marker = b'Elapsed CPU time (seconds):'
+    with open(fname, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = size
+        data = b''
+        ii = -1
+        while start > 0:
+            n = min(tailsize, start)
+            start -= n
+            f.seek(start)
+            data = f.read(n) + data
+            ii = data.rfind(marker)
+            if ii != -1:
+                break
+    if ii == -1:
+        return []
+    return parseromsprofile(data[ii:].decode('utf-8', errors='replace').splitlines())
+
+def parseromsprofile(lines):
+    """
+    Parse ROMS end-of-run timing profile text
+
+    Args:
+        lines (list of strings): lines of the timing report, starting with
+            the "Elapsed CPU time (seconds):" line (see readromsprofile)
+
+    Returns:
+        (list of dicts): timing rows, as described in readromsprofile
+    """
+    rows = []
+    section = 'Elapsed CPU time'
+    grid = None
+    for line in lines:
+        m = _profnodepattern.match(line)
+        if m:
+            rows.append({'section': 'Elapsed CPU time', 'grid': None,
+                         'region': f"Node {int(m.group(1))}",
+                         'seconds': _str2float(m.group(2)), 'percent': None})
+            continue
+        m = _profsectionpattern.match(line)
+        if m:
+            section, grid = ' '.join(m.group(1).split()), int(m.group(2))
+            continue
+        m = _proftotalpattern.match(line)
+        if m:
+            pct = _str2float(m.group(2)) if m.group(2) else None
+            rows.append({'section': section, 'grid': grid, 'region': 'Total',
+                         'seconds': _str2float(m.group(1)), 'percent': pct})
+            section, grid = 'Summary', None
+            continue
+        m = _profregionpattern.match(line)
+        if m:
+            rows.append({'section': section, 'grid': grid,
+                         'region': ' '.join(m.group(1).split()),
+                         'seconds': _str2float(m.group(2)),
+                         'percent': _str2float(m.group(3))})
+            continue
+        m = _profreftotalpattern.search(line)
+        if m:
+            rows.append({'section': 'Summary', 'grid': None, 'region': 'Total',
+                         'seconds': _str2float(m.group(1)), 'percent': 100.0})
+            continue
+        if 'ROMS/TOMS: DONE' in line:
+            break
+    return rows
+
+def profilesummary(rows):
+    """
+    Split a ROMS timing profile into I/O, MPI communication, and computation
+
+    I/O time is the sum of regions whose names mention reading, writing,
+    input, or output; MPI time is the sum of the message passage regions;
+    the rest of the profiled time is counted as computation.  Fractions are
+    relative to the total run time.
+
+    Args:
+        rows (list of dicts): timing rows (see readromsprofile)
+
+    Returns:
+        (dict): with keys `total`, `io`, `mpi`, and `compute` (seconds), and
+            `iofrac`, `mpifrac`, and `computefrac` (fractions of total)
+    """
+    io = mpi = compute = 0.0
+    total = None
+    for row in rows:
+        if row['section'] == 'Summary':
+            if row['region'] == 'Total':
+                total = row['seconds']
+            continue
+        if row['grid'] is None or row['region'] == 'Total':
+            continue
+        name = row['region'].lower()
+        if 'message passage' in row['section'].lower() or name.startswith('message passage'):
+            mpi += row['seconds']
+        elif any(x in name for x in ('reading', 'writing', 'input', 'output')):
+            io += row['seconds']
+        else:
+            compute += row['seconds']
+    if total is None:
+        total = io + mpi + compute
+    frac = (lambda x: x/total) if total else (lambda x: None)
+    return {'total': total, 'io': io, 'mpi': mpi, 'compute': compute,
+            'iofrac': frac(io), 'mpifrac': frac(mpi), 'computefrac': frac(compute)}
+
+def compareprofiles(profiles, labels=None, value='seconds'):
+    """
+    Compare ROMS timing profiles across runs
+
+    Args:
+        profiles (list): timing profiles, each either a list of timing rows
+            (see readromsprofile) or the name of a ROMS standard output log
+        labels (list of strings, optional): column label for each profile.
+            Default is the file name (for logs) or 'run0', 'run1', etc.
+        value (string, optional): 'seconds' (default) or 'percent'
+
+    Returns:
+        (list of dicts): one row per (section, grid, region) found in any
+            profile, in order of first appearance, with keys `section`,
+            `grid`, `region`, and one key per label holding that run's value
+            (None if the region is missing from that run)
+    """
+    if labels is None:
+        labels = [p if isinstance(p, str) else f"run{ii}" for ii, p in enumerate(profiles)]
+    table = OrderedDict()
+    for lbl, p in zip(labels, profiles):
+        if isinstance(p, str):
+            p = readromsprofile(p)
+        for row in p:
+            key = (row['section'], row['grid'], row['region'])
+            if key not in table:
+                table[key] = OrderedDict([('section', key[0]), ('grid', key[1]), ('region', key[2])])
+                table[key].update((x, None) for x in labels)
+            table[key][lbl] = row[value]
+    return list(table.values())
+
+def watchromslog(proc, fname, maxke=None, pollinterval=5.0, grace=30.0):
+    """
+    Monitor the standard output of a running ROMS process, and stop it early
+    if it blows up
+
+    The log file is read incrementally while the process runs.  The process
+    (and its whole process group, e.g. all MPI ranks, so it should be started
+    with start_new_session=True) is terminated as soon as ROMS reports an
+    abnormal termination due to a blowup, the energy diagnostics include NaNs,
+    or the kinetic energy exceeds maxke, rather than waiting for the MPI job
+    to tear itself down.
+
+    Args:
+        proc (subprocess.Popen): running ROMS process
+        fname (string): name of file receiving the process's standard output
+        maxke (float, optional): kinetic energy (KINETIC_ENRG) above which the
+            simulation is considered to have blown up.  Default (None) does
+            not check the kinetic energy magnitude.
+        pollinterval (float, optional): seconds between checks of the log.
+            Default = 5
+        grace (float, optional): seconds to wait after SIGTERM before sending
+            SIGKILL.  Default = 30
+
+    Returns:
+        (dict): dictionary with the following fields:
+
+            Key        |Value type|Value description
+            -----------|----------|-----------------
+            `killed`   |`boolean` | True if the process was stopped early
+            `reason`   |`string`  | Reason the process was stopped (empty if not)
+            `laststep` |`int`     | Index of last step read from the energy table
+            `log`      |`dict`    | Log contents read so far (see readromslog), which can be passed back to readromslog to read anything written after the last check
+    """
+    import numpy as np
+
+    log = None
+    reason = ''
+
+    while reason == '':
+        running = proc.poll() is None
+
+        n0 = len(log['step']) if log else 0
+        log = readromslog(fname, log)
+
+        if log['abort']:
+            reason = 'blowup'
+        else:
+            ke = log['kinetic'][n0:]
+            bad = np.isnan(ke) | np.isnan(log['potential'][n0:]) | np.isnan(log['total'][n0:])
+            if bad.any():
+                reason = f"NaN in energy diagnostics at step {log['step'][n0:][bad][0]}"
+            elif (maxke is not None) and (ke > maxke).any():
+                reason = f"kinetic energy {ke[ke > maxke][0]} exceeds {maxke} at step {log['step'][n0:][ke > maxke][0]}"
+
+        if not running:
+            break
+        if reason == '':
+            try:
+                proc.wait(timeout=pollinterval)
+            except subprocess.TimeoutExpired:
+                pass
+
+    killed = False
+    if reason and proc.poll() is None:
+        killed = True
+        try:
+            os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+            proc.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+            proc.wait()
+        except ProcessLookupError:
+            pass
+
+    if not killed:
+        reason = ''
+        proc.wait()
+
+    laststep = int(log['step'][-1]) if len(log['step']) > 0 else []
+    return {'killed': killed, 'reason': reason, 'laststep': laststep, 'log': log}
+
+_timeref = "seconds since 1900-01-01 00:00:00"
+
+def _readtimeaxis(fname):
+    # Time values of one output file, converted to a common reference (for the
+    # time index)
+    import netCDF4 as nc
+    import numpy as np
+
+    with ncopen(fname) as f:
+        tvar = f.variables['ocean_time']
+        tunit = tvar.units
+        tcal = getattr(tvar, 'calendar', 'standard')
+        t = tvar[:]
+    t = np.ma.filled(np.ma.asarray(t, dtype=float), np.nan)
+    if len(t) > 0:
+        t = np.asarray(nc.date2num(nc.num2date(t, units=tunit, calendar=tcal), _timeref, calendar=tcal), dtype=float)
+    return {'unit': tunit, 'cal': tcal, 'time': t}
+
+def timeindex(folder, pattern='*his*.nc', cachefile=None, nproc=None):
+    """
+    Build a time index for a set of ROMS output files
+
+    The index lists every time record in the files, sorted by time, so records
+    near any date can be found by binary search.  The per-file time values are
+    stored in a sidecar cache file (plain JSON, so a cache found in a shared
+    or copied output folder is only ever read as data), and only files that
+    are new or have changed (by modification time or size) since the last
+    call are reread; when several files need to be read, they are read in
+    parallel.  The sidecar holds the entries of every file indexed with it,
+    so one sidecar can serve several patterns (e.g. history and averages
+    files in the same folder).
+
+    Args:
+        folder (string or list of strings): folder holding the output files,
+            or a list of file names (see findclosesttime)
+        pattern (string, optional): pattern-matching string appended to folder
+            name to identify files. Default = '*his*.nc'
+        cachefile (string, optional): sidecar cache file.  Default is
+            .romscom_timeindex.json in the folder (or, for a list of files, in
+            the folder they share).  Set to False to skip caching.
+        nproc (int, optional): maximum number of processes used to read
+            files.  Default is the number of CPUs.
+
+    Returns:
+        (dict): with the following keys/values:
+
+            Key      |Value type     |Value description
+            ---      |----------     |-----------------
+            `files`  |`list`         |full paths of indexed files, sorted
+            `unit`   |`list`         |time units of each file
+            `cal`    |`list`         |calendar of each file
+            `time`   |`numpy.ndarray`|time of each record (seconds since 1900-01-01, in that file's calendar), sorted
+            `file`   |`numpy.ndarray`|index into `files` of each record
+            `idx`    |`numpy.ndarray`|time index (0-based) of each record within its file
+    """
+    import numpy as np
+
+    if (type(folder) is str) and os.path.isdir(folder):
+        files = glob.glob(os.path.join(folder, pattern))
+        base = folder
+    else:
+        files = list(folder)
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(x)) for x in files]) if files else '.'
+    files = sorted(os.path.abspath(x) for x in files)
+
+    if cachefile is None:
+        cachefile = os.path.join(base, '.romscom_timeindex.json')
+
+    # Load cached entries, keeping only those for unchanged files
+
+    cache = {}
+    if cachefile and os.path.isfile(cachefile):
+        try:
+            with open(cachefile) as f:
+                cache = {fn: {'unit': str(ent['unit']), 'cal': str(ent['cal']),
+                              'time': np.asarray(ent['time'], dtype=float),
+                              'mtime': int(ent['mtime']), 'size': int(ent['size'])}
+                         for fn, ent in json.load(f).items()}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            cache = {}
+
+    entries = {}
+    stale = []
+    for fn in files:
+        try:
+            st = os.stat(fn)
+        except OSError as e:
+            warnings.warn(f"Skipping unreadable file {fn}: {e}")
+            continue
+        ent = cache.get(fn)
+        if ent and (ent['mtime'] == st.st_mtime_ns) and (ent['size'] == st.st_size):
+            entries[fn] = ent
+        else:
+            stale.append((fn, st))
+
+    # Read new or changed files
+
+    if stale:
+        names = [x[0] for x in stale]
+        if len(stale) > 1 and nproc != 1:
+            nproc = min(nproc or os.cpu_count() or 1, len(stale))
+            with concurrent.futures.ProcessPoolExecutor(nproc) as ex:
+                futs = [ex.submit(_readtimeaxis, fn) for fn in names]
+                results = []
+                for fn, fut in zip(names, futs):
+                    try:
+                        results.append(fut.result())
+                    except Exception as e:
+                        results.append(e)
+        else:
+            results = []
+            for fn in names:
+                try:
+                    results.append(_readtimeaxis(fn))
+                except Exception as e:
+                    results.append(e)
+
+        for (fn, st), res in zip(stale, results):
+            if isinstance(res, Exception):
+                warnings.warn(f"Skipping unreadable file {fn}: {res}")
+                continue
+            res.update(mtime=st.st_mtime_ns, size=st.st_size)
+            entries[fn] = res
+
+        # Keep other cached files (e.g. indexed with another pattern) that
+        # still exist, so indexes of different file sets can share a sidecar
+
+        if cachefile:
+            indexed = set(files)
+            keep = {fn: ent for fn, ent in cache.items()
+                    if (fn not in indexed) and os.path.isfile(fn)}
+            keep.update(entries)
+            try:
+                tmp = f"{cachefile}.{os.getpid()}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump({fn: dict(ent, time=ent['time'].tolist())
+                               for fn, ent in keep.items()}, f)
+                os.replace(tmp, cachefile)
+            except OSError as e:
+                warnings.warn(f"Could not write time index cache {cachefile}: {e}")
+
+    # Merge into a single sorted list of records.  Records with identical times
+    # stay in file-name order.
+
+    files = [fn for fn in files if fn in entries]
+    times = [entries[fn]['time'] for fn in files]
+    nrec = [len(x) for x in times]
+    t = np.concatenate(times) if times else np.zeros(0)
+    fid = np.repeat(np.arange(len(files)), nrec)
+    idx = np.concatenate([np.arange(n) for n in nrec]) if times else np.zeros(0, dtype=int)
+
+    order = np.argsort(t, kind='stable')
+
+    return {'files': files,
+            'unit': [entries[fn]['unit'] for fn in files],
+            'cal': [entries[fn]['cal'] for fn in files],
+            'time': t[order], 'file': fid[order], 'idx': idx[order]}
+
+def findclosesttime(folder, targetdate, pattern='*his*.nc', index=None, cachefile=None):
     """
     Search folder for history file with time closest to the target date
 
+    The search uses a time index of the files (see timeindex), so only files
+    that are new or have changed since the last search are opened.  Files that
+    can't be read are skipped with a warning.  As in earlier versions, ties go
+    to the first match: if the nearest time appears in more than one file
+    (e.g. overlapping output from a restarted simulation), the record in the
+    first file (by name) is chosen, and a target midway between two records
+    gets the earlier one.
+
     Args:
         folder (string): pathname to folder holding output of a BESTNPZ ROMS
             simulation, with history files matching the pattern provided.
             Alternatively, can be a list of history filenames (useful if you
             want to include a smaller subset from within a folder that can't be
             isolated via pattern)
-        targetdate (datetime): target date
+        targetdate (datetime or list of datetimes): target date.  If a list,
+            all dates are looked up at once, and a list of results is returned.
         pattern (string): pattern-matching string appended to folder name
             as search string to identify history files Default = '*his*.nc'
+        index (dict, optional): time index returned by timeindex, to reuse
+            across calls.  If None (default), it is built (or loaded from the
+            sidecar cache) for this call.
+        cachefile (string, optional): sidecar cache file (see timeindex)
 
     Returns:
         (dict): with the following keys/values:
@@ -435,44 +1784,45 @@ def findclosesttime(folder, targetdate, pattern='*his*.nc'):
             `filename`|`string`    |full path to history file including nearest date
             `idx`     |`int`       |time index within that file (0-based) of nearest date
             `dt`      |`timedelta` |time between nearest date and target date
+            `time`    |`datetime`  |nearest date
             `unit`    |`string`    |time units used in history file
             `cal`     |`string`    |calendar used by history file
     """
-
-    if (type(folder) is str) and os.path.isdir(folder):
-        hisfiles = glob.glob(os.path.join(*(folder, pattern)))
+    import netCDF4 as nc
+    import numpy as np
+
+    if index is None:
+        index = timeindex(folder, pattern=pattern, cachefile=cachefile)
+
+    single = not isinstance(targetdate, (list, tuple, np.ndarray))
+    targets = [targetdate] if single else list(targetdate)
+
+    d = []
+    if len(index['time']) > 0:
+        cal = index['cal'][0]
+        t = index['time']
+        tt = np.atleast_1d(np.asarray(nc.date2num(targets, _timeref, calendar=cal), dtype=float))
+
+        # Nearest record: compare neighbors on either side of the insertion
+        # point, taking the first of any records with identical times (ties
+        # go to the earlier record)
+
+        ii = np.searchsorted(t, tt, side='left')
+        lo = np.clip(ii-1, 0, len(t)-1)
+        hi = np.clip(ii, 0, len(t)-1)
+        lo = np.searchsorted(t, t[lo], side='left')
+        pick = np.where(np.abs(t[hi]-tt) < np.abs(t[lo]-tt), hi, lo)
+
+        for tg, p in zip(targets, pick):
+            fid = index['file'][p]
+            time = nc.num2date(t[p], _timeref, calendar=index['cal'][fid])
+            d.append({'filename': index['files'][fid],
+                      'idx': int(index['idx'][p]),
+                      'dt': abs(time - tg),
+                      'time': time,
+                      'unit': index['unit'][fid],
+                      'cal': index['cal'][fid]})
     else:
-        hisfiles = folder
-
-    f = nc.Dataset(hisfiles[0], 'r')
-    tunit = f.variables['ocean_time'].units
-    tcal = f.variables['ocean_time'].calendar
-
-    dtmin = []
-
-    d = {}
-    for fn in hisfiles:
-        try:
-            f = nc.Dataset(fn, 'r')
-            time = nc.num2date(f.variables['ocean_time'][:], units=tunit, calendar=tcal)
-
-            dt = abs(time - targetdate)
-
-            if not d:
-                d['filename'] = fn
-                d['idx'] = np.argmin(dt)
-                d['dt'] = dt[d['idx']]
-                d['time'] = time[d['idx']]
-            else:
-                if min(dt) < d['dt']:
-                    d['filename'] = fn
-                    d['idx'] = np.argmin(dt)
-                    d['dt'] = dt[d['idx']]
-                    d['time'] = time[d['idx']]
-        except:
-            pass
-
-    d['unit'] = tunit
-    d['cal'] = tcal
+        d = [{} for tg in targets]
 
-    return d
\ No newline at end of file
+    return d[0] if single else d
@@ -0,0 +1,414 @@
+"""**ROMS Communication Module output reducer**
+
+This module computes summary statistics of ROMS output across many
+simulations (e.g. the members of an ensemble or sampling study; see
+romscom.sampling), streaming the output in chunks so no file is ever loaded
+whole:
+
+- `reduceoutput(simdirs, variables,...)` reduces selected variables of the
+  output files of each simulation over time, in parallel, and writes the
+  results to a summary netCDF file
+- `Moments()` computes the running count, mean, variance, minimum, and
+  maximum (the default reduction)
+- `Exceedance(threshold)` computes the fraction of time a variable exceeds a
+  threshold
+
+Other reductions can be supplied as objects with the same methods as these
+classes (`chunk`, `merge`, and `finalize`; see Moments).  They must be
+defined at module level (not inside a function), so they can be sent to the
+worker processes.
+"""
+
+import concurrent.futures
+import os
+import re
+import warnings
+from collections import OrderedDict
+from datetime import datetime
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+
+
+class Moments:
+    """
+    Running count, mean, variance, minimum, and maximum
+
+    Statistics are computed element-wise over the time dimension, ignoring
+    masked (fill) and non-finite values.  Partial results of separate chunks
+    (and separate simulations) are combined with the pairwise update of Chan
+    et al. (1979), which is exact and numerically stable regardless of the
+    order in which chunks are merged.
+
+    Args:
+        ddof (int, optional): delta degrees of freedom of the variance (i.e.
+            the divisor is count - ddof).  Default = 0
+
+    The methods below define the interface all reductions share.
+    """
+
+    def __init__(self, ddof=0):
+        self.ddof = ddof
+
+    def chunk(self, x):
+        """
+        Partial result of one chunk of records
+
+        Args:
+            x (numpy.ma.MaskedArray): values, with time as the first dimension
+
+        Returns:
+            (dict): partial result (any picklable object can be used)
+        """
+        import numpy as np
+
+        d = np.ma.getdata(x)
+        if not np.ma.is_masked(x) and np.isfinite(d).all():
+
+            # All values valid (the usual case for ocean points): avoid the
+            # masking passes
+
+            mean = d.mean(axis=0, dtype=float)
+            dev = d - mean
+            return {'n': np.full(mean.shape, len(d)),
+                    'mean': mean,
+                    'm2': np.einsum('i...,i...->...', dev, dev),
+                    'min': d.min(axis=0).astype(float),
+                    'max': d.max(axis=0).astype(float)}
+
+        d = d.astype(float)
+        valid = ~np.ma.getmaskarray(x) & np.isfinite(d)
+        n = valid.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, np.where(valid, d, 0).sum(axis=0)/n, 0.0)
+        m2 = (np.where(valid, d - mean, 0)**2).sum(axis=0)
+        return {'n': n,
+                'mean': mean,
+                'm2': m2,
+                'min': np.where(valid, d, np.inf).min(axis=0),
+                'max': np.where(valid, d, -np.inf).max(axis=0)}
+
+    def merge(self, a, b):
+        """
+        Combines two partial results
+
+        Args:
+            a (dict): partial result (see chunk)
+            b (dict): partial result
+
+        Returns:
+            (dict): partial result of the records of both
+        """
+        import numpy as np
+
+        n = a['n'] + b['n']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(n > 0, b['n']/n, 0.0)
+        delta = b['mean'] - a['mean']
+        return {'n': n,
+                'mean': a['mean'] + delta*frac,
+                'm2': a['m2'] + b['m2'] + delta**2*a['n']*frac,
+                'min': np.minimum(a['min'], b['min']),
+                'max': np.maximum(a['max'], b['max'])}
+
+    def finalize(self, p):
+        """
+        Final statistics
+
+        Args:
+            p (dict): partial result of all records
+
+        Returns:
+            (dict): arrays keyed by statistic name; the summary file variable
+                holding each is named <variable>_<statistic>.  Elements without
+                any valid values are NaN.
+        """
+        import numpy as np
+
+        n = p['n']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = np.where(n > self.ddof, p['m2']/(n - self.ddof), np.nan)
+        return OrderedDict([('count', n),
+                            ('mean', np.where(n > 0, p['mean'], np.nan)),
+                            ('var', var),
+                            ('min', np.where(n > 0, p['min'], np.nan)),
+                            ('max', np.where(n > 0, p['max'], np.nan))])
+
+class Exceedance:
+    """
+    Fraction of time a variable exceeds a threshold
+
+    Computed element-wise, ignoring masked and non-finite values.
+
+    Args:
+        threshold (float): threshold value
+        below (logical, optional): True to count values below the threshold
+            rather than above it.  Default is False
+        name (string, optional): statistic name.  Default is gt<threshold>
+            (or lt<threshold>)
+    """
+
+    def __init__(self, threshold, below=False, name=None):
+        self.threshold = threshold
+        self.below = below
+        self.name = name or f"{'lt' if below else 'gt'}{threshold:g}"
+
+    def chunk(self, x):
+        import numpy as np
+
+        d = np.ma.getdata(x).astype(float)
+        valid = ~np.ma.getmaskarray(x) & np.isfinite(d)
+        hit = (d < self.threshold) if self.below else (d > self.threshold)
+        return {'n': valid.sum(axis=0), 'k': (valid & hit).sum(axis=0)}
+
+    def merge(self, a, b):
+        return {'n': a['n'] + b['n'], 'k': a['k'] + b['k']}
+
+    def finalize(self, p):
+        import numpy as np
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {self.name: np.where(p['n'] > 0, p['k']/p['n'], np.nan)}
+
+def _plan(outdir, pattern, dedupe, nproc):
+    # Records to read from one simulation's output files, as (file, start,
+    # stop) runs.  With dedupe, a time found in several files (e.g. after a
+    # restart block reran part of the simulation) is only read from the last
+    # one, in file name order.  The time index gets its own sidecar per
+    # pattern, next to (and separate from) the default one used by
+    # findclosesttime.
+    import numpy as np
+
+    tag = re.sub(r"\W+", "_", pattern).strip("_")
+    cachefile = os.path.join(outdir, f".romscom_timeindex_{tag}.json")
+    index = r.timeindex(outdir, pattern=pattern, cachefile=cachefile, nproc=nproc)
+    t = index['time']
+    keep = np.ones(len(t), dtype=bool)
+    if dedupe and len(t) > 1:
+        keep[:-1] = t[1:] != t[:-1]
+
+    runs = []
+    for ii, fname in enumerate(index['files']):
+        idx = np.sort(index['idx'][keep & (index['file'] == ii)])
+        if len(idx) == 0:
+            continue
+        breaks = np.flatnonzero(np.diff(idx) != 1) + 1
+        for run in np.split(idx, breaks):
+            runs.append((fname, int(run[0]), int(run[-1]) + 1))
+    return runs
+
+def _reducechunk(fname, start, stop, shapes, reducers):
+    # Partial results of each reducer, for each variable, over one chunk of
+    # records of one file
+    out = {}
+    with r.ncopen(fname) as f:
+        for v, shape in shapes.items():
+            x = f.variables[v][start:stop]
+            if x.shape[1:] != shape:
+                raise ValueError(f"Shape of {v} in {fname} differs from other output files")
+            out[v] = [red.chunk(x) for red in reducers]
+    return out
+
+def _varinfo(fname, variables):
+    # Dimensions (excluding time), attributes, and bytes per record of each
+    # variable, from a sample output file
+    info = OrderedDict()
+    with r.ncopen(fname) as f:
+        for v in variables:
+            if v not in f.variables:
+                raise ValueError(f"Variable {v} not found in {fname}")
+            var = f.variables[v]
+            if (not var.dimensions) or (var.dimensions[0] != 'ocean_time'):
+                raise ValueError(f"Variable {v} in {fname} does not have a leading ocean_time dimension")
+            shape = var.shape[1:]
+            nbytes = 8
+            for s in shape:
+                nbytes *= s
+            info[v] = {'dims': var.dimensions[1:], 'shape': shape, 'nbytes': nbytes,
+                       'attrs': {k: var.getncattr(k) for k in ('long_name', 'units')
+                                 if k in var.ncattrs()}}
+    return info
+
+def reduceoutput(simdirs, variables, outfile=None, pattern='*_avg*.nc',
+                 reducers=None, ensemble=True, dedupe=True, nproc=None,
+                 chunkbytes=64*1024**2):
+    """
+    Reduces output variables of many simulations over time
+
+    For each simulation folder, the output files matching pattern in its Out
+    subfolder (see simfolders) are read in chunks of time records, and each
+    chunk is reduced (by default, to running statistics; see Moments) in a
+    pool of worker processes.  The partial results are merged as the chunks
+    complete, so memory use is set by the chunk size and the size of the
+    results, not by the amount of output.  Output files are ordered by time
+    via rcutils.timeindex (with a sidecar cache file per pattern), so
+    repeated calls reuse its cached time values.
+
+    Args:
+        simdirs (string or list of strings): simulation folders (see
+            runtodate), e.g. one per ensemble member
+        variables (string or list of strings): names of variables to reduce.
+            Each must have ocean_time as its first dimension, and the same
+            shape in all files.
+        outfile (string, optional): name of summary netCDF file to write.  If
+            None (default), results are only returned.
+        pattern (string, optional): pattern identifying output files in each
+            Out folder.  Default = '*_avg*.nc' (use e.g. '*_his*.nc' for
+            history files; averages and snapshots shouldn't be mixed)
+        reducers (list, optional): reductions to compute (see Moments for the
+            interface).  Default is [Moments()]
+        ensemble (logical, optional): True (default) to also combine the
+            results of all simulations (i.e. over all members and times)
+        dedupe (logical, optional): True (default) to use only the last file
+            (in name order, i.e. the latest restart block) holding a given
+            time, so output from a block that was rerun after a blowup isn't
+            counted twice
+        nproc (int, optional): number of worker processes.  Default is the
+            number of CPUs.
+        chunkbytes (int, optional): approximate amount of data (as 8-byte
+            floats) read per chunk.  Default = 64 MB
+
+    Returns:
+        (OrderedDict): results, keyed by summary variable name,
+            <variable>_<statistic> (e.g. temp_mean).  Each is an array with
+            a leading member dimension (one element per simulation folder),
+            followed by the variable's non-time dimensions.  With ensemble,
+            <variable>_<statistic>_ensemble holds the combined results,
+            without the member dimension.  The summary file holds the same
+            variables, along with `member` (simulation folder names) and
+            `nrec` (number of time records reduced per member) variables.
+    """
+    import numpy as np
+
+    if isinstance(simdirs, str):
+        simdirs = [simdirs]
+    if isinstance(variables, str):
+        variables = [variables]
+    if reducers is None:
+        reducers = [Moments()]
+    nproc = nproc or os.cpu_count() or 1
+
+    # Records to read from each simulation (files not yet in the time index
+    # are read in parallel)
+
+    plans = []
+    for s in simdirs:
+        try:
+            plans.append(_plan(rc.simfolders(s)['out'], pattern, dedupe, nproc))
+        except Exception as e:
+            warnings.warn(f"Skipping {s}: {e}")
+            plans.append([])
+        if not plans[-1]:
+            warnings.warn(f"No output files matching {pattern} found for {s}")
+
+    with concurrent.futures.ProcessPoolExecutor(nproc) as ex:
+        sample = next((p[0][0] for p in plans if p), None)
+        if sample is None:
+            raise ValueError(f"No output files matching {pattern} found in any simulation folder")
+        info = _varinfo(sample, variables)
+
+        # Chunk tasks, limited to chunkbytes of data each
+
+        nper = max(1, chunkbytes // max(1, sum(v['nbytes'] for v in info.values())))
+        tasks = []
+        for im, runs in enumerate(plans):
+            for fname, start, stop in runs:
+                for t0 in range(start, stop, nper):
+                    tasks.append((im, fname, t0, min(t0 + nper, stop)))
+        nrec = [sum(stop - start for _, start, stop in runs) for runs in plans]
+
+        # Run tasks, merging results as they finish (with a bounded number in
+        # flight, so pending results don't pile up in memory)
+
+        shapes = {v: info[v]['shape'] for v in variables}
+        acc = [{v: None for v in variables} for _ in simdirs]
+        pending = {}
+        queue = iter(tasks)
+        while True:
+            for task in queue:
+                fut = ex.submit(_reducechunk, task[1], task[2], task[3], shapes, reducers)
+                pending[fut] = task
+                if len(pending) >= 4*nproc:
+                    break
+            if not pending:
+                break
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                im, fname, t0, t1 = pending.pop(fut)
+                res = fut.result()
+                for v in variables:
+                    if acc[im][v] is None:
+                        acc[im][v] = res[v]
+                    else:
+                        acc[im][v] = [red.merge(a, b) for red, a, b in zip(reducers, acc[im][v], res[v])]
+
+    # Final statistics
+
+    out = OrderedDict()
+    labels = {}
+    for v in variables:
+        for ir, red in enumerate(reducers):
+            parts = [a[v][ir] if a[v] is not None else None for a in acc]
+            fin = [red.finalize(p) if p is not None else None for p in parts]
+            keys = next(f for f in fin if f is not None).keys() if any(fin) else []
+            for k in keys:
+                ref = np.asarray(next(f[k] for f in fin if f is not None))
+                empty = np.zeros(ref.shape, ref.dtype) if ref.dtype.kind in 'iub' else \
+                        np.full(ref.shape, np.nan)
+                out[f"{v}_{k}"] = np.stack([f[k] if f is not None else empty for f in fin])
+                labels[f"{v}_{k}"] = (v, k, False)
+            if ensemble:
+                valid = [p for p in parts if p is not None]
+                if valid:
+                    total = valid[0]
+                    for p in valid[1:]:
+                        total = red.merge(total, p)
+                    for k, x in red.finalize(total).items():
+                        out[f"{v}_{k}_ensemble"] = x
+                        labels[f"{v}_{k}_ensemble"] = (v, k, True)
+
+    if outfile:
+        _writesummary(outfile, simdirs, nrec, info, out, labels, pattern)
+    return out
+
+def _writesummary(outfile, simdirs, nrec, info, out, labels, pattern):
+    # Summary netCDF file, written atomically
+    import netCDF4 as nc
+    import numpy as np
+
+    tmp = f"{outfile}.{os.getpid()}.tmp"
+    with nc.Dataset(tmp, 'w') as f:
+        f.title = "romscom output summary"
+        f.history = f"{datetime.now().isoformat(timespec='seconds')}: romscom.reducer.reduceoutput"
+        f.source_pattern = pattern
+
+        f.createDimension('member', len(simdirs))
+        m = f.createVariable('member', str, ('member',))
+        m.long_name = "simulation folder"
+        m[:] = np.array([os.path.abspath(s) for s in simdirs], dtype=object)
+        n = f.createVariable('nrec', 'i4', ('member',))
+        n.long_name = "number of time records reduced"
+        n[:] = np.array(nrec, dtype='i4')
+
+        for v, vi in info.items():
+            for dim, size in zip(vi['dims'], vi['shape']):
+                if dim not in f.dimensions:
+                    f.createDimension(dim, size)
+
+        for name, x in out.items():
+            v, stat, ens = labels[name]
+            dims = info[v]['dims'] if ens else ('member',) + info[v]['dims']
+            if stat == 'count':
+                var = f.createVariable(name, 'i4', dims, zlib=True, complevel=1, shuffle=True)
+                var[:] = x.astype('i4')
+            else:
+                var = f.createVariable(name, 'f8', dims, zlib=True, complevel=1, shuffle=True,
+                                       fill_value=np.nan)
+                var[:] = x
+                if 'units' in info[v]['attrs'] and stat in ('mean', 'min', 'max'):
+                    var.units = info[v]['attrs']['units']
+            var.long_name = f"{stat} of {info[v]['attrs'].get('long_name', v)}" + \
+                            (", all members" if ens else "")
+            var.source_variable = v
+            var.statistic = stat
+    os.replace(tmp, outfile)
@@ -10,9 +10,16 @@ files:
 - `readparamfile(filename,...)` reads a parameter YAML file into an ordered
   dictionary
 - `stringifyvalues(d,...)` reformats the values in a parameter dictionary to
-  ROMS syntax strings
+  ROMS syntax strings (`formatvalue(kw,val,...)` formats a single value, and
+  `registerformatter(kw,func)` adds keyword-specific formatting rules)
 - `dict2standardin(d,...)` converts a parameter dictionary to standard input
   text, and optionally writes to file
+- `writestandardin(d,file,...)` and `iterstandardin(d,...)` stream standard
+  input text to a file (or file-like object) one entry at a time
+- `ensemble2standardin(base,overrides,files,...)` writes standard input files
+  for many variations on a base parameter dictionary
+- `standardin2dict(file,...)` reads a standard input file back into a
+  parameter dictionary
 - `converttimes(d,direction)` converts time-related parameter fields between ROMS
   format and datetimes/timedeltas.
 
@@ -23,27 +30,35 @@ simulations.
 - `runtodate(ocean,simdir,simname,enddate,...)` sets up I/O and runs ROMS
   simulation through indicated date, with options to restart and work past
   blowups
+- `validateinputs(ocean,...)` checks that input files exist and that forcing
+  files cover the simulation period
 - `simfolders(simdir)` generates folder path names for, and optionally creates,
   the 3 I/O folders used by runtodate
+- `ParamDict` is a parameter dictionary that tracks modified entries, so
+  repeated exports to standard input only re-format what has changed
 - `setoutfilenames(ocean,base,...)` resets the values of output file name
   parameters in a ROMS parameter dictionary to use a systematic naming scheme
 """
 
+import concurrent.futures
 import copy
-import csv
+import functools
 import glob
 import math
 import os
+import re
+import socket
 import subprocess
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import warnings
 
-import netCDF4 as nc
-
 import romscom.rcutils as r
+import romscom.stepcontrol as sc
 
 
-def readparamfile(filename, tconvert=False):
+def readparamfile(filename, tconvert=False, cache=False):
     """
     Reads parameter YAML file into an ordered dictionary
 
@@ -52,13 +67,21 @@ def readparamfile(filename, tconvert=False):
         tconvert (logical, optional): True to convert time-related fields to 
             datetimes and timedeltas, False (default) to keep in native ROMS 
             format.
+        cache (logical or string, optional): True to reuse a cached copy of
+            the parsed file if the file is unchanged since it was last read
+            (see rcutils.cachedparse), or name of the cache folder to use.
+            False (default) to always parse the YAML.
 
     Returns:
         (OrderedDict): ROMS parameter dictionary
     """
 
-    with open(filename, 'r') as f:
-        d = r.ordered_load(f)
+    if cache:
+        cachedir = cache if isinstance(cache, str) else None
+        d = r.cachedparse(filename, r.ordered_load, cachedir=cachedir)
+    else:
+        with open(filename, 'r') as f:
+            d = r.ordered_load(f)
 
     if tconvert:
         converttimes(d, "time")
@@ -76,7 +99,189 @@ def stringifyvalues(d, compress=False):
     delimited strings of the above (compressed using * for repeated values where
     applicable).  Values corresponding to a few special KEYWORDS (e.g., the
     'POS' station table, multi-file parameters, 'LBC' boundary conditions)
-    receive the appropriate formatting
+    receive the appropriate formatting (see formatvalue).  The 'POS' table can
+    be given as a list of [GRID, FLAG, X-POS, Y-POS] rows, an N x 4 array, or
+    the name of a CSV, NPY, or netCDF file holding the table, which is read
+    when the table is formatted (see rcutils.readstationtable).
+
+    Args:
+        d (dict): ROMS parameter dictionary compress (logical, optional): True
+            to compress repeated values (e.g., T T T -> 3*T), False (default) to
+            leave as is.
+
+    Returns:
+        (OrderedDict): new dictionary with the keys of d and all values
+            replaced by ROMS-formatted strings.  The input is not modified.
+    """
+
+    return OrderedDict((x, formatvalue(x, d[x], compress)) for x in d)
+
+def formatvalue(kw, val, compress=False):
+    """
+    Formats a single parameter value to ROMS standard input syntax
+
+    The formatter used for each keyword is looked up once (in the table of
+    keyword-specific formatters, then by keyword suffix, falling back to
+    type-based formatting) and reused for subsequent calls.  The input value is
+    not modified.
+
+    Args:
+        kw (string): parameter keyword
+        val: parameter value
+        compress (logical, optional): True to compress repeated values (e.g.,
+            T T T -> 3*T), False (default) to leave as is.
+
+    Returns:
+        (string, list of strings, or dict): ROMS-formatted value, as described
+            in stringifyvalues
+    """
+    if compress:
+        consecstep = 0
+    else:
+        consecstep = -99999
+    return _lookupformatter(kw)(kw, val, consecstep)
+
+def registerformatter(kw, func, suffix=False):
+    """
+    Registers a keyword-specific value formatter
+
+    Args:
+        kw (string): parameter keyword (or keyword suffix)
+        func (function): formatter, called as func(kw, val, consecstep) and
+            returning the formatted value.  consecstep is the step size passed
+            to rcutils.list2str (0 if compression was requested, -99999
+            otherwise).
+        suffix (logical, optional): True to apply the formatter to all
+            keywords ending in kw, False (default) to apply it only to kw
+            itself.  Exact matches take precedence over suffix matches.
+    """
+    if suffix:
+        _suffixformatters[kw] = func
+    else:
+        _keyformatters[kw] = func
+    _lookupformatter.cache_clear()
+
+@functools.lru_cache(maxsize=None)
+def _lookupformatter(kw):
+    if kw in _keyformatters:
+        return _keyformatters[kw]
+    for sfx in _suffixformatters:
+        if kw.endswith(sfx):
+            return _suffixformatters[sfx]
+    return _formatgeneric
+
+def _formatgeneric(kw, val, consecstep):
+    if isinstance(val, float):
+        return r.float2str(val)
+    elif isinstance(val, bool):
+        return r.bool2str(val)
+    elif isinstance(val, int):
+        return '{}'.format(val)
+    elif isinstance(val, list):
+        if isinstance(val[0], list):
+            return [r.list2str(i, consecstep=consecstep) for i in val]
+        else:
+            return r.list2str(val, consecstep=consecstep)
+    elif isinstance(val, dict):
+        return stringifyvalues(val, compress=(consecstep == 0))
+    else:
+        return copy.copy(val)
+
+def _formatnoplural(kw, val, consecstep):
+    return copy.copy(val)
+
+def _formatpos(kw, val, consecstep):
+    # Stations table: list of [GRID, FLAG, X-POS, Y-POS] rows, N x 4 array, or
+    # name of a file holding the table (see rcutils.readstationtable)
+    import numpy as np
+
+    if isinstance(val, str):
+        st = os.stat(val)
+        return _formatposfile(os.path.abspath(val), st.st_mtime_ns, st.st_size)
+    return _formatpostable(np.asarray(val, dtype=float).reshape(-1, 4))
+
+@functools.lru_cache(maxsize=8)
+def _formatposfile(fname, mtime, size):
+    # Station tables read from file, cached until the file changes
+    return _formatpostable(r.readstationtable(fname))
+
+def _formatpostable(tbl):
+    import numpy as np
+
+    tablestr = '{:14s}{:4s} {:4s} {:12s} {:12s} {:12s}'.format('', 'GRID','FLAG', 'X-POS', 'Y-POS', 'COMMENT')
+    if len(tbl) == 0:
+        return tablestr
+
+    grid, flag, x, y = tbl.T
+    if np.any(grid != np.round(grid)) or np.any((flag != 0) & (flag != 1)):
+        raise ValueError("POS station GRID values must be integers and FLAG values 0 or 1")
+    ll = flag == 1 # lat/lon pairs (otherwise I/J pairs)
+    if np.any(~ll & ((x != np.round(x)) | (y != np.round(y)))):
+        raise ValueError("POS station I/J positions (FLAG = 0) must be integers")
+
+    # One format string for the whole table, applied in a single operation
+    # (integer-valued floats format the same as ints with %d)
+    fmt = np.array([' '*17 + '%4d %4d %12d %12d', ' '*17 + '%4d %4d %12f %12f'])
+    fmt = '\n'.join([tablestr] + fmt[ll.astype(int)].tolist())
+    return fmt % tuple(tbl.ravel().tolist())
+
+def _formatmultifile(kw, val, consecstep):
+    # Multi-file entries (Single file strings are not modified)
+    if isinstance(val, list):
+        return r.multifile2str(list(val))
+    return val
+
+def _formatlbc(kw, val, consecstep):
+    # LBC values are grouped 4 per line
+    newval = OrderedDict()
+    for k in val:
+        if len(val[k]) > 4:
+            nline = len(val[k])//4
+            line = []
+            for ii in range(0,nline):
+                s = ii*4
+                e = ii*4 + 4
+                line.append(' '.join(val[k][s:e]))
+            delim = f" \\\n"
+            newval[k] = delim.join(line)
+        else:
+            newval[k] = ' '.join(val[k])
+    return newval
+
+def _formatfeast(kw, val, consecstep):
+    # FEAST parses arrays via repeated keywords
+    tmp = []
+    for ii in range(0,len(val)):
+        line = r.list2str(val[ii], consecstep=-99999)
+        if ii > 0:
+            line = f"{kw} == {line}"
+        tmp.append(line)
+    return '\n'.join(tmp)
+
+_keyformatters = {
+    'no_plural': _formatnoplural,
+    'POS': _formatpos,
+    'BRYNAME': _formatmultifile,
+    'CLMNAME': _formatmultifile,
+    'FRCNAME': _formatmultifile,
+}
+for _kw in ['fsh_age_offset', 'fsh_q_G', 'fsh_q_Gz', 'fsh_alpha_G',
+            'fsh_alpha_Gz', 'fsh_beta_G', 'fsh_beta_Gz', 'fsh_catch_sel',
+            'fsh_catch_01', 'fsh_catch_99']:
+    _keyformatters[_kw] = _formatfeast
+
+_suffixformatters = {
+    'LBC': _formatlbc,
+}
+
+def stringifyvalues_reference(d, compress=False):
+    """
+    Formats all dictionary values to ROMS standard input syntax (reference
+    implementation)
+
+    This is the original deep-copy implementation of stringifyvalues, retained
+    so that the output of the dispatch-table formatters can be verified
+    against it.  See stringifyvalues for a full description.
 
     Args:
         d (dict): ROMS parameter dictionary compress (logical, optional): True
@@ -158,7 +363,7 @@ def stringifyvalues(d, compress=False):
                 else:
                     newdict[x] = r.list2str(tmp, consecstep=consecstep)
             elif isinstance(newdict[x], dict):
-                    newdict[x] = stringifyvalues(newdict[x], compress=compress)
+                    newdict[x] = stringifyvalues_reference(newdict[x], compress=compress)
 
     return newdict
 
@@ -178,41 +383,596 @@ def dict2standardin(d, compress=False, file=None):
         (string): standard input text (only if output file not provided)
 
     """
-    if 'DT' in d:
-        istime = r.fieldsaretime(d)
+    if file is None:
+        return ''.join(iterstandardin(d, compress=compress))
+    else:
+        writestandardin(d, file, compress=compress)
+
+def iterstandardin(d, compress=False):
+    """
+    Generates standard input text from a parameter dictionary, one entry at a
+    time
+
+    Values are formatted key by key as the generator is consumed, so only one
+    formatted value is held in memory at any time.  The input dictionary is not
+    modified; if its time-related fields are in datetime/timedelta format, they
+    are converted to ROMS format on a shallow copy.
+
+    Args:
+        d (dict): parameter dictionary
+        compress (logical, optional): True to compress repeated values (e.g.,
+            T T T -> 3*T), False (default) to leave as is.
+
+    Yields:
+        (string): standard input lines, e.g. 'key == value\n'.  Multi-line
+            values (station tables, multi-file lists, etc.) are yielded as a
+            single string.
+    """
+    d = _romsview(d)
+    no_plural = d.get('no_plural', [])
+    for ky in d:
+        if ky == 'no_plural':
+            continue
+        val = formatvalue(ky, d[ky], compress)
+        yield from r.formatentry(ky, val, no_plural)
+
+def writestandardin(d, file, compress=False):
+    """
+    Streams a parameter dictionary to a standard input file
+
+    Args:
+        d (dict): parameter dictionary
+        file (string or file object): name of output file, or an open,
+            writable text file-like object
+        compress (logical, optional): True to compress repeated values (e.g.,
+            T T T -> 3*T), False (default) to leave as is.
+    """
+    if hasattr(file, 'write'):
+        for line in iterstandardin(d, compress=compress):
+            file.write(line)
+    else:
+        with open(file, 'w') as f:
+            for line in iterstandardin(d, compress=compress):
+                f.write(line)
+
+def ensemble2standardin(base, overrides, files, compress=False, nproc=None):
+    """
+    Writes standard input files for an ensemble of parameter variations
+
+    Each ensemble member is defined by a set of overrides applied to a shared
+    base parameter dictionary.  The base dictionary is formatted once, and
+    only the overridden entries (plus time-related fields, if the base
+    dictionary is in datetime/timedelta format) are re-formatted for each
+    member.  Member files are written through a pool of worker processes.
+
+    Args:
+        base (dict): base ROMS parameter dictionary
+        overrides (list of dicts): one dictionary per ensemble member, holding
+            replacement values for top-level keys of base (nested
+            dictionaries, e.g. LBC, are replaced as a whole).  Keys not in base
+            are appended to the end of the member's file.
+        files (list of strings): names of standard input files to create, one
+            per ensemble member
+        compress (logical, optional): True to compress repeated values (e.g.,
+            T T T -> 3*T), False (default) to leave as is.
+        nproc (int, optional): number of worker processes.  Default (None)
+            uses one per CPU; 1 writes the files serially in this process.
+
+    Returns:
+        (list of strings): names of the files written
+    """
+    if len(overrides) != len(files):
+        raise ValueError("overrides and files must be the same length")
+
+    if ('DT' in base) and r.fieldsaretime(base):
+        timekeys = ['DT', 'DSTART', 'TIME_REF'] + r.timefieldlist(base)
+    else:
+        timekeys = []
+
+    baseroms = _romsview(base)
+    baselines = OrderedDict()
+    for ky in baseroms:
+        if ky != 'no_plural':
+            val = formatvalue(ky, baseroms[ky], compress)
+            baselines[ky] = ''.join(r.formatentry(ky, val, baseroms.get('no_plural', [])))
+
+    initargs = (base, baselines, timekeys, compress)
+
+    if nproc == 1 or len(files) < 2:
+        _initensemble(*initargs)
+        for o, f in zip(overrides, files):
+            _writeensemblemember(o, f)
     else:
-        istime = False
-    if istime:
+        nproc = nproc or os.cpu_count()
+        chunk = max(1, len(files)//(4*nproc))
+        with concurrent.futures.ProcessPoolExecutor(nproc, initializer=_initensemble,
+                                                    initargs=initargs) as ex:
+            for _ in ex.map(_writeensemblemember, overrides, files, chunksize=chunk):
+                pass
+
+    return list(files)
+
+_ensemble = {}
+
+def _initensemble(base, baselines, timekeys, compress):
+    _ensemble.update(base=base, baselines=baselines, timekeys=timekeys,
+                     compress=compress)
+
+def _writeensemblemember(override, file):
+    base = _ensemble['base']
+    baselines = _ensemble['baselines']
+    compress = _ensemble['compress']
+
+    d = copy.copy(base)
+    d.update(override)
+    d = _romsview(d)
+    no_plural = d.get('no_plural', [])
+
+    if 'no_plural' in override:
+        dirty = set(d)
+    else:
+        dirty = set(override).union(_ensemble['timekeys'])
+
+    with open(file, 'w') as f:
+        for ky in d:
+            if ky == 'no_plural':
+                continue
+            if (ky in dirty) or (ky not in baselines):
+                for line in r.formatentry(ky, formatvalue(ky, d[ky], compress), no_plural):
+                    f.write(line)
+            else:
+                f.write(baselines[ky])
+
+def _romsview(d):
+    """
+    Returns d if its time-related fields are in ROMS format, otherwise a
+    shallow copy of d with those fields converted to ROMS format
+    """
+    if ('DT' in d) and r.fieldsaretime(d):
+        d = copy.copy(d)
         converttimes(d, "ROMS")
-    dstr = stringifyvalues(d, compress)
-    no_plural = dstr.pop('no_plural')
-    txt = []
-    for ky in dstr:
-        if isinstance(dstr[ky], list):
-            for i in dstr[ky]:
-                txt.append(r.formatkeyvalue(ky, i, no_plural))
-        elif isinstance(dstr[ky], dict):
-            for i in dstr[ky]:
-                newkey = '{}({})'.format(ky,i)
-                txt.append(r.formatkeyvalue(newkey, dstr[ky][i], no_plural))
-        else:
-            txt.append(r.formatkeyvalue(ky, dstr[ky], no_plural))
+    return d
 
-    delim =  ''
-    txt = delim.join(txt)
+def standardin2dict(file, tconvert=False):
+    """
+    Reads a ROMS standard input (.in) file into a parameter dictionary
+
+    This is the inverse of dict2standardin.  The file is parsed line by line,
+    following ROMS standard input syntax: `!` comments, `=` and `==`
+    assignments (keys assigned with `=` are collected in the 'no_plural'
+    entry), `\\` line continuations, `|`-joined multi-file entries,
+    repeated-value notation (e.g. 3*T), Fortran-style d exponents and T/F
+    booleans.  Entries of the form `KEY(idx) == value` (e.g. LBC) are collected
+    into a dictionary under KEY, repeated keywords are collected as a list of
+    lists, and the 'POS' station table is read into a list of
+    [GRID, FLAG, X-POS, Y-POS] rows.
+
+    Standard input does not record whether a single value was a scalar or a
+    one-element list, so single values are returned as scalars.  Values made up
+    of multiple plain words (e.g. advection schemes) are returned as lists of
+    strings; free text (e.g. TITLE) is returned as a single string.
+
+    Args:
+        file (string or file object): name of standard input file, or an open
+            text file-like object
+        tconvert (logical, optional): True to convert time-related fields to
+            datetimes and timedeltas, False (default) to keep in native ROMS
+            format.
+
+    Returns:
+        (OrderedDict): ROMS parameter dictionary
+    """
+    if hasattr(file, 'read'):
+        entries = _readstandardinentries(file)
+    else:
+        with open(file, 'r') as f:
+            entries = _readstandardinentries(f)
+
+    d = OrderedDict()
+    d['no_plural'] = []
+    repeated = set()
+
+    for key, op, frags in entries:
+        m = re.match(r"(\w+)\((.*)\)$", key)
+        base = m.group(1) if m else key
+
+        if op == '=' and base not in d['no_plural']:
+            d['no_plural'].append(base)
+
+        if m:
+            if not isinstance(d.get(base), dict):
+                d[base] = OrderedDict()
+            d[base][m.group(2)] = _parsestandardinvalue(base, frags)
+            continue
+
+        val = _parsestandardinvalue(key, frags)
+        if key in repeated:
+            d[key].append(val if isinstance(val, list) else [val])
+        elif key in d:
+            prev = d[key]
+            d[key] = [prev if isinstance(prev, list) else [prev],
+                      val if isinstance(val, list) else [val]]
+            repeated.add(key)
+        else:
+            d[key] = val
 
-    if istime:
+    if tconvert and ('DT' in d):
         converttimes(d, "time")
 
-    if file is None:
-        return txt
+    return d
+
+def standardin2dicts(files, tconvert=False, nproc=None):
+    """
+    Reads many ROMS standard input files into parameter dictionaries in
+    parallel
+
+    Args:
+        files (list of strings, or string): names of standard input files, or
+            name of a folder, in which case all .in files in that folder are
+            read (e.g. the <simdir>/In folder populated by runtodate)
+        tconvert (logical, optional): True to convert time-related fields to
+            datetimes and timedeltas, False (default) to keep in native ROMS
+            format.
+        nproc (int, optional): number of worker processes.  Default (None)
+            uses one per CPU; 1 reads the files serially in this process.
+
+    Returns:
+        (OrderedDict): parameter dictionaries (see standardin2dict), keyed by
+            file name, in the order of the input list
+    """
+    if isinstance(files, str):
+        files = sorted(glob.glob(os.path.join(files, "*.in")))
+
+    if nproc == 1 or len(files) < 2:
+        d = [standardin2dict(f, tconvert) for f in files]
     else:
-        with open(file, 'w') as f:
-            f.write(txt)
+        nproc = nproc or os.cpu_count()
+        chunk = max(1, len(files)//(4*nproc))
+        with concurrent.futures.ProcessPoolExecutor(nproc) as ex:
+            d = list(ex.map(standardin2dict, files, [tconvert]*len(files),
+                            chunksize=chunk))
+
+    return OrderedDict(zip(files, d))
+
+_assignpattern = re.compile(r"\s*([A-Za-z_]\w*(\([^)]*\))?)\s*(==|=)(.*)$")
+_wordpattern = re.compile(r"[\w.+\-/]+$")
+
+def _readstandardinentries(lines):
+    # Collect [key, operator, value text fragments] for each assignment.
+    # Continued lines, and station table rows following a POS assignment, are
+    # added as additional fragments
+
+    entries = []
+    cont = False
+    for line in lines:
+        line = line.split('!', 1)[0].rstrip()
+        if cont:
+            entries[-1][2].append(line)
+        else:
+            m = _assignpattern.match(line)
+            if m:
+                entries.append([m.group(1), m.group(3), [m.group(4)]])
+            elif line.strip() and entries and entries[-1][0] == 'POS':
+                entries[-1][2].append(line)
+        cont = line.endswith('\\') or line.endswith('|')
+    return entries
+
+def _parsestandardinvalue(key, frags):
+    if key == 'POS':
+        rows = []
+        for frag in frags:
+            row = [r.str2value(x) for x in frag.split()[:4]]
+            if len(row) < 4 or not isinstance(row[0], int):
+                continue # header
+            if row[1] == 1:
+                row[2:] = [float(x) for x in row[2:]]
+            else:
+                row[2:] = [int(x) for x in row[2:]]
+            rows.append(row)
+        return rows
+
+    if _lookupformatter(key) is _formatmultifile:
+        return r.str2multifile(' '.join(frags))
+
+    text = ' '.join(frags).replace('\\', ' ').replace('|', ' ')
+    vals = r.str2list(text)
+
+    if key.endswith('LBC'):
+        return [str(x) for x in vals]
+    if any(isinstance(x, str) for x in vals):
+        if (key == 'TITLE' or
+            not all(isinstance(x, str) and _wordpattern.match(x) for x in vals)):
+            return ' '.join(text.split())
+    if len(vals) == 1:
+        return vals[0]
+    return vals
+
+class ParamDict(OrderedDict):
+    """
+    ROMS parameter dictionary that tracks which entries have changed
+
+    A ParamDict behaves like the OrderedDict returned by readparamfile, but
+    keeps the standard input text last rendered for each entry.  When written
+    to standard input again (see tostandardin), only the entries assigned
+    since the previous render are re-formatted.  Time-related fields may be
+    kept in datetime/timedelta format; their ROMS-format equivalents are
+    computed at render time (and re-formatted only if they changed), so the
+    dictionary itself never needs to be converted back and forth.
+
+    Entries are marked as modified when assigned (d[key] = value, update,
+    setdefault) or removed (del, pop, popitem, clear).  Mutable values that are modified in place (e.g. d['AKT_BAK'][0] = 1e-5)
+    must be flagged via touch(key).
+
+    Args:
+        *args, **kwargs: as for OrderedDict, e.g. ParamDict(readparamfile(f))
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._dirty = set()
+        self._lines = {}
+        self._romstimes = {}
+        self._compress = None
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if not (isinstance(value, _immutabletypes) and (key in self) and
+                (type(self[key]) is type(value)) and (self[key] == value)):
+            self._dirty.add(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._dirty.add(key)
+
+    # OrderedDict's own pop, popitem, setdefault, and clear don't go through
+    # __setitem__/__delitem__, so they flag entries themselves
+
+    def pop(self, key, *args):
+        if key in self:
+            self._dirty.add(key)
+        return super().pop(key, *args)
+
+    def popitem(self, last=True):
+        key, value = super().popitem(last=last)
+        self._dirty.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def clear(self):
+        super().clear()
+        self._lines.clear()
+        self._romstimes = {}
+
+    def __copy__(self):
+        return self.__class__(self)
+
+    def copy(self):
+        return self.__class__(self)
+
+    def touch(self, *keys):
+        """
+        Flags entries as modified, e.g. after in-place changes to their values
+
+        Args:
+            *keys (strings): keys to flag.  If none are given, all entries
+                will be re-formatted on the next render.
+        """
+        if keys:
+            self._dirty.update(keys)
+        else:
+            self._lines.clear()
+
+    def modified(self):
+        """
+        Keys modified since the last render
+
+        Returns:
+            (set of strings): keys assigned, deleted, or touched since the last
+                call to tostandardin
+        """
+        return set(self._dirty)
+
+    def tostandardin(self, file=None, compress=False):
+        """
+        Converts to standard input text, and optionally writes to file
+
+        Args:
+            file (string, file object, or None): name of output file, or an
+                open text file-like object.  If None (default), text is
+                returned.
+            compress (logical, optional): True to compress repeated values
+                (e.g., T T T -> 3*T), False (default) to leave as is.
+
+        Returns:
+            (string): standard input text (only if output file not provided)
+        """
+        if (compress != self._compress) or ('no_plural' in self._dirty):
+            self._lines.clear()
+        self._compress = compress
+
+        # ROMS-format time fields, re-rendered only if their value changed
+
+        romstimes = {}
+        if 'DT' in self:
+            romstimes = {k: self[k] for k in ['DT', 'DSTART', 'TIME_REF'] + r.timefieldlist(self)}
+            if r.fieldsaretime(romstimes):
+                converttimes(romstimes, "ROMS")
+            for k in romstimes:
+                if (k not in self._romstimes) or (romstimes[k] != self._romstimes[k]):
+                    self._dirty.add(k)
+            self._romstimes = romstimes
+
+        no_plural = self.get('no_plural', [])
+        for ky in self:
+            if (ky != 'no_plural') and ((ky in self._dirty) or (ky not in self._lines)):
+                val = romstimes[ky] if ky in romstimes else self[ky]
+                self._lines[ky] = ''.join(r.formatentry(ky, formatvalue(ky, val, compress), no_plural))
+        self._dirty.clear()
+
+        lines = (self._lines[ky] for ky in self if ky != 'no_plural')
+        if file is None:
+            return ''.join(lines)
+        elif hasattr(file, 'write'):
+            file.writelines(lines)
+        else:
+            with open(file, 'w') as f:
+                f.writelines(lines)
+
+_immutabletypes = (str, int, float, bool, datetime, timedelta, type(None))
+
+def validateinputs(ocean, start=None, end=None, nproc=None):
+    """
+    Pre-flight check of ROMS input files
+
+    Checks that all input files exist (see rcutils.inputfiles), and that the
+    time axes of the forcing, boundary, and climatology files (FRCNAME,
+    BRYNAME, CLMNAME) cover the simulation period.  Files are checked in
+    parallel, and only their time variables are read (see
+    rcutils.readtimeaxes, which also caches the results for unchanged files).
+    Entries pointing to non-regular files (e.g. /dev/null, a common choice for
+    unused inputs) are only checked for existence.
+
+    Time variables are grouped by name within each entry of a parameter, so a
+    series split over several files (a nested list, i.e. files joined by
+    vertical bars in standard input) is checked as a whole, while separate
+    entries that happen to share a time variable name are checked separately.
+    Variables with a cycle_length attribute (climatologies) or a single record
+    (time-invariant fields) are not checked.  Non-standard calendars (e.g.
+    noleap, 360_day) are compared in their own calendar; variables whose
+    calendar doesn't include the simulation start or end date (or that mix
+    calendars within one series) are skipped with a warning.
+
+    Args:
+        ocean (dict): ROMS parameter dictionary (ROMS or datetime/timedelta
+            format; not modified)
+        start (datetime, optional): start of simulation period.  Default is
+            DSTART
+        end (datetime, optional): end of simulation period.  Default is
+            start + NTIMES*DT
+        nproc (int, optional): maximum number of processes used to read
+            files.  Default is the number of CPUs.
+
+    Returns:
+        (dict): with the following keys:
+
+            Key         |Value type|Value description
+            ------------|----------|-----------------
+            `ok`        |`bool`    |True if no files are missing or unreadable and there are no gaps
+            `window`    |`tuple`   |start and end datetimes checked
+            `missing`   |`list`    |input files that do not exist
+            `unreadable`|`list`    |forcing files that could not be read, as (file, error message) tuples
+            `gaps`      |`list`    |one dict per time variable that doesn't cover the simulation period (see below)
+
+            Each gap dict holds the parameter `key`, time `variable` name,
+            `files` that hold the variable, and the `first` and `last` times
+            found (cftime dates for non-standard calendars), plus `late` and
+            `early`, the timedeltas by which the first time is after the
+            start, and the last time before the end, of the simulation period
+            (None where the period is covered).
+    """
+    import netCDF4 as nc
+
+    d = OrderedDict(ocean)
+    converttimes(d, "time")
+    if start is None:
+        start = d['DSTART']
+    if end is None:
+        end = start + d['NTIMES']
+    start, end = _pydatetime(start), _pydatetime(end)
+
+    report = {'ok': True, 'window': (start, end), 'missing': [], 'unreadable': [], 'gaps': []}
+
+    # Existence check, for all files at once
+
+    files = r.inputfiles(d)
+    allfiles = list(OrderedDict.fromkeys(r.flatten(list(files.values()))))
+    with concurrent.futures.ThreadPoolExecutor(min(32, len(allfiles) or 1)) as ex:
+        exists = dict(zip(allfiles, ex.map(os.path.exists, allfiles)))
+    report['missing'] = [f for f in allfiles if not exists[f]]
+
+    # Time coverage of forcing files
+
+    tkeys = [k for k in ('FRCNAME', 'BRYNAME', 'CLMNAME') if k in files]
+    tfiles = list(OrderedDict.fromkeys(f for k in tkeys for f in files[k]
+                                       if exists[f] and os.path.isfile(f))) # skips /dev/null
+    axes = r.readtimeaxes(tfiles, nproc=nproc)
+
+    tref = d['TIME_REF'].strftime('%Y-%m-%d %H:%M:%S')
+    for k in tkeys:
+        # One group per entry of the parameter; a nested list is a series
+        # split over several files, which is checked as a whole
+        groups = d[k] if isinstance(d[k], list) else [d[k]]
+        groups = [[f for f in r.flatten([g]) if f in axes] for g in groups]
+        cover = OrderedDict()
+        for gi, f in ((gi, f) for gi, g in enumerate(groups) for f in g):
+            if isinstance(axes[f], BaseException):
+                report['unreadable'].append((f, str(axes[f])))
+                continue
+            for v, ax in axes[f].items():
+                if ax['cycle'] or ax['nrec'] == 0:
+                    continue
+                units = ax['units'] if 'since' in ax['units'] else f"{ax['units'].strip()} since {tref}"
+                try:
+                    t = nc.num2date([ax['min'], ax['max']], units, calendar=ax['calendar'],
+                                    only_use_cftime_datetimes=False)
+                except ValueError as e:
+                    report['unreadable'].append((f, f"{v}: {e}"))
+                    continue
+                try:
+                    window = _calendarwindow(t[0], start, end)
+                except ValueError as e:
+                    warnings.warn(f"{k} variable {v} in {f} not checked: {e}")
+                    continue
+                c = cover.setdefault((gi, v), {'files': [], 'first': t[0], 'last': t[1],
+                                               'nrec': 0, 'window': window})
+                try:
+                    c['first'] = min(c['first'], t[0])
+                    c['last'] = max(c['last'], t[1])
+                except TypeError:
+                    warnings.warn(f"{k} variable {v} in {f} not checked: calendar "
+                                  f"differs from {c['files'][0]}")
+                    continue
+                c['files'].append(f)
+                c['nrec'] += ax['nrec']
+
+        for (gi, v), c in cover.items():
+            if c['nrec'] == 1:
+                continue
+            t0, t1 = c['window']
+            late = c['first'] - t0 if c['first'] > t0 else None
+            early = t1 - c['last'] if c['last'] < t1 else None
+            if late or early:
+                report['gaps'].append({'key': k, 'variable': v, 'files': c['files'],
+                                       'first': c['first'], 'last': c['last'],
+                                       'late': late, 'early': early})
+
+    report['ok'] = not (report['missing'] or report['unreadable'] or report['gaps'])
+    return report
+
+def _calendarwindow(t, start, end):
+    # Start and end datetimes in the calendar of date t: unchanged for
+    # real-world calendars (where num2date returns datetimes), otherwise as
+    # cftime dates (e.g. noleap, 360_day).  Raises ValueError if either date
+    # doesn't exist in that calendar (e.g. Feb 29 in noleap)
+    if isinstance(t, datetime):
+        return start, end
+    import cftime
+    return tuple(cftime.datetime(x.year, x.month, x.day, x.hour, x.minute, x.second,
+                                 x.microsecond, calendar=t.calendar) for x in (start, end))
+
+def _pydatetime(t):
+    # datetime from a datetime-like (e.g. cftime) object
+    return datetime(t.year, t.month, t.day, t.hour, t.minute, t.second, t.microsecond)
 
 def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
                compress=False, romscmd=["mpirun","romsM"], dryrunflag=True,
-               permissions=0o755, count=1, runpastblowup=True):
+               permissions=0o755, count=1, runpastblowup=True, monitor=False,
+               maxke=None, stepcontrol=None, metrics=True, prometheus=False,
+               hooks=None):
     """
     Sets up I/O and runs ROMS simulation through indicated date
                
@@ -230,8 +990,16 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
     appropriately-named restart file under the <simdir>/Out subfolder. If found,
     it uses this restart file to initialize a run with NRREC=-1; otherwise, it
     will use the user-provided ININAME and NRREC values. It also adjusts the
-    NTIMES field to reach the requested end date.
-               
+    NTIMES field to reach the requested end date, and checks that all input
+    files exist and that forcing files cover the period through that date (see
+    validateinputs).
+
+    Progress is recorded in a run-state manifest,
+    <simdir>/Log/<simname>_manifest.json, updated after every simulation block
+    (see rcutils.writemanifest).  On restart, the latest restart file and its
+    model time are taken from the manifest; the restart files are only scanned
+    if the manifest is missing or out of date.
+
     This procedure allows a simulation to be restarted using the same call to
     runtodate regardless of whether it has been partially completed or not; this
     can be useful when running simulations on computer clusters where jobs may
@@ -247,7 +1015,22 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
     return to the original time step and resume. Note that this time step
     reduction will only be attempted once; if the model still blows up, the
     simulation will exit and the user will need to troubleshoot the situation.
+    Other strategies (e.g. several levels of time step reduction, or
+    returning to the original time step early) can be used via the
+    stepcontrol option.  Slow-step periods are recorded in
+    <simdir>/Log/<simname>_step.txt, and reused if the simulation is restarted.
                
+    Performance metrics for each simulation block are appended to
+    <simdir>/Log/<simname>_metrics.jsonl, one JSON record per line, with
+    keys `simname`, `count` (block counter), `status` ('success', 'blowup', or
+    'error'), `start` and `end` (model time), `wallstart` (wall clock start
+    time), `walltime` (seconds), `host`, `dt` (seconds), `slow` (true if run
+    in a slow-step period), `steps` (time steps completed, from the log),
+    `modeldays`, `modeldaysperhour`, `stepspersecond`, `outputbytes`
+    (bytes added to the <simdir>/Out folder), and `iofrac` and `mpifrac`
+    (fractions of run time spent in I/O and MPI communication, from the ROMS
+    timing profile; see rcutils.profilesummary).
+
     Each time the model is restarted, output file counters are incremented as
     specified by the addcounter option.  This preserves output that would
     otherwise be overwritten on restart with the same simulation name.  By
@@ -255,7 +1038,13 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
     check for on restart.
 
     Args:
-        ocean (dict): ROMS parameter dictionary for standard input simdir
+        ocean (dict): ROMS parameter dictionary for standard input.  Time
+            fields are converted to datetime/timedelta format in place, and
+            the dictionary is updated in place with the inputs of each block
+            (ININAME, NRREC, DT, NTIMES, output file names), so on return it
+            holds those of the last block.  Dictionaries other than a
+            ParamDict are run via a ParamDict copy, which is copied back on
+            return. simdir
         (string): folder where I/O subfolders are found/created simname
         (string): base name for simulation, used as prefix for 
             auto-generated input, standard output and error files, and .nc
@@ -288,6 +1077,26 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
         count (int, optional): Starting index for file counter. runpastblowup
         (logical,optional): True to attempt time step reduction if the
             model blows up, false otherwise
+        monitor (logical, optional): True to watch the standard output while
+            ROMS runs, and terminate the ROMS process group as soon as a
+            blowup is detected (see rcutils.watchromslog), rather than waiting
+            for ROMS to exit.  Default is False
+        maxke (float, optional): when monitoring, kinetic energy above which
+            the simulation is treated as blown up.  Default (None) only checks
+            for blowup messages and NaNs
+        stepcontrol (object, optional): slow-step policy (see
+            romscom.stepcontrol), which decides the time step and length of
+            the slow-step period after each blowup.  Default is
+            StepControl(dtslow), i.e. the behavior described above.
+        metrics (logical, optional): True (default) to append performance
+            metrics for each simulation block to
+            <simdir>/Log/<simname>_metrics.jsonl (see below)
+        prometheus (logical, optional): True to also write the latest block's
+            metrics to <simdir>/Log/<simname>_metrics.prom, in Prometheus
+            text format.  Default is False
+        hooks (list of functions, optional): functions called with the
+            metrics record of each simulation block (e.g. to send it to a
+            database or monitoring service)
                
     Returns:     
         (string): indicator of ROMS simulation results, will be one of:
@@ -295,28 +1104,65 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
             - 'dryrun': dryrunflag was True, no simulation was attempted
             - 'blowup': simulation blew up (either with runpastblowup off, or 
                reduction of time step did not mitigate blowup)
-            - 'error': simulation encountered an error other than a blowup
+            - 'error': simulation encountered an error other than a blowup,
+               or input files were missing or did not cover the simulation
+               period (see validateinputs)
             - 'success': simulation completed successfully
     """
+    converttimes(ocean, "time") # make sure we're in datetime/timedelta mode
+    opts = dict(dtslow=dtslow, addcounter=addcounter, compress=compress, romscmd=romscmd,
+                dryrunflag=dryrunflag, permissions=permissions, count=count,
+                runpastblowup=runpastblowup, monitor=monitor, maxke=maxke,
+                stepcontrol=stepcontrol, metrics=metrics, prometheus=prometheus,
+                hooks=hooks)
+    if isinstance(ocean, ParamDict):
+        return _runtodate(ocean, simdir, simname, enddate, **opts)
+
+    # Run on a ParamDict copy, so only changed entries are re-rendered between
+    # blocks, and copy the last block's inputs back to the caller's dictionary
+    pd = ParamDict(ocean)
+    try:
+        return _runtodate(pd, simdir, simname, enddate, **opts)
+    finally:
+        ocean.update(pd)
+
+def _runtodate(ocean, simdir, simname, enddate, dtslow, addcounter, compress, romscmd,
+               dryrunflag, permissions, count, runpastblowup, monitor, maxke, stepcontrol,
+               metrics, prometheus, hooks):
+    # Body of runtodate, updating ocean (a ParamDict, in datetime/timedelta
+    # format) in place
+    import netCDF4 as nc
 
     # Get some stuff from dictionary, before we make changes
 
-    converttimes(ocean, "time") # make sure we're in datetime/timedelta mode
     inifile = ocean['ININAME']
     dt = ocean['DT']
     drst = ocean['NRST']
     nrrec = ocean['NRREC']
-    if dtslow is None:
-        dtslow = dt/2
+    if stepcontrol is None:
+        stepcontrol = sc.StepControl(dtslow)
 
     # Set up input, output, and log folders
 
     fol = simfolders(simdir, create=True, permissions=permissions)
+    filebase = os.path.join(fol['out'], simname)
+
+    # Initialization file: look up the latest restart file in the run-state
+    # manifest, or if the manifest is missing or stale, check for any existing
+    # restart files.  If none are found, start from the initialization file
+
+    manifest = os.path.join(fol['log'], f"{simname}_manifest.json")
+    m = r.readmanifest(manifest)
+    rstinfo = r.manifestrestart(m, filebase)
+    if rstinfo is None:
+        rstinfo = r.parserst(filebase)
+        if m is None:
+            m = {'version': 1, 'simname': simname, 'restart': None, 'blocks': [], 'slowsteps': []}
+        m['restart'] = None
+        writeflag = True
+    else:
+        writeflag = False
 
-    # Initialization file: check for any existing restart files, and if not
-    # found, start from the initialization file
-
-    rstinfo = r.parserst(os.path.join(fol['out'], simname))
     if rstinfo['lastfile']:
         cnt = rstinfo['count']
         ocean['ININAME'] = rstinfo['lastfile']
@@ -326,12 +1172,6 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
         ocean['ININAME'] = inifile
         ocean['NRREC'] = nrrec
 
-    # Check that all input files exist (better to do this here than let ROMS try and fail)
-
-    flag = r.inputfilesexist(ocean)
-    if not flag:
-        Exception("Input file missing, exiting")
-    
     # Get starting time from initialization file
     # TODO: Eventually would like to support other ROMS-supported calendar 
     # options (e.g., 360_day) but it would require tracking the TIME_REF flags 
@@ -340,49 +1180,70 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
     # calendar info and/or reference dates in their time attributes are properly
     # synced with the TIME_REF parameter
 
-    f = nc.Dataset(ocean['ININAME'], 'r')
-    tunit = f.variables['ocean_time'].units
-
-    if "day" in tunit:
-        tunit = "days"
-    elif "second" in tunit:
-        tunit = "seconds"
-    else:
-        warnings.warn("Your initialization time unit will be interpreted by ROMS as seconds")
-        tunit = "seconds"
-    tunit = f"{tunit} since {ocean['TIME_REF'].strftime("%Y-%m-%d %H:%M:%S")}"        
-    tini = max(nc.num2date(f.variables['ocean_time'][:], units=tunit, calendar='proleptic_gregorian'))
+    tini = rstinfo.get('time')
+    if tini is None:
+        with r.ncopen(ocean['ININAME']) as f:
+            tunit = f.variables['ocean_time'].units
 
-    # Create log file to document slow-stepping time periods
+            if "day" in tunit:
+                tunit = "days"
+            elif "second" in tunit:
+                tunit = "seconds"
+            else:
+                warnings.warn("Your initialization time unit will be interpreted by ROMS as seconds")
+                tunit = "seconds"
+            tunit = f"{tunit} since {ocean['TIME_REF'].strftime('%Y-%m-%d %H:%M:%S')}"
+            tini = max(nc.num2date(f.variables['ocean_time'][:], units=tunit, calendar='proleptic_gregorian'))
+        if rstinfo['lastfile']:
+            m['restart'] = _rstrecord(rstinfo, tini)
+            writeflag = True
+
+    # Check that all input files exist, and that forcing files cover the
+    # simulation period (better to do this here than let ROMS try and fail)
+
+    report = validateinputs(ocean, start=tini, end=enddate)
+    for f in report['missing']:
+        print(f"Missing input file: {f}")
+    for f, err in report['unreadable']:
+        print(f"Unreadable input file: {f} ({err})")
+    for g in report['gaps']:
+        print(f"{g['key']} variable {g['variable']} only covers {g['first']} to {g['last']}")
+    if (not report['ok']) and (not dryrunflag):
+        print("Input file check failed, exiting")
+        return 'error'
+
+    # Create log file to document slow-stepping time periods (or read the
+    # existing periods, once, if it's already there)
 
     steplog = os.path.join(fol['log'], f"{simname}_step.txt")
 
+    slowsteps = sc.readsteplog(steplog, stepcontrol.slowdt(dt))
     if not os.path.isfile(steplog):
         fstep = open(steplog, "w+")
         fstep.close()
 
+    stepiso = _stepiso(slowsteps)
+    if m['slowsteps'] != stepiso:
+        m['slowsteps'] = stepiso
+        writeflag = True
+
     # Run sim
 
     while tini < (enddate - drst):
 
         # Set end date as furthest point we can run.  This will be either
-        # the simulation end date  or the end of the slow-stepping period (if we
-        # are in one), whichever comes first
+        # the simulation end date  or the end of the slow-stepping block (if we
+        # are in a slow-step period), whichever comes first
 
         # Check if in slow-stepping period
 
-        endslow = enddate
-        ocean['DT'] = dt
-        with open(steplog) as fstep:
-            readCSV = csv.reader(fstep, delimiter=',')
-            for row in readCSV:
-                t1 = datetime.strptime(row[0], '%Y-%m-%d-%H-%M:%S')
-                t2 = datetime.strptime(row[1], '%Y-%m-%d-%H-%M:%S')
-                if (tini >= t1) & (tini <= (t2-drst)): # in a slow-step period
-                    endslow = t2
-                    ocean['DT'] = dtslow
-
-        tend = min(enddate, endslow)
+        period = sc.activeperiod(slowsteps, tini, drst)
+        if period is None:
+            ocean['DT'] = dt
+            tend = enddate
+        else:
+            ocean['DT'] = period[2]
+            tend = min(enddate, stepcontrol.blockend(tini, period))
         # ocean['NTIMES'] = tend - ocean['DSTART']
         ocean['NTIMES'] = tend - tini
 
@@ -398,9 +1259,7 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
 
         # Export parameters to standard input file
 
-        converttimes(ocean, "ROMS")
-        dict2standardin(ocean, compress=compress, file=standinfile)
-        converttimes(ocean, "time")
+        ocean.tostandardin(standinfile, compress=compress)
 
         # Print summary
 
@@ -419,10 +1278,43 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
             print("Dry run")
             return 'dryrun'
         else:
+            if writeflag:
+                r.writemanifest(manifest, m)
+                writeflag = False
+            r.ncpool.close() # release cached handles before ROMS writes to them
+            outsize = r.foldersizes(fol['out'])
+            wallstart = datetime.now()
+            wall0 = time.perf_counter()
             with open(standoutfile, 'w') as fout, open(standerrfile, 'w') as ferr:
-                subprocess.run(romscmd+[standinfile], stdout=fout, stderr=ferr)
+                if monitor:
+                    # Unbuffered gfortran output, so the log can be read as it's written
+                    env = dict(os.environ)
+                    env.setdefault('GFORTRAN_UNBUFFERED_PRECONNECTED', 'y')
+                    proc = subprocess.Popen(romscmd+[standinfile], stdout=fout, stderr=ferr,
+                                            env=env, start_new_session=True)
+                    rwatch = r.watchromslog(proc, standoutfile, maxke=maxke)
+                else:
+                    subprocess.run(romscmd+[standinfile], stdout=fout, stderr=ferr)
+
+            walltime = time.perf_counter() - wall0
 
-        rsim = r.parseromslog(standoutfile)
+        # Finish reading the log (only what the watcher hasn't read already)
+        log = r.readromslog(standoutfile, log=rwatch['log'] if monitor else None)
+        rsim = r.parseromslog(standoutfile, log=log)
+        if monitor and rwatch['killed']:
+            print(f"  Simulation block stopped early: {rwatch['reason']}")
+            rsim['blowup'] = True
+
+        # Record block performance
+
+        if metrics or prometheus or hooks:
+            record = _blockmetrics(simname, cnt, tini, tend, ocean['DT'], period is not None,
+                                   rsim, log, r.readromsprofile(standoutfile), wallstart,
+                                   walltime, outsize, r.foldersizes(fol['out']))
+            r.writemetrics(record,
+                           jsonlfile=os.path.join(fol['log'], f"{simname}_metrics.jsonl") if metrics else None,
+                           promfile=os.path.join(fol['log'], f"{simname}_metrics.prom") if prometheus else None,
+                           labels={'simdir': simdir, 'simname': simname}, hooks=hooks)
 
         # Did the run crash (i.e. anything but successful end or blowup)? If
         # so, we'll exit now
@@ -431,65 +1323,145 @@ def runtodate(ocean, simdir, simname, enddate, dtslow=None, addcounter="most",
             print('  Simulation block terminated with error')
             return 'error'
 
-        # Did it blow up?  If it did so during a slow-step period, we'll exit
-        # now.  If it blew up during a fast-step period, set up a new
-        # slow-step period and reset input to start with last history file.
-        # If it ran to completion, reset input to start with last restart
-        # file
+        # Did it blow up?  If so, the step control policy decides whether to
+        # set up a new slow-step period (and reset input to start with last
+        # history file) or exit (by default, exit if it blew up during a
+        # slow-step period).  If it ran to completion, reset input to start
+        # with last restart file, and check whether a slow-step period can end
+        # early
+
+        m['blocks'].append({'count': cnt,
+                            'start': tini.isoformat(),
+                            'end': tend.isoformat(),
+                            'dt': ocean['DT'].total_seconds(),
+                            'status': 'blowup' if rsim['blowup'] else 'success'})
 
-        rstinfo = r.parserst(os.path.join(fol['out'], simname))
+        rstinfo = r.parserst(filebase)
         cnt = rstinfo['count']
 
+        m['restart'] = _rstrecord(rstinfo)
+        r.writemanifest(manifest, m)
+
         if rsim['blowup']:
             if not runpastblowup:
                 print('  Simulation block blew up')
                 return 'blowup'
-                
-            if ocean['DT'] == dtslow:
-                print('  Simulation block blew up in a slow-step period')
-                return 'blowup'
 
-            # Find the most recent history file written to
-            hisfile = rsim['lasthis']
-
-            if not hisfile: # non-clean blowup, no his file defined
-                allhis = sorted(glob.glob(os.path.join(fol['out'], simname + "*his*.nc")))
-                hisfile = allhis[-1]
-
-            fhis = nc.Dataset(hisfile)
-            if len(fhis.variables['ocean_time']) == 0:
-                allhis = glob.glob(os.path.join(fol['out'], simname + "*his*.nc"))
-                allhis = sorted(list(set(allhis) - set([hisfile])))
-                hisfile = allhis[-1]
+            # Find the most recent history file written to (skipping any
+            # left empty or unreadable by the blowup)
+            allhis = sorted(glob.glob(os.path.join(fol['out'], simname + "*his*.nc")))
+            if rsim['lasthis'] in allhis:
+                allhis.remove(rsim['lasthis'])
+                allhis.append(rsim['lasthis'])
+
+            hisfile = []
+            for fn in reversed(allhis):
+                try:
+                    with r.ncopen(fn) as fhis:
+                        if len(fhis.variables['ocean_time']) > 0:
+                            hisfile = fn
+                            break
+                except (OSError, KeyError):
+                    pass
+            if not hisfile:
+                print('  Simulation block blew up with no usable history file')
+                return 'blowup'
 
             ocean['ININAME'] = hisfile
             ocean['NRREC'] = -1
 
-            f = nc.Dataset(ocean['ININAME'], 'r')
-            tunit = f.variables['ocean_time'].units
-            tcal = f.variables['ocean_time'].calendar
-            tini = max(nc.num2date(f.variables['ocean_time'][:], units=tunit, calendar=tcal))
+            tini = _lasttime(ocean['ININAME'])
 
-            t1 = tini.strftime('%Y-%m-%d-%H-%M:%S')
-            t2 = (tini + timedelta(days=30)).strftime('%Y-%m-%d-%H-%M:%S')
-            fstep = open(steplog, "a+")
-            fstep.write('{},{}\n'.format(t1,t2))
-            fstep.close()
+            t1 = datetime(tini.year, tini.month, tini.day, tini.hour, tini.minute, tini.second)
+            newperiod = stepcontrol.blowup(t1, ocean['DT'], dt, slowsteps)
+            if newperiod is None:
+                if ocean['DT'] != dt:
+                    print('  Simulation block blew up in a slow-step period')
+                else:
+                    print('  Simulation block blew up')
+                return 'blowup'
+
+            t2, dtnew = newperiod
+            slowsteps.append([t1, t2, dtnew])
+            sc.writesteplog(steplog, slowsteps)
+
+            m['slowsteps'] = _stepiso(slowsteps)
+            r.writemanifest(manifest, m)
 
         else:
             ocean['ININAME'] = rstinfo['lastfile']
             ocean['NRREC'] = -1
 
-            f = nc.Dataset(ocean['ININAME'], 'r')
-            tunit = f.variables['ocean_time'].units
-            tcal = f.variables['ocean_time'].calendar
-            tini = max(nc.num2date(f.variables['ocean_time'][:], units=tunit, calendar=tcal))
+            tini = _lasttime(ocean['ININAME'])
+
+            m['restart']['time'] = tini.isoformat()
+
+            if (period is not None) and (tini < period[1]) and \
+               stepcontrol.stable(_pydatetime(tini), log, period):
+                print('  Slow-step period ended early')
+                period[1] = _pydatetime(tini)
+                sc.writesteplog(steplog, slowsteps)
+                m['slowsteps'] = _stepiso(slowsteps)
+
+            r.writemanifest(manifest, m)
 
     # Print completion status message
 
     print('Simulation completed through specified end date')
     return 'success'
 
+def _lasttime(fname):
+    # Latest time in a history or restart file
+    import netCDF4 as nc
+
+    with r.ncopen(fname) as f:
+        tunit = f.variables['ocean_time'].units
+        tcal = f.variables['ocean_time'].calendar
+        return max(nc.num2date(f.variables['ocean_time'][:], units=tunit, calendar=tcal))
+
+def _blockmetrics(simname, cnt, tini, tend, dt, slow, rsim, log, profile,
+                  wallstart, walltime, outsize0, outsize1):
+    # Performance metrics record for one runtodate block
+    steps = int(log['step'][-1] - log['step'][0]) if len(log['step']) > 1 else 0
+    modeldays = steps*dt.total_seconds()/86400
+    if rsim['blowup']:
+        status = 'blowup'
+    elif rsim['cleanrun']:
+        status = 'success'
+    else:
+        status = 'error'
+    prof = r.profilesummary(profile) if profile else {'iofrac': None, 'mpifrac': None}
+    return {'simname': simname,
+            'count': cnt,
+            'status': status,
+            'start': tini.isoformat(),
+            'end': tend.isoformat(),
+            'wallstart': wallstart.isoformat(),
+            'walltime': walltime,
+            'host': socket.gethostname(),
+            'dt': dt.total_seconds(),
+            'slow': slow,
+            'steps': steps,
+            'modeldays': modeldays,
+            'modeldaysperhour': modeldays/(walltime/3600) if walltime > 0 else None,
+            'stepspersecond': steps/walltime if walltime > 0 else None,
+            'outputbytes': sum(max(0, n - outsize0.get(f, 0)) for f, n in outsize1.items()),
+            'iofrac': prof['iofrac'],
+            'mpifrac': prof['mpifrac']}
+
+def _stepiso(slowsteps):
+    # Manifest entry for slow-step periods (see rcutils.writemanifest)
+    return [[t1.isoformat(), t2.isoformat(), dt.total_seconds()] for t1, t2, dt in slowsteps]
+
+def _rstrecord(rstinfo, tlast=None):
+    # Manifest entry for a restart file (see rcutils.writemanifest)
+    if not rstinfo['lastfile']:
+        return None
+    st = os.stat(rstinfo['lastfile'])
+    return {'lastfile': rstinfo['lastfile'], 'count': rstinfo['count'],
+            'time': tlast.isoformat() if tlast is not None else None,
+            'mtime': st.st_mtime_ns, 'size': st.st_size}
+
 def simfolders(simdir, create=False, permissions=0o755):
     """
     Generate path names for, and if requested, create folders for the the 3 I/O
@@ -0,0 +1,304 @@
+"""**ROMS Communication Module parameter sampling**
+
+This module sets up and runs parameter sensitivity studies, where each member
+of an ensemble uses a different combination of parameter values:
+
+- `design(spec,...)` generates the parameter values of each member, using a
+  Latin hypercube, Sobol, or full-factorial grid design
+- `applysample(ocean, sample,...)` builds the parameter dictionaries of one
+  member
+- `runsamples(ocean, samples, simdir, enddate,...)` prepares a simulation
+  folder for each member, runs them all through runtodate (concurrently; see
+  scheduler.Scheduler), and collects the results in a table
+
+Parameters are named by their path in the parameter dictionaries, with path
+components separated by '/': a top-level key (e.g. 'DT'), a key in a nested
+dictionary (e.g. 'LBC/isTvar'), or an index into a list (e.g. 'AKT_BAK/0').
+Parameters of additional input files (e.g. the biological parameters read
+from BPARNAM) start with the name of the ocean parameter holding the file
+name, e.g. 'BPARNAM/BioIni/iNO3_'.
+
+Example:
+
+    ocean = rc.readparamfile("roms_bio_toy_npzd.yaml", tconvert=True)
+    bio = rc.readparamfile("npzd_Powell.yaml")
+    spec = {'BPARNAM/BioIni/iNO3_': [1.0, 20.0],
+            'BPARNAM/PhyIS': {'low': 0.01, 'high': 0.1, 'scale': 'log'},
+            'BPARNAM/wDet': {'values': [1.0, 8.0]}}
+    samples = design(spec, 16, method='lhs', seed=1)
+    runsamples(ocean, samples, "sens", datetime(2002,1,1),
+               files={'BPARNAM': bio}, dryrunflag=False)
+"""
+
+import copy
+import csv
+import itertools
+import json
+import math
+import os
+from collections import OrderedDict
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+from romscom.scheduler import Scheduler
+
+
+def _parsespec(spec):
+    # Normalizes a sampling spec to a list of (path, range) pairs, where range
+    # is a dict with either low/high/scale or values
+
+    params = []
+    for path, s in spec.items():
+        if isinstance(s, dict):
+            s = dict(s)
+        elif isinstance(s, (list, tuple)) and len(s) == 2:
+            s = {'low': s[0], 'high': s[1]}
+        else:
+            raise ValueError(f"Sampling range for {path} must be [low, high] or a dict")
+
+        if 'values' in s:
+            s['values'] = list(s['values'])
+            if not s['values']:
+                raise ValueError(f"Sampling range for {path} has no values")
+        else:
+            if ('low' not in s) or ('high' not in s):
+                raise ValueError(f"Sampling range for {path} needs low and high, or values")
+            s.setdefault('scale', 'linear')
+            if s['scale'] not in ('linear', 'log'):
+                raise ValueError(f"Unknown scale for {path}: {s['scale']}")
+            if (s['scale'] == 'log') and (min(s['low'], s['high']) <= 0):
+                raise ValueError(f"Log-scale range for {path} must be positive")
+        params.append((path, s))
+    return params
+
+def _fromunit(s, u):
+    # Parameter value at position u (0-1) of its range
+
+    if 'values' in s:
+        return s['values'][min(int(u*len(s['values'])), len(s['values'])-1)]
+    if s['scale'] == 'log':
+        return float(s['low']*(s['high']/s['low'])**u)
+    return float(s['low'] + u*(s['high'] - s['low']))
+
+def _levels(s, n):
+    # Grid levels of one parameter: its values, or n evenly-spaced points
+    # (including both ends) across its range
+
+    if 'values' in s:
+        return s['values']
+    if n == 1:
+        return [_fromunit(s, 0.5)]
+    return [_fromunit(s, ii/(n-1)) for ii in range(n)]
+
+def design(spec, n=None, method="lhs", seed=None, levels=3):
+    """
+    Generates parameter values for the members of a sampling study
+
+    Args:
+        spec (dict): parameter ranges, keyed by parameter path (see module
+            description).  Each range is one of:
+
+            - [low, high]: continuous range, sampled uniformly
+            - {'low': low, 'high': high, 'scale': 'log'}: continuous range,
+                sampled uniformly in log space ('linear' scale is the default)
+            - {'values': [...]}: discrete set of values (of any type), each
+                equally likely
+        n (int): number of members (not used for grid designs)
+        method (string, optional): sampling design, one of:
+
+            - 'lhs': Latin hypercube (default); each parameter's range is
+                split into n equal-probability intervals, each sampled once
+            - 'sobol': scrambled Sobol sequence (requires scipy).  Balance
+                properties are best when n is a power of 2.
+            - 'grid': full factorial design over each parameter's levels
+        seed (int, optional): random seed, for reproducible designs
+        levels (int or dict, optional): for grid designs, number of levels
+            of each continuous parameter, either one number for all
+            parameters or a dict keyed by path.  Default = 3
+
+    Returns:
+        (list of OrderedDicts): one per member, holding the value of each
+            parameter keyed by path (in spec order)
+
+    Raises:
+        ImportError: for Sobol designs, if scipy is not available
+        ValueError: if the spec or method is invalid
+    """
+    params = _parsespec(spec)
+    paths = [p for p, _ in params]
+
+    if method == "grid":
+        lev = [_levels(s, levels.get(p, 3) if isinstance(levels, dict) else levels)
+               for p, s in params]
+        return [OrderedDict(zip(paths, x)) for x in itertools.product(*lev)]
+
+    if not n or n < 1:
+        raise ValueError(f"{method} designs need a number of members, n >= 1")
+
+    import numpy as np
+
+    if method == "lhs":
+        rng = np.random.default_rng(seed)
+        strata = np.array([rng.permutation(n) for _ in params]).T.reshape(n, len(params))
+        u = (strata + rng.random((n, len(params))))/n
+    elif method == "sobol":
+        try:
+            from scipy.stats import qmc
+        except ImportError:
+            raise ImportError("Sobol designs require scipy (pip install scipy); "
+                              "use method='lhs' or 'grid' without it") from None
+        sampler = qmc.Sobol(len(params), scramble=True, seed=seed)
+        m = math.log2(n)
+        u = sampler.random_base2(int(m)) if m == int(m) else sampler.random(n)
+    else:
+        raise ValueError(f"Unknown sampling method: {method}")
+
+    return [OrderedDict((p, _fromunit(s, x)) for (p, s), x in zip(params, row.tolist()))
+            for row in u]
+
+def _setpath(d, path, value):
+    # Sets the value at a '/'-separated path in nested dictionaries/lists
+
+    keys = path.split('/')
+    for k in keys[:-1]:
+        d = d[int(k)] if isinstance(d, list) else d[k]
+    k = keys[-1]
+    if isinstance(d, list):
+        d[int(k)] = value
+    elif k in d:
+        d[k] = value
+    else:
+        raise KeyError(f"Parameter {path} not found")
+
+def applysample(ocean, sample, files=None):
+    """
+    Builds the parameter dictionaries of one sampling member
+
+    Args:
+        ocean (dict): ROMS ocean parameter dictionary
+        sample (dict): parameter values keyed by path, e.g. one element of
+            the design output
+        files (dict, optional): additional parameter dictionaries, keyed by
+            the ocean parameter that holds their file name (e.g.
+            {'BPARNAM': bio})
+
+    Returns:
+        (tuple): copies of ocean and files with the sample's values set
+    """
+    ocean = copy.deepcopy(ocean)
+    files = copy.deepcopy(files) if files else {}
+    for path, value in sample.items():
+        top = path.split('/', 1)
+        if (top[0] in files) and (len(top) > 1):
+            _setpath(files[top[0]], top[1], value)
+        else:
+            _setpath(ocean, path, value)
+    return ocean, files
+
+def runsamples(ocean, samples, simdir, enddate, files=None, prefix="member",
+               ncores=None, tablefile=None, **kwargs):
+    """
+    Runs one simulation per sampling member, and tabulates the results
+
+    Each member gets its own simulation folder, <simdir>/<prefix>NNN (with
+    simulation name <prefix>NNN), holding the usual In/Log/Out subfolders
+    (see runtodate).  The member's additional parameter files (e.g. the
+    biological parameters) are written to its In folder, and the
+    corresponding ocean parameters point to them.  All members are then run
+    via runtodate, concurrently, under a core budget (see
+    scheduler.Scheduler).
+
+    Args:
+        ocean (dict): ROMS ocean parameter dictionary, shared by all members
+            except for the sampled parameters
+        samples (list of dicts): parameter values of each member (see design)
+        simdir (string): parent folder of the member simulation folders
+        enddate (datetime): simulation end date
+        files (dict, optional): additional parameter dictionaries, keyed by
+            the ocean parameter that holds their file name (e.g.
+            {'BPARNAM': bio})
+        prefix (string, optional): member name prefix.  Default = 'member'
+        ncores (int, optional): total cores available to the ROMS jobs
+            (see scheduler.Scheduler).  Default is the number of CPUs.
+        tablefile (string, optional): name of results table file.  Default
+            is <simdir>/<prefix>_samples.csv
+        **kwargs: any additional runtodate options (e.g. romscmd,
+            dryrunflag), applied to all members
+
+    Returns:
+        (list of dicts): one per member, in sample order, with keys `member`
+            (name), `simdir`, each sampled parameter path, and the following
+            (also written, one row per member, to the results table):
+
+            Key         |Value type|Value description
+            ------------|----------|-----------------
+            `status`    |`string`  |runtodate result ('success', 'blowup', 'error', 'dryrun'), or 'exception' if runtodate raised an error
+            `error`     |`string`  |error message, if runtodate raised an error
+            `walltime`  |`float`   |run time, seconds
+            `modeltime` |`string`  |model time (ISO format) of the member's latest restart file, if any
+            `blocks`    |`int`     |simulation blocks run (see runtodate)
+            `blowups`   |`int`     |blocks that ended in a blowup
+    """
+    if tablefile is None:
+        tablefile = os.path.join(simdir, f"{prefix}_samples.csv")
+    ndigit = max(3, len(str(len(samples)-1)))
+
+    s = Scheduler(ncores)
+    rows = []
+    for ii, sample in enumerate(samples):
+        name = f"{prefix}{ii:0{ndigit}d}"
+        msim = os.path.join(simdir, name)
+        fol = rc.simfolders(msim, create=True, permissions=kwargs.get('permissions', 0o755))
+
+        o, fdicts = applysample(ocean, sample, files)
+        for key, d in fdicts.items():
+            o[key] = os.path.join(fol['in'], f"{name}_{key.lower()}.in")
+            rc.writestandardin(d, o[key], compress=kwargs.get('compress', False))
+
+        s.add(o, msim, name, enddate, **kwargs)
+        rows.append(OrderedDict([('member', name), ('simdir', msim)] +
+                                [(p, _tablevalue(v)) for p, v in sample.items()]))
+
+    status = s.run()
+
+    for row, st in zip(rows, status):
+        m = r.readmanifest(os.path.join(rc.simfolders(row['simdir'])['log'],
+                                        f"{row['member']}_manifest.json"))
+        blocks = m['blocks'] if m else []
+        row.update(status=st['result'], error=st['error'] or '',
+                   walltime=(st['end'] - st['start']) if st['start'] and st['end'] else None,
+                   modeltime=(m['restart'] or {}).get('time') if m else None,
+                   blocks=len(blocks),
+                   blowups=sum(1 for b in blocks if b['status'] == 'blowup'))
+
+    writetable(rows, tablefile)
+    return rows
+
+def _tablevalue(x):
+    # Table-friendly form of a parameter value (non-scalars as JSON)
+    if isinstance(x, (bool, int, float, str)) or x is None:
+        return x
+    try:
+        return json.dumps(x)
+    except TypeError:
+        return str(x)
+
+def writetable(rows, fname):
+    """
+    Writes a sampling results table
+
+    The table is written to a temporary file that is then renamed over the
+    old one, so it is never left partially written.
+
+    Args:
+        rows (list of dicts): table rows, as returned by runsamples
+        fname (string): name of comma-separated values file
+    """
+    cols = list(dict.fromkeys(k for row in rows for k in row))
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    with open(tmp, 'w', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=cols)
+        w.writeheader()
+        for row in rows:
+            w.writerow({k: '' if v is None else v for k, v in row.items()})
+    os.replace(tmp, fname)
@@ -0,0 +1,177 @@
+"""**ROMS Communication Module simulation scheduler**
+
+This module runs many runtodate simulations concurrently on a single machine,
+under a total budget of processor cores:
+
+- `Scheduler(ncores)` collects simulation jobs (via `add`), runs them (via
+  `run`), and reports per-job status (via `status`)
+- `romscores(romscmd)` counts the cores requested by a ROMS command
+"""
+
+import concurrent.futures
+import copy
+import os
+import re
+import threading
+import time
+
+import romscom.romscom as rc
+
+
+def romscores(romscmd):
+    """
+    Number of processor cores requested by a ROMS command
+
+    Looks for the process-count options of common MPI launchers: -np, -n,
+    --np, --n, or --ntasks, followed by the count as the next argument (-np
+    4), with an equals sign (--ntasks=4), or attached (-n4).  The first such
+    option found is used.  Commands without one of these options are assumed
+    to use a single core.  Threads per process (e.g. srun -c/--cpus-per-task)
+    are not counted.
+
+    Args:
+        romscmd (list of strings): components of command used to call the ROMS
+            executable (see runtodate)
+
+    Returns:
+        (int): number of cores
+    """
+    opts = ('-np', '-n', '--np', '--n', '--ntasks')
+    for ii, arg in enumerate(romscmd):
+        if arg in opts and ii+1 < len(romscmd):
+            if romscmd[ii+1].isdigit():
+                return int(romscmd[ii+1])
+        m = re.match(r"(-np|-n|--np|--n|--ntasks)=?(\d+)$", arg)
+        if m:
+            return int(m.group(2))
+    return 1
+
+class Scheduler:
+    """
+    Runs runtodate simulations concurrently under a core budget
+
+    Jobs are started in the order they were added, except that a job that
+    does not fit in the currently free cores is passed over in favor of later,
+    smaller jobs that do (so the machine stays fully packed).  Each job runs
+    runtodate in its own worker process, with the usual restart and blowup
+    handling.
+
+    Example:
+
+        s = Scheduler(64)
+        for ii, o in enumerate(oceans):
+            s.add(o, f"sim{ii:02d}", "sim", datetime(2010,1,1),
+                  romscmd=["mpirun", "-np", "16", "romsM"], dryrunflag=False)
+        s.run()
+
+    Args:
+        ncores (int, optional): total number of cores available to the ROMS
+            jobs.  Default is the number of CPUs on this machine.
+    """
+
+    def __init__(self, ncores=None):
+        self.ncores = ncores or os.cpu_count()
+        self._jobs = []
+        self._cond = threading.Condition()
+
+    def add(self, ocean, simdir, simname, enddate, **kwargs):
+        """
+        Adds a simulation job
+
+        Args:
+            ocean (dict): ROMS parameter dictionary (a deep copy is stored, so
+                the same dictionary can be used for several jobs)
+            simdir (string): folder where I/O subfolders are found/created
+            simname (string): base name for simulation
+            enddate (datetime): simulation end date
+            **kwargs: any additional runtodate options (e.g. romscmd,
+                dryrunflag, dtslow)
+
+        Returns:
+            (int): job index, used in the status list
+
+        Raises:
+            ValueError: if the job requires more cores than the scheduler's
+                total
+        """
+        ncores = romscores(kwargs.get('romscmd', ["mpirun","romsM"]))
+        if ncores > self.ncores:
+            raise ValueError(f"Job {simname} requires {ncores} cores, more than the {self.ncores} available")
+
+        with self._cond:
+            self._jobs.append({
+                'simdir': simdir, 'simname': simname, 'ncores': ncores,
+                'state': 'pending', 'result': None, 'error': None,
+                'start': None, 'end': None,
+                'args': (copy.deepcopy(ocean), simdir, simname, enddate),
+                'kwargs': kwargs})
+            return len(self._jobs) - 1
+
+    def status(self):
+        """
+        Current status of all jobs
+
+        Returns:
+            (list of dicts): one per job, in the order added, with the
+                following keys:
+
+                Key       |Value type|Value description
+                ----------|----------|-----------------
+                `simdir`  |`string`  |simulation folder
+                `simname` |`string`  |simulation name
+                `ncores`  |`int`     |cores used by the job
+                `state`   |`string`  |'pending', 'running', or 'done'
+                `result`  |`string`  |runtodate result ('success', 'blowup', 'error', 'dryrun'), or 'exception' if runtodate raised an error
+                `error`   |`string`  |error message, if runtodate raised an error
+                `start`   |`float`   |start time (seconds since epoch)
+                `end`     |`float`   |end time (seconds since epoch)
+        """
+        with self._cond:
+            return [{k: v for k, v in j.items() if k not in ('args', 'kwargs')}
+                    for j in self._jobs]
+
+    def corefree(self):
+        """
+        Number of cores not currently assigned to a running job
+
+        Returns:
+            (int): free cores
+        """
+        with self._cond:
+            return self.ncores - sum(j['ncores'] for j in self._jobs if j['state'] == 'running')
+
+    def run(self):
+        """
+        Runs all pending jobs, and waits for them to finish
+
+        Returns:
+            (list of dicts): final job status (see status)
+        """
+        with concurrent.futures.ProcessPoolExecutor(self.ncores) as ex:
+            with self._cond:
+                while True:
+                    free = self.ncores - sum(j['ncores'] for j in self._jobs if j['state'] == 'running')
+                    for j in self._jobs:
+                        if j['state'] == 'pending' and j['ncores'] <= free:
+                            j['state'] = 'running'
+                            j['start'] = time.time()
+                            free -= j['ncores']
+                            fut = ex.submit(rc.runtodate, *j['args'], **j['kwargs'])
+                            fut.add_done_callback(lambda f, j=j: self._finish(j, f))
+
+                    if not any(j['state'] in ('pending', 'running') for j in self._jobs):
+                        break
+                    self._cond.wait()
+
+        return self.status()
+
+    def _finish(self, job, fut):
+        with self._cond:
+            try:
+                job['result'] = fut.result()
+            except Exception as e:
+                job['result'] = 'exception'
+                job['error'] = repr(e)
+            job['state'] = 'done'
+            job['end'] = time.time()
+            self._cond.notify_all()
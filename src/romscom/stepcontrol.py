@@ -0,0 +1,254 @@
+"""**ROMS Communication Module slow-step control**
+
+This module holds the policies runtodate uses to work past ROMS blowups by
+temporarily reducing the model time step ("slow-stepping"), along with the
+step log that records the slow-step periods of a simulation:
+
+- `StepControl(dtslow,...)` is the default policy: after a blowup, run for 30
+  days at a single reduced time step, and give up if the model blows up again
+- `AdaptiveStepControl(...)` reduces the time step over several levels, sizes
+  each slow-step period from the blowup history, and returns to the full time
+  step early once the model energy has settled down
+- `readsteplog(fname,...)` and `writesteplog(fname,...)` read and write the
+  step log file
+
+A policy is any object with the methods of StepControl; see runtodate for how
+they are called.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+
+def readsteplog(fname, dtslow):
+    """
+    Read slow-step periods from a step log file
+
+    Each line of the file holds the start and end of a period (formatted as
+    %Y-%m-%d-%H-%M:%S), and optionally the time step used during that period
+    (seconds), separated by commas.
+
+    Args:
+        fname (string): step log file name
+        dtslow (timedelta): time step assigned to periods without one (i.e.
+            lines written before the time step column was added)
+
+    Returns:
+        (list of lists): [start (datetime), end (datetime), time step
+            (timedelta)] for each period, in file order.  Empty if the file
+            does not exist.
+    """
+    periods = []
+    if not os.path.isfile(fname):
+        return periods
+    with open(fname) as f:
+        for line in f:
+            row = line.strip().split(',')
+            if len(row) < 2:
+                continue
+            t1 = datetime.strptime(row[0], '%Y-%m-%d-%H-%M:%S')
+            t2 = datetime.strptime(row[1], '%Y-%m-%d-%H-%M:%S')
+            dt = timedelta(seconds=float(row[2])) if len(row) > 2 and row[2] else dtslow
+            periods.append([t1, t2, dt])
+    return periods
+
+def writesteplog(fname, periods):
+    """
+    Write slow-step periods to a step log file
+
+    The file is replaced atomically, so it is never left partially written.
+
+    Args:
+        fname (string): step log file name
+        periods (list of lists): [start, end, time step] for each period (see
+            readsteplog)
+    """
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        for t1, t2, dt in periods:
+            f.write('{},{},{:g}\n'.format(t1.strftime('%Y-%m-%d-%H-%M:%S'),
+                                          t2.strftime('%Y-%m-%d-%H-%M:%S'),
+                                          dt.total_seconds()))
+    os.replace(tmp, fname)
+
+def activeperiod(periods, t, drst):
+    """
+    Slow-step period in effect at a given time
+
+    Args:
+        periods (list of lists): [start, end, time step] for each period (see
+            readsteplog)
+        t (datetime): time
+        drst (timedelta): restart interval; a period is only considered in
+            effect if at least one restart interval remains before its end
+
+    Returns:
+        (list): the period (the latest-added one, if several overlap), or None
+            if t is not in a slow-step period
+    """
+    active = None
+    for p in periods:
+        if (t >= p[0]) and (t <= (p[1]-drst)):
+            active = p
+    return active
+
+class StepControl:
+    """
+    Default slow-step policy
+
+    After a blowup at the full time step, the simulation is rerun from the
+    last history file at a reduced time step for a fixed period, then returns
+    to the full time step.  A blowup during a slow-step period ends the
+    simulation.
+
+    Args:
+        dtslow (timedelta, optional): reduced time step.  Default is half the
+            full time step.
+        period (timedelta, optional): length of slow-step periods.  Default =
+            30 days
+    """
+
+    def __init__(self, dtslow=None, period=timedelta(days=30)):
+        self.dtslow = dtslow
+        self.period = period
+
+    def slowdt(self, dt):
+        """
+        Time step assigned to step log periods that don't record one
+
+        Args:
+            dt (timedelta): full time step
+
+        Returns:
+            (timedelta): reduced time step
+        """
+        return self.dtslow if self.dtslow is not None else dt/2
+
+    def blowup(self, t, dtblowup, dt, periods):
+        """
+        Choose a new slow-step period after a blowup
+
+        Args:
+            t (datetime): time the simulation will restart from
+            dtblowup (timedelta): time step in use when the model blew up
+            dt (timedelta): full time step
+            periods (list of lists): slow-step periods so far (see readsteplog)
+
+        Returns:
+            (tuple): end (datetime) and time step (timedelta) of the new
+                slow-step period starting at t, or None to stop the simulation
+        """
+        if dtblowup != dt:
+            return None
+        return t + self.period, self.slowdt(dt)
+
+    def blockend(self, t, period):
+        """
+        End of the next simulation block within a slow-step period
+
+        Args:
+            t (datetime): block start time
+            period (list): active slow-step period (see readsteplog)
+
+        Returns:
+            (datetime): block end time
+        """
+        return period[1]
+
+    def stable(self, t, log, period):
+        """
+        Whether a slow-step period can be ended early
+
+        Args:
+            t (datetime): end time of the block just completed
+            log (dict): diagnostics of the slow-step block just completed (see
+                rcutils.readromslog)
+            period (list): active slow-step period (see readsteplog)
+
+        Returns:
+            (logical): True to end the period now
+        """
+        return False
+
+class AdaptiveStepControl(StepControl):
+    """
+    Multi-level, history-aware slow-step policy
+
+    After a blowup, the time step is reduced to the next of a series of
+    levels (full time step divided by each of factors, in turn); the
+    simulation is only stopped if it blows up at the smallest level.  Each new
+    slow-step period starts at period and doubles for every other period that
+    started within memory before it (up to maxperiod), so repeated trouble
+    spots get longer periods.  Slow-step periods are run in blocks of at most
+    checkinterval, and end early once the kinetic energy has varied by less
+    than tol (relative to its mean) over nstable blocks in a row, provided at
+    least minfrac of the period has been run.
+
+    Args:
+        factors (list of numbers, optional): time step reduction factors, one
+            per level.  Default = [2, 4, 8]
+        period (timedelta, optional): initial slow-step period length.
+            Default = 5 days
+        maxperiod (timedelta, optional): maximum period length.  Default = 30
+            days
+        memory (timedelta, optional): how far back earlier periods count
+            toward the period length.  Default = 60 days
+        checkinterval (timedelta, optional): maximum block length within a
+            slow-step period.  Default = 1 day
+        tol (float, optional): kinetic energy variation below which a block
+            counts as stable.  Default = 0.05
+        nstable (int, optional): consecutive stable blocks needed to end a
+            period early.  Default = 3
+        minfrac (float, optional): fraction of a period's planned length that
+            must be run before it can end early.  Default = 0.5
+    """
+
+    def __init__(self, factors=(2, 4, 8), period=timedelta(days=5),
+                 maxperiod=timedelta(days=30), memory=timedelta(days=60),
+                 checkinterval=timedelta(days=1), tol=0.05, nstable=3, minfrac=0.5):
+        super().__init__(period=period)
+        self.factors = list(factors)
+        self.maxperiod = maxperiod
+        self.memory = memory
+        self.checkinterval = checkinterval
+        self.tol = tol
+        self.nstable = nstable
+        self.minfrac = minfrac
+        self._nstable = {}  # consecutive stable blocks, by period start
+
+    def slowdt(self, dt):
+        return dt/self.factors[0]
+
+    def blowup(self, t, dtblowup, dt, periods):
+        levels = [dt/f for f in self.factors]
+        deeper = [x for x in levels if x < dtblowup]
+        if not deeper:
+            return None
+
+        # Double once per recent period, stopping at maxperiod (rather than
+        # computing period*2**nrecent, which overflows timedelta after a
+        # few dozen blowups)
+        nrecent = sum(1 for p in periods if (t - self.memory) <= p[0] <= t)
+        length = self.period
+        while (nrecent > 0) and (length < self.maxperiod):
+            length *= 2
+            nrecent -= 1
+        return t + min(length, self.maxperiod), max(deeper)
+
+    def blockend(self, t, period):
+        return min(period[1], t + self.checkinterval)
+
+    def stable(self, t, log, period):
+        import numpy as np
+
+        ke = np.asarray(log['kinetic'], dtype=float)
+        if (len(ke) < 2) or (not np.all(np.isfinite(ke))):
+            steady = False
+        else:
+            scale = abs(ke.mean())
+            steady = (scale == 0) or ((ke.max() - ke.min())/scale <= self.tol)
+
+        n = self._nstable.get(period[0], 0) + 1 if steady else 0
+        self._nstable[period[0]] = n
+        return (n >= self.nstable) and \
+               ((t - period[0]) >= self.minfrac*(period[1] - period[0]))
@@ -5,61 +5,419 @@ This module provides functions to read and write varinfo.dat and varinfo.yaml
 files.  Still a work in progress.
 """
 
-import pandas as pd
-import yaml
+import collections.abc
+import functools
+import json
+import os
+import re
 
-def readfile(file, type="classic"):
+import romscom.rcutils as r
+
+# Fields of each variable, in the order of a classic varinfo.dat record
+
+classicfields = ('variable', 'long_name', 'units', 'field', 'time', 'index_code',
+                 'type', 'scale')
+
+class VarInfo(collections.abc.Sequence):
     """
-    Reads varinfo.dat file into a list of dictionaries
+    Table of I/O variable info, indexed by variable name
+
+    Values are stored by column (one list per field), and variables are
+    looked up by name through a dictionary index, so lookups take constant
+    time regardless of the size of the table.  Tables read from classic files
+    have the classic fields (see classicfields), with all values kept as the
+    strings found in the file, including scale (e.g. '1.0d0'; see
+    rcutils.str2value to convert it), so a table written back with writefile
+    reproduces the original records exactly.  Tables read from yaml files have every field
+    found in the file, in order of first appearance; fields a variable
+    doesn't have are stored as None, and left out of its dictionary.
+
+    A table is a sequence of per-variable dictionaries, so code written for
+    the list of dictionaries that readfile used to return still works:
+    indexing by row number (including negative numbers and slices, which
+    return a list), iteration, len, and comparison with a list of
+    dictionaries all behave as they would on that list.  Unlike a list,
+    `name in v` tests for a variable name, and `v[name]` looks a variable up
+    by name.
+
+    Example:
+
+        v = readfile("varinfo.dat")
+        v['temp']['units']        # one variable, as a dictionary
+        v[0]['variable']          # first variable, by row
+        'salt' in v               # True
+        v.column('units')         # units of all variables, in file order
+        for rec in v: ...         # all variables, as dictionaries
+
+    Args:
+        columns (dict, optional): lists of values keyed by field name (all
+            of the same length, including a 'variable' column).  Default is an
+            empty table.
+        fields (list of strings, optional): field names, in order.  Default is
+            the keys of columns, or the classic fields for an empty table.
+        comments (dict, optional): comments to write along with the table
+            (see writefile); set when reading a yaml file.
+
+    Attributes:
+        fields (tuple of strings): field names
+        comments (dict): comments of a yaml file, with keys `header` (lines
+            before the metadata block), `records` (comment lines before
+            each variable, keyed by row), `fields` (end-of-line comments,
+            keyed by (row, field)), and `footer` (comment lines after the last
+            variable)
+    """
+
+    def __init__(self, columns=None, fields=None, comments=None):
+        if fields is None:
+            fields = list(columns) if columns else classicfields
+        self.fields = tuple(fields)
+        self._cols = {k: list(columns[k]) if columns else [] for k in self.fields}
+        if len({len(x) for x in self._cols.values()}) > 1:
+            raise ValueError("VarInfo columns must all be the same length")
+        self.comments = comments
+        self._reindex()
+
+    def _reindex(self):
+        # The first record wins if a name is repeated
+        self._index = {}
+        for ii, name in enumerate(self._cols['variable']):
+            self._index.setdefault(name, ii)
+
+    @classmethod
+    def fromrecords(cls, records, fields=None):
+        """
+        Builds a table from a list of variable info dictionaries
+
+        Args:
+            records (list of dicts): one dictionary per variable, each with
+                (at least) a 'variable' key
+            fields (list of strings, optional): field names, in order.
+                Default is all keys found in records, in order of first
+                appearance.
+
+        Returns:
+            (VarInfo): table
+        """
+        if fields is None:
+            fields = dict.fromkeys(k for v in records for k in v)
+        return cls({k: [v.get(k) for v in records] for k in fields}, fields=fields)
+
+    def __len__(self):
+        return len(self._cols['variable'])
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        cols = [self._cols[k] for k in self.fields]
+        for row in zip(*cols):
+            yield {k: x for k, x in zip(self.fields, row) if x is not None}
+
+    def __getitem__(self, key):
+        """
+        One variable's info
+
+        Args:
+            key (string, int, or slice): variable name, or row number(s)
+
+        Returns:
+            (dict): values of the variable, keyed by field name (a list of
+                these for a slice)
+        """
+        if isinstance(key, slice):
+            return [self[ii] for ii in range(len(self))[key]]
+        ii = self._index[key] if isinstance(key, str) else range(len(self))[key]
+        return {k: self._cols[k][ii] for k in self.fields if self._cols[k][ii] is not None}
+
+    def get(self, name, default=None):
+        """
+        One variable's info, or a default if the variable isn't in the table
+
+        Args:
+            name (string): variable name
+            default (optional): returned if name isn't found.  Default None
+
+        Returns:
+            (dict): values of the variable, keyed by field name (see
+                __getitem__)
+        """
+        return self[name] if name in self._index else default
+
+    def column(self, field):
+        """
+        All values of one field
+
+        Args:
+            field (string): field name
+
+        Returns:
+            (list): values, in table order (None for variables without the
+                field)
+        """
+        return list(self._cols[field])
+
+    def names(self):
+        """
+        Variable names
+
+        Returns:
+            (list of strings): names, in table order
+        """
+        return list(self._cols['variable'])
+
+    def append(self, record):
+        """
+        Adds a variable to the end of the table
+
+        Args:
+            record (dict): variable info, with (at least) a 'variable' key.
+                Keys that aren't yet fields of the table are added as new
+                fields.
+        """
+        n = len(self)
+        for k in record:
+            if k not in self._cols:
+                self._cols[k] = [None]*n
+                self.fields += (k,)
+        for k in self.fields:
+            self._cols[k].append(record.get(k))
+        self._index.setdefault(record['variable'], n)
+
+    def __eq__(self, other):
+        if isinstance(other, (VarInfo, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"<VarInfo: {len(self)} variables>"
+
+def _readclassic(file):
+    # Streaming parser for the classic varinfo.dat format: each record is 7
+    # single-quoted strings (with '' for a literal quote) followed by an
+    # unquoted scale factor, one value per line.  Blank lines, lines starting
+    # with ! and trailing ! comments are ignored.
+
+    cols = [[] for _ in classicfields]
+    nfield = len(classicfields)
+    n = 0
+    with open(file, 'r') as f:
+        for lineno, line in enumerate(f, 1):
+            s = line.strip()
+            if not s or s[0] == '!':
+                continue
+            pos = n % nfield
+            if s[0] == "'":
+                end = s.find("'", 1)
+                while end > 0 and s.startswith("'", end+1): # '' inside string
+                    end = s.find("'", end+2)
+                if end < 0:
+                    raise ValueError(f"{file}, line {lineno}: unterminated string")
+                val = s[1:end].replace("''", "'")
+            elif pos == nfield - 1:
+                val = s.split('!', 1)[0].split()[0]
+            else:
+                raise ValueError(f"{file}, line {lineno}: expected a quoted {classicfields[pos]} value")
+            cols[pos].append(val)
+            n += 1
+
+    if n % nfield:
+        raise ValueError(f"{file}: incomplete record for variable {cols[0][-1]}")
+    return VarInfo(dict(zip(classicfields, cols)))
+
+# varinfo.yaml parsing: the stock ROMS file has unquoted values that aren't
+# valid YAML (e.g. long names with ': ' in them), so each key line is split
+# into key, value and comment, and problem values are quoted before the text is
+# handed to the YAML loader
+
+_keyline = re.compile(r"^(\s*(?:-\s+)?)([A-Za-z_][\w-]*):(?:\s+(.*))?$")
+_unsafevalue = re.compile(r":(\s|$)|^[-?:,\[\]{}&*!|>%@`](\s|$)|^[,\[\]{}&*!|>%@`]")
+
+def _splitcomment(x):
+    # Splits a value from a trailing comment (a # preceded by whitespace and
+    # outside quotes)
+    quote = None
+    for ii, c in enumerate(x):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '\'"' and (ii == 0 or x[ii-1].isspace()):
+            quote = c
+        elif c == '#' and (ii == 0 or x[ii-1].isspace()):
+            return x[:ii].rstrip(), x[ii:].rstrip()
+    return x.rstrip(), None
+
+def _flowcollection(x):
+    # True if x is a well-formed YAML flow sequence or mapping, e.g. [1, 2]
+    import yaml
+
+    if x[0] not in '[{':
+        return False
+    try:
+        return isinstance(yaml.load(x, r._fastloader()), (list, dict))
+    except yaml.YAMLError:
+        return False
+
+def _parsevarinfoyaml(content):
+    # Parser for varinfo.yaml contents (bytes), returning a VarInfo table with
+    # the file's comments attached (used via rcutils.cachedparse)
+
+    comments = {'header': [], 'records': {}, 'fields': {}, 'footer': []}
+    lines = []
+    pending = []
+    row = -1
+    inmeta = False
+    for line in content.decode().splitlines():
+        m = _keyline.match(line)
+        if not inmeta:
+            if m and (m.group(2) == 'metadata') and not m.group(1) and not m.group(3):
+                inmeta = True
+            else:
+                comments['header'].append(line)
+            lines.append(line)
+            continue
+        if m is None:
+            if line.strip().startswith('#'):
+                pending.append(line.rstrip())
+            lines.append(line)
+            continue
+
+        lead, key = m.group(1), m.group(2)
+        if '-' in lead:
+            row += 1
+            if pending:
+                comments['records'][row] = pending
+                pending = []
+        val, com = _splitcomment(m.group(3) or '')
+        if com:
+            comments['fields'][(row, key)] = com
+        if val and (val[0] not in '\'"') and _unsafevalue.search(val) and \
+           not _flowcollection(val):
+            val = json.dumps(val, ensure_ascii=False)
+        lines.append(f"{lead}{key}: {val}")
+    comments['footer'] = pending
+
+    d = r.ordered_load('\n'.join(lines), object_pairs_hook=dict)
+    v = VarInfo.fromrecords(d.get('metadata') or [])
+    v.comments = comments
+    return v
+
+def readfile(file, type="classic", cache=True):
+    """
+    Reads varinfo.dat file
 
     Args:
         file:   file holding variable info
         type:   file format, can be one of the following
                 "classic":  classic varinfo.dat style
-                "yaml":     newer varinfo.yaml style
+                "yaml":     newer varinfo.yaml style.  The stock ROMS file
+                            can be read unmodified (values that aren't valid
+                            YAML as written, e.g. those holding colons, are
+                            quoted before parsing, while well-formed flow
+                            lists and mappings such as [1, 2] are read as
+                            such), and its comments are kept with the table
+                            (see writefile).
+        cache:  for yaml files, True (default) to reuse a cached copy of the
+                parsed file if the file is unchanged since it was last read
+                (see rcutils.cachedparse), or name of the cache folder to
+                use.  False to always parse the YAML.
     Returns:
-        a:      a list of dictionaries, where each entry corresponds to
-                one I/O variable (i.e., the metadata array from the ROMS
-                varinfo.yaml format).  Dictionary keys correspond to ROMS
-                variable info fields.
+        a:      a VarInfo table: a sequence of dictionaries, where each entry
+                corresponds to one I/O variable (i.e., the metadata array
+                from the ROMS varinfo.yaml format), that can also be indexed
+                by variable name.  Dictionary keys correspond to ROMS
+                variable info fields.  Earlier versions returned a plain list
+                of these dictionaries; a VarInfo table supports the same
+                indexing, iteration and comparisons (use list(a) where an
+                actual list is needed).
     """
-
     if type == "classic":
-        a = 1
+        return _readclassic(file)
     elif type == "yaml":
-        # TODO: default varinfo.yaml isn't compatible due to colons in some fields... I double-quoted those, but should figure out a workaround
-        # Also, figure out how to read/write comments?
-        with open(file, 'r') as f:
-            a= yaml.load(f)
-            a = a['metadata']
-    return a
-
+        if cache:
+            cachedir = cache if isinstance(cache, str) else None
+            return r.cachedparse(file, _parsevarinfoyaml, cachedir=cachedir)
+        with open(file, 'rb') as f:
+            return _parsevarinfoyaml(f.read())
+    raise ValueError(f"Unknown varinfo file type: {type}")
 
 def writefile(a, fname, type="classic"):
     """
     Writes I/O variable info to file
 
     Args:
-        a:      variable info list of dictionaries
+        a:      variable info list of dictionaries, or VarInfo table
         fname:  name of file to create
         type:   file format, can be one of the following
                 "classic":  classic varinfo.dat style
                 "yaml":     newer varinfo.yaml style
     """
-
     if type == "classic":
         with open(fname, 'w') as f:
             for v in a:
-                f.write((f"'{v['variable']}'\n"
-                         f"  '{v['long_name']}'\n"
-                         f"  '{v['units']}'\n"
-                         f"  '{v['field']}'\n"
-                         f"  '{v['time']}'\n"
-                         f"  '{v['index_code']}'\n"
-                         f"  '{v['type']}'\n"
+                q = {k: str(v[k]).replace("'", "''") for k in classicfields[:-1]}
+                f.write((f"'{q['variable']}'\n"
+                         f"  '{q['long_name']}'\n"
+                         f"  '{q['units']}'\n"
+                         f"  '{q['field']}'\n"
+                         f"  '{q['time']}'\n"
+                         f"  '{q['index_code']}'\n"
+                         f"  '{q['type']}'\n"
                          f"  {v['scale']}\n\n"
                         ))
     elif type == "yaml":
-        out = {'metadata': a}
-        with open(fname, 'w') as f:
-            yaml.dump(out, f)
+        _writeyaml(a if isinstance(a, VarInfo) else VarInfo.fromrecords(list(a)), fname)
+
+@functools.lru_cache(maxsize=None)
+def _yamlresolver():
+    import yaml
+
+    return yaml.resolver.Resolver()
+
+def _yamlvalue(x):
+    # One value in varinfo.yaml syntax: plain if it reads back as the same
+    # value, double-quoted otherwise (lists and dicts in JSON-style flow
+    # syntax)
+    import yaml
+
+    if x is None:
+        return ''
+    if isinstance(x, bool):
+        return 'true' if x else 'false'
+    if isinstance(x, (list, tuple, dict)):
+        try:
+            return json.dumps(x, ensure_ascii=False)
+        except TypeError:
+            return repr(x)
+    if not isinstance(x, str):
+        return repr(x)
+    plain = (x == x.strip()) and x and not _unsafevalue.search(x) and \
+            (' #' not in x) and (x[0] not in '\'"#') and \
+            (_yamlresolver().resolve(yaml.ScalarNode, x, (True, False)) == 'tag:yaml.org,2002:str')
+    return x if plain else json.dumps(x, ensure_ascii=False)
+
+def _writeyaml(v, fname):
+    # varinfo.yaml writer, laid out like the stock ROMS file: one block per
+    # variable with aligned values and end-of-line comments, plus any
+    # comments read with the table
+
+    c = v.comments or {}
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        for line in c.get('header', []):
+            f.write(line + '\n')
+        f.write('metadata:\n')
+        for ii, rec in enumerate(v):
+            f.write('\n')
+            for line in c.get('records', {}).get(ii, []):
+                f.write(line + '\n')
+            for jj, (k, x) in enumerate(rec.items()):
+                line = '{}{:16s}{}'.format('  - ' if jj == 0 else '    ', k + ':', _yamlvalue(x))
+                com = c.get('fields', {}).get((ii, k))
+                if com:
+                    line = f"{line:68s} {com}"
+                f.write(line.rstrip() + '\n')
+        if c.get('footer'):
+            f.write('\n')
+            for line in c['footer']:
+                f.write(line + '\n')
+    os.replace(tmp, fname)
@@ -0,0 +1,45 @@
+import os
+import sys
+from datetime import timedelta
+
+import pytest
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'examples', 'bio_toy',
+                       'roms_bio_toy_npzd.yaml')
+FAKEROMS = os.path.join(os.path.dirname(__file__), 'fakeroms.py')
+
+
+@pytest.fixture
+def romscmd():
+    """Command calling the stand-in ROMS (see fakeroms.py)"""
+    return [sys.executable, FAKEROMS]
+
+@pytest.fixture
+def ocean(tmp_path):
+    """
+    Bio toy parameters, starting 2001-01-01 12:00 from a one-record
+    initialization file, with DT = 1 hour and daily output; all other input
+    files are placeholders
+    """
+    import netCDF4 as nc
+
+    ini = str(tmp_path/'ini.nc')
+    with nc.Dataset(ini, 'w') as f:
+        f.createDimension('ocean_time', None)
+        v = f.createVariable('ocean_time', 'f8', ('ocean_time',))
+        v.units = 'seconds since 2001-01-01 12:00:00'
+        v.calendar = 'proleptic_gregorian'
+        v[:] = [0.0]
+
+    d = rc.readparamfile(EXAMPLE, tconvert=True)
+    for k in r.inputfiles(d):
+        d[k] = 'placeholder'
+    d['ININAME'] = ini
+    d['DT'] = timedelta(hours=1)
+    for k in r.timefieldlist(d):
+        if k != 'NTIMES':
+            d[k] = timedelta(days=1)
+    return d
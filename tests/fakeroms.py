@@ -0,0 +1,79 @@
+"""
+Stand-in ROMS executable, for testing runtodate and the tools built on it
+
+Called as `python fakeroms.py [launcher options...] ocean.in`.  Reads the
+standard input file, steps ocean_time from the last record of ININAME for
+NTIMES steps of DT, writing history and restart records every NHIS and NRST
+steps, and prints a ROMS-like log (energy table and completion message) to
+standard output.
+
+Environment variables:
+
+- FAKE_BLOWUP_AT: model time (seconds since TIME_REF) at which runs using
+  the full time step blow up, for 2 days of model time
+- FAKE_FULLDT: full time step, seconds (default: DT); runs with a smaller
+  time step never blow up
+- FAKE_SLEEP: wall time per step, seconds (default: 0)
+"""
+
+import math
+import os
+import sys
+import time
+
+os.environ.setdefault("HDF5_USE_FILE_LOCKING", "FALSE")
+
+import netCDF4 as nc
+
+import romscom.romscom as rc
+
+d = rc.standardin2dict(sys.argv[-1])
+dt, ntimes, nrst, nhis = d['DT'], d['NTIMES'], d['NRST'], d['NHIS']
+with nc.Dataset(d['ININAME']) as f:
+    t0 = float(f.variables['ocean_time'][:].max())
+    units = f.variables['ocean_time'].units
+
+blow = os.environ.get('FAKE_BLOWUP_AT')
+fulldt = float(os.environ.get('FAKE_FULLDT', dt))
+sleep = float(os.environ.get('FAKE_SLEEP', '0'))
+
+def create(fname):
+    with nc.Dataset(fname, 'w') as f:
+        f.createDimension('ocean_time', None)
+        v = f.createVariable('ocean_time', 'f8', ('ocean_time',))
+        v.units = units
+        v.calendar = 'proleptic_gregorian'
+        f.createVariable('zeta', 'f4', ('ocean_time',))
+
+def append(fname, t):
+    with nc.Dataset(fname, 'a') as f:
+        n = len(f.variables['ocean_time'])
+        f.variables['ocean_time'][n] = t
+        f.variables['zeta'][n] = 1.0
+
+his, rst = d['HISNAME'], d['RSTNAME']
+create(his)
+create(rst)
+append(his, t0)
+
+print(" STEP   Day HH:MM:SS  KINETIC_ENRG   POTEN_ENRG    TOTAL_ENRG    NET_VOLUME")
+for step in range(ntimes + 1):
+    t = t0 + step*dt
+    unstable = blow and (float(blow) <= t < float(blow) + 2*86400) and (dt >= fulldt)
+    ke = float('nan') if unstable else 1e-3
+    hms = time.strftime('%H:%M:%S', time.gmtime(t % 86400))
+    print(f"{step:9d} {int(t//86400):5d} {hms}  {ke:.6E}  6.469846E+02  6.469846E+02  8.000000E+03",
+          flush=True)
+    if sleep:
+        time.sleep(sleep)
+    if math.isnan(ke):
+        print(" Blowing-up: Saving latest model state into  RESTART file")
+        print(" MAIN: Abnormal termination: BLOWUP")
+        sys.exit(1)
+    if step > 0 and step % nhis == 0:
+        append(his, t)
+    if step > 0 and step % nrst == 0:
+        append(rst, t)
+
+print("")
+print(" ROMS/TOMS: DONE... Thursday - January 1, 2026 - 12:00:00 PM")
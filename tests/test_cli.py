@@ -0,0 +1,68 @@
+import json
+import sys
+
+import pytest
+
+import romscom.romscom as rc
+from romscom.cli import main
+
+from .conftest import EXAMPLE, FAKEROMS
+
+
+@pytest.fixture
+def paramfile(tmp_path, ocean):
+    # The ocean fixture as a parameter file (JSON is valid YAML)
+    d = rc.ParamDict(ocean)
+    rc.converttimes(d, 'ROMS')
+    fn = tmp_path/'ocean.yaml'
+    fn.write_text(json.dumps(dict(d), indent=1))
+    return str(fn)
+
+@pytest.fixture
+def cachedir(tmp_path, monkeypatch):
+    monkeypatch.setenv('ROMSCOM_CACHE', str(tmp_path/'cache'))
+    return tmp_path/'cache'
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_render(tmp_path, capsys, cachedir, compress):
+    opts = ['--compress'] if compress else []
+    expected = rc.dict2standardin(rc.readparamfile(EXAMPLE), compress=compress)
+
+    assert main(['render', EXAMPLE] + opts) == 0
+    assert capsys.readouterr().out == expected
+    assert any(cachedir.iterdir())
+
+    out = tmp_path/'ocean.in'
+    assert main(['render', EXAMPLE, '-o', str(out), '--no-cache'] + opts) == 0
+    assert out.read_text() == expected
+
+def test_status_no_simulation(tmp_path, capsys):
+    assert main(['status', str(tmp_path/'sim'), 'sim', '--json']) == 0
+    status = json.loads(capsys.readouterr().out)
+    assert status['restartfile'] is None
+    assert status['blocks'] == 0
+
+def test_dryrun(tmp_path, capsys, paramfile, cachedir):
+    assert main(['dry-run', paramfile, str(tmp_path/'sim'), 'sim', '2001-01-03T12:00',
+                 '--no-cache']) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == 'dryrun'
+    assert not cachedir.exists()
+    assert list((tmp_path/'sim'/'In').glob('sim_*.in'))
+
+def test_run_and_status(tmp_path, capsys, paramfile, cachedir):
+    romscmd = f"{sys.executable} {FAKEROMS}"
+    assert main(['run', paramfile, str(tmp_path/'sim'), 'sim', '2001-01-03T12:00',
+                 '--romscmd', romscmd]) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == 'success'
+    assert any(cachedir.iterdir())
+
+    assert main(['status', str(tmp_path/'sim'), 'sim', '--json']) == 0
+    status = json.loads(capsys.readouterr().out)
+    assert status['source'] == 'manifest'
+    assert status['laststatus'] == 'success'
+    assert status['time'] == '2001-01-03T12:00:00'
+    assert status['lastmetrics']['status'] == 'success'
+
+    assert main(['status', str(tmp_path/'sim'), 'sim']) == 0
+    out = capsys.readouterr().out
+    assert 'Blocks run:   1 (0 blowups), last success' in out
@@ -0,0 +1,75 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+
+
+def _manifest(rstfile, count):
+    st = os.stat(rstfile)
+    return {'version': 1, 'simname': 'sim',
+            'restart': {'lastfile': str(rstfile), 'count': count, 'time': '2001-01-02T12:00:00',
+                        'mtime': st.st_mtime_ns, 'size': st.st_size},
+            'blocks': [{'count': 1, 'start': '2001-01-01T12:00:00', 'end': '2001-01-02T12:00:00',
+                        'dt': 3600.0, 'status': 'success'}],
+            'slowsteps': []}
+
+def test_manifest_roundtrip(tmp_path):
+    rst = tmp_path/'sim_01_rst.nc'
+    rst.write_bytes(b'x')
+    fn = str(tmp_path/'sim_manifest.json')
+    m = _manifest(rst, 2)
+    r.writemanifest(fn, m)
+    assert r.readmanifest(fn) == m
+    assert sorted(os.listdir(tmp_path)) == ['sim_01_rst.nc', 'sim_manifest.json']  # no temporary file left
+
+    res = r.manifestrestart(m, str(tmp_path/'sim'))
+    assert res['lastfile'] == str(rst)
+    assert res['count'] == 2
+    assert res['time'] == datetime(2001, 1, 2, 12)
+
+def test_readmanifest_bad_files(tmp_path):
+    assert r.readmanifest(str(tmp_path/'missing.json')) is None
+    fn = tmp_path/'bad.json'
+    fn.write_text('{"version": 1, "blocks": [')
+    with pytest.warns(UserWarning):
+        assert r.readmanifest(str(fn)) is None
+    fn.write_text('{"version": 2}')
+    with pytest.warns(UserWarning):
+        assert r.readmanifest(str(fn)) is None
+
+def test_manifestrestart_stale(tmp_path):
+    rst = tmp_path/'sim_01_rst.nc'
+    rst.write_bytes(b'x')
+    filebase = str(tmp_path/'sim')
+    m = _manifest(rst, 2)
+    assert r.manifestrestart(None, filebase) is None
+    assert r.manifestrestart(dict(m, restart=None), filebase) is None
+
+    # A later restart file exists
+    (tmp_path/'sim_02_rst.nc').write_bytes(b'y')
+    assert r.manifestrestart(m, filebase) is None
+    os.remove(tmp_path/'sim_02_rst.nc')
+    assert r.manifestrestart(m, filebase) is not None
+
+    # The restart file was modified, or removed
+    rst.write_bytes(b'xx')
+    assert r.manifestrestart(m, filebase) is None
+    os.remove(rst)
+    assert r.manifestrestart(m, filebase) is None
+
+def test_runtodate_manifest(tmp_path, ocean, romscmd):
+    res = rc.runtodate(ocean, str(tmp_path/'sim'), 'sim', datetime(2001, 1, 3, 12),
+                       romscmd=romscmd, dryrunflag=False)
+    assert res == 'success'
+    filebase = str(tmp_path/'sim'/'Out'/'sim')
+    m = r.readmanifest(str(tmp_path/'sim'/'Log'/'sim_manifest.json'))
+    rst = r.manifestrestart(m, filebase)
+    assert rst is not None
+    old = r.parserst(filebase)
+    assert (rst['lastfile'], rst['count']) == (old['lastfile'], old['count'])
+    assert rst['time'] == datetime(2001, 1, 3, 12)
+    assert [(b['start'], b['end'], b['status']) for b in m['blocks']] == \
+           [('2001-01-01T12:00:00', '2001-01-03T12:00:00', 'success')]
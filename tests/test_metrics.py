@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+
+
+def test_writemetrics_sinks(tmp_path):
+    jsonl = str(tmp_path/'m.jsonl')
+    prom = tmp_path/'m.prom'
+    seen = []
+    rec = {'simname': 'sim', 'count': 2, 'slow': True, 'walltime': 1.5, 'start': datetime(2001, 1, 1)}
+    r.writemetrics(rec, jsonlfile=jsonl, promfile=str(prom), labels={'simdir': 'a"b'},
+                   hooks=[seen.append])
+    r.writemetrics(dict(rec, count=3), jsonlfile=jsonl)
+
+    with open(jsonl) as f:
+        lines = [json.loads(x) for x in f]
+    assert [x['count'] for x in lines] == [2, 3]
+    assert lines[0]['start'] == '2001-01-01 00:00:00'
+
+    text = prom.read_text().splitlines()
+    assert '# TYPE romscom_block_count gauge' in text
+    assert 'romscom_block_count{simdir="a\\"b"} 2.0' in text
+    assert 'romscom_block_slow{simdir="a\\"b"} 1.0' in text
+    assert not any('simname' in x for x in text)
+    assert seen == [rec]
+
+def test_writemetrics_hook_error(tmp_path):
+    def hook(record):
+        raise RuntimeError('unreachable database')
+
+    with pytest.warns(UserWarning, match='unreachable database'):
+        r.writemetrics({'count': 1}, hooks=[hook])
+
+def test_runtodate_metrics(tmp_path, ocean, romscmd, monkeypatch):
+    monkeypatch.setenv('FAKE_BLOWUP_AT', str(1.5*86400))
+    monkeypatch.setenv('FAKE_FULLDT', '3600')
+    seen = []
+    res = rc.runtodate(ocean, str(tmp_path/'sim'), 'sim', datetime(2001, 1, 4, 12),
+                       romscmd=romscmd, dryrunflag=False, prometheus=True, hooks=[seen.append])
+    assert res == 'success'
+
+    with open(tmp_path/'sim'/'Log'/'sim_metrics.jsonl') as f:
+        recs = [json.loads(x) for x in f]
+    assert recs == seen
+    assert [(x['count'], x['status'], x['slow']) for x in recs] == [(1, 'blowup', False), (2, 'success', True)]
+    assert recs[0]['dt'] == 3600 and recs[1]['dt'] == 1800
+    assert recs[1]['start'] == '2001-01-02T12:00:00'  # rerun from the last history record
+    assert all(x['steps'] > 0 and x['walltime'] > 0 for x in recs)
+    prom = (tmp_path/'sim'/'Log'/'sim_metrics.prom').read_text()
+    assert 'romscom_block_count{simdir="%s",simname="sim"} 2.0' % (tmp_path/'sim') in prom
+
+def test_runtodate_no_metrics(tmp_path, ocean, romscmd):
+    res = rc.runtodate(ocean, str(tmp_path/'sim'), 'sim', datetime(2001, 1, 3, 12),
+                       romscmd=romscmd, dryrunflag=False, metrics=False)
+    assert res == 'success'
+    assert not list((tmp_path/'sim'/'Log').glob('sim_metrics.*'))
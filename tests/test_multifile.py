@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import netCDF4 as nc
+import pytest
+
+import romscom.rcutils as r
+
+
+def _frc(fname, days, tname='frc_time', units='days since 2001-01-01 00:00:00'):
+    with nc.Dataset(fname, 'w') as f:
+        f.createDimension(tname, None)
+        v = f.createVariable(tname, 'f8', (tname,))
+        v.units = units
+        v[:] = days
+    return str(fname)
+
+@pytest.fixture
+def frcdir(tmp_path):
+    # Wind files whose names don't sort in time order, one radiation file,
+    # and a runoff climatology with times relative to TIME_REF
+    _frc(tmp_path/'wind_b.nc', [31, 59])
+    _frc(tmp_path/'wind_a.nc', [59, 90])
+    _frc(tmp_path/'wind_c.nc', [0, 31])
+    _frc(tmp_path/'rad_2001.nc', range(365), tname='srf_time')
+    _frc(tmp_path/'runoff_clim.nc', [15, 45], tname='river_time', units='day')
+    return tmp_path
+
+@pytest.mark.parametrize('nproc', [1, 2])
+def test_multifilelist_orders_by_time(frcdir, nproc):
+    val = r.multifilelist([str(frcdir/'wind_*.nc'), str(frcdir/'rad_*.nc'),
+                           str(frcdir/'runoff_clim.nc')],
+                          timeref=datetime(2001, 1, 1), nproc=nproc)
+    assert val == [[str(frcdir/x) for x in ('wind_c.nc', 'wind_b.nc', 'wind_a.nc')],
+                   str(frcdir/'rad_2001.nc'),
+                   str(frcdir/'runoff_clim.nc')]
+    assert r.multifile2str(list(val)).count(' |\n') == 2
+    assert r.str2multifile(r.multifile2str(list(val))) == val
+
+def test_multifilelist_single(frcdir):
+    assert r.multifilelist(str(frcdir/'rad_*.nc')) == str(frcdir/'rad_2001.nc')
+
+    # Patterns and file names in one group, without duplicates
+    val = r.multifilelist([[str(frcdir/'wind_c.nc'), str(frcdir/'wind_[ab].nc'), str(frcdir/'wind_c.nc')]])
+    assert val == [[str(frcdir/x) for x in ('wind_c.nc', 'wind_b.nc', 'wind_a.nc')]]
+
+def test_multifilelist_errors(frcdir):
+    with pytest.raises(ValueError, match='No files match'):
+        r.multifilelist([str(frcdir/'wind_*.nc'), str(frcdir/'bry_*.nc')])
+    with pytest.raises(ValueError, match='reference time'):
+        r.multifilelist(str(frcdir/'runoff_clim.nc'))
+
+def test_multifilelist_overlap(frcdir):
+    _frc(frcdir/'wind_d.nc', [80, 120])
+    with pytest.warns(UserWarning, match='overlap'):
+        val = r.multifilelist(str(frcdir/'wind_*.nc'))
+    assert val == [[str(frcdir/x) for x in ('wind_c.nc', 'wind_b.nc', 'wind_a.nc', 'wind_d.nc')]]
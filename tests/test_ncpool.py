@@ -0,0 +1,63 @@
+import importlib
+import os
+
+import netCDF4 as nc
+
+import romscom.rcutils as r
+
+
+def _file(fname, n=3):
+    with nc.Dataset(fname, 'w') as f:
+        f.createDimension('ocean_time', None)
+        v = f.createVariable('ocean_time', 'f8', ('ocean_time',))
+        v.units = 'seconds since 2001-01-01'
+        v[:] = range(n)
+    return str(fname)
+
+def test_pool_reuses_handles(tmp_path):
+    fn = _file(tmp_path/'a.nc')
+    pool = r.NCPool()
+    with pool.open(fn) as f1:
+        ds = f1
+    with pool.open(fn) as f2:
+        assert f2 is ds
+        assert len(f2.variables['ocean_time']) == 3
+    assert pool.stats['opens'] == 1 and pool.stats['hits'] == 1
+    assert len(pool) == 1
+
+def test_pool_invalidates_changed_file(tmp_path):
+    fn = _file(tmp_path/'a.nc')
+    pool = r.NCPool()
+    with pool.open(fn) as f:
+        pass
+    pool.close(fn)  # as runtodate does before ROMS writes
+    _file(tmp_path/'a.nc', n=5)
+    with pool.open(fn) as f:
+        assert len(f.variables['ocean_time']) == 5
+    assert pool.stats['opens'] == 2
+
+def test_pool_evicts_and_closes(tmp_path):
+    files = [_file(tmp_path/f"f{ii}.nc") for ii in range(4)]
+    pool = r.NCPool(maxopen=2)
+    handles = []
+    for fn in files:
+        with pool.open(fn) as f:
+            handles.append(f)
+    assert len(pool) == 2 and pool.stats['evictions'] == 2
+    assert not handles[0].isopen() and handles[-1].isopen()
+
+    # Handles in use survive close until released
+    with pool.open(files[-1]) as f:
+        pool.close()
+        assert f.isopen()
+    assert not f.isopen()
+    assert len(pool) == 0
+
+def test_import_without_register_at_fork(monkeypatch):
+    # e.g. on Windows
+    monkeypatch.delattr(os, 'register_at_fork')
+    try:
+        importlib.reload(r)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(r)
@@ -0,0 +1,70 @@
+import os
+from datetime import timedelta
+
+import pytest
+
+import romscom.romscom as rc
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'examples', 'bio_toy',
+                       'roms_bio_toy_npzd.yaml')
+
+
+@pytest.fixture
+def p():
+    p = rc.ParamDict(rc.readparamfile(EXAMPLE))
+    p.tostandardin()  # fill the render cache
+    return p
+
+def _check(p, compress=False):
+    assert p.tostandardin(compress=compress) == rc.dict2standardin(dict(p), compress=compress)
+
+def test_setitem_and_update(p):
+    p['NTIMES'] = 10
+    p.update(TITLE="changed title", AKT_BAK=[1e-5, 2e-6])
+    p |= {'DT': 60.0}
+    _check(p)
+    assert not p.modified()
+
+def test_delitem_pop_popitem(p):
+    del p['TITLE']
+    assert p.pop('NTIMES') == 1600
+    assert p.pop('nonexistent', None) is None
+    key, _ = p.popitem()
+    assert key not in p
+    _check(p)
+
+    # Re-added entries are rendered from their new values
+    p['TITLE'] = "new title"
+    p.setdefault('NTIMES', 5)
+    p[key] = 'replacement.nc'
+    _check(p)
+
+def test_pop_no_plural(p):
+    p.pop('no_plural')
+    _check(p)
+
+def test_setdefault(p):
+    assert p.setdefault('NTIMES', 5) == 1600
+    assert p.setdefault('NEWKEY', 3) == 3
+    _check(p)
+
+def test_clear(p):
+    d = dict(p)
+    p.clear()
+    assert p.tostandardin() == ''
+    p.update(d)
+    p['NTIMES'] = 7
+    _check(p)
+
+def test_touch_and_compress(p):
+    p['AKT_BAK'][0] = 2.0e-5
+    p.touch('AKT_BAK')
+    _check(p)
+    _check(p, compress=True)
+
+def test_time_fields(p):
+    rc.converttimes(p, "time")
+    _check(p)
+    p['DT'] = timedelta(minutes=5)
+    p['NTIMES'] = timedelta(days=1)
+    _check(p)
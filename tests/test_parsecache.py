@@ -0,0 +1,76 @@
+import os
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+
+CALLS = []
+
+def _countingparser(content):
+    CALLS.append(content)
+    return content.decode().split()
+
+
+def test_cachedparse_hit_and_invalidation(tmp_path):
+    CALLS.clear()
+    src = tmp_path/'data.txt'
+    cache = str(tmp_path/'cache')
+    src.write_text('a b c')
+
+    assert r.cachedparse(str(src), _countingparser, cachedir=cache) == ['a', 'b', 'c']
+    assert r.cachedparse(str(src), _countingparser, cachedir=cache) == ['a', 'b', 'c']
+    assert len(CALLS) == 1
+
+    # Touched but unchanged: the contents are hashed, not reparsed
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert r.cachedparse(str(src), _countingparser, cachedir=cache) == ['a', 'b', 'c']
+    assert len(CALLS) == 1
+
+    # Changed contents (same size), with a new modification time
+    src.write_text('x y z')
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 2*10**9))
+    assert r.cachedparse(str(src), _countingparser, cachedir=cache) == ['x', 'y', 'z']
+    assert len(CALLS) == 2
+
+def test_cachedparse_bad_entry(tmp_path):
+    CALLS.clear()
+    src = tmp_path/'data.txt'
+    cache = tmp_path/'cache'
+    src.write_text('a b')
+    r.cachedparse(str(src), _countingparser, cachedir=str(cache))
+    for fn in cache.iterdir():
+        fn.write_bytes(b'garbage')
+    assert r.cachedparse(str(src), _countingparser, cachedir=str(cache)) == ['a', 'b']
+    assert len(CALLS) == 2
+
+def test_trimcache(tmp_path):
+    cache = tmp_path/'cache'
+    for ii in range(5):
+        src = tmp_path/f'data{ii}.txt'
+        src.write_text('word '*200)
+        r.cachedparse(str(src), _countingparser, cachedir=str(cache))
+    sizes = [fn.stat().st_size for fn in cache.iterdir()]
+    assert len(sizes) == 5
+    r.trimcache(str(cache), 2*max(sizes))
+    assert len(list(cache.iterdir())) == 2
+
+def test_readparamfile_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('ROMSCOM_CACHE', str(tmp_path/'cache'))
+    assert r.defaultcachedir() == str(tmp_path/'cache')
+
+    fn = tmp_path/'ocean.yaml'
+    fn.write_text('TITLE: first\nNtileI: 1\nDT: 60\n')
+    assert rc.readparamfile(str(fn), cache=True) == rc.readparamfile(str(fn))
+    assert len(list((tmp_path/'cache').iterdir())) == 1
+
+    d = rc.readparamfile(str(fn), cache=True)
+    d['TITLE'] = 'changed'  # callers get their own copy
+    assert rc.readparamfile(str(fn), cache=True)['TITLE'] == 'first'
+
+    fn.write_text('TITLE: second\nNtileI: 1\nDT: 60\n')
+    d = rc.readparamfile(str(fn), cache=True)
+    assert d['TITLE'] == 'second'
+
+    alt = str(tmp_path/'alt')
+    rc.readparamfile(str(fn), cache=alt)
+    assert len(os.listdir(alt)) == 1
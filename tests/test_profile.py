@@ -0,0 +1,88 @@
+import pytest
+
+import romscom.rcutils as r
+
+PROFILE = """
+ Elapsed CPU time (seconds):
+
+ Node   #  0 CPU:      12.345
+ Node   #  1 CPU:      12.400
+ Total:                24.745
+
+ Nonlinear model elapsed CPU time profile, Grid: 01
+
+  Allocation and array initialization ..............         0.012  ( 0.0485 %)
+  Ocean state initialization .......................         0.100  ( 0.4041 %)
+  Reading of input data ............................         1.000  ( 4.0412 %)
+  Main algorithm ...................................        10.000  (40.4122 %)
+  Processing of output time averaged data ..........         0.500  ( 2.0206 %)
+  Writing of output data ...........................         2.000  ( 8.0824 %)
+  Model 2D kernel ..................................         8.000  (32.3298 %)
+                                              Total:        21.612    87.3388
+
+ Nonlinear model message Passage profile, Grid: 01
+
+  Message Passage: 2D halo exchanges ...............         1.000  ( 4.0412 %)
+  Message Passage: data broadcast ..................         0.500  ( 2.0206 %)
+                                              Total:         1.500     6.0618
+
+ All percentages are with respect to total time =           24.745
+
+ ROMS/TOMS: DONE... Thursday - January 1, 2026 - 12:00:00 AM
+"""
+
+NONLINEAR = 'Nonlinear model elapsed CPU time profile'
+MPI = 'Nonlinear model message Passage profile'
+
+
+def test_parseromsprofile():
+    rows = r.parseromsprofile(PROFILE.splitlines()[1:])
+    nodes = [x for x in rows if x['section'] == 'Elapsed CPU time']
+    assert [(x['region'], x['seconds']) for x in nodes] == \
+           [('Node 0', 12.345), ('Node 1', 12.400), ('Total', 24.745)]
+
+    nl = [x for x in rows if x['section'] == NONLINEAR]
+    assert all(x['grid'] == 1 for x in nl)
+    assert len(nl) == 8
+    assert nl[2] == {'section': NONLINEAR, 'grid': 1, 'region': 'Reading of input data',
+                     'seconds': 1.0, 'percent': 4.0412}
+    assert nl[-1]['region'] == 'Total'
+    assert nl[-1]['seconds'] == pytest.approx(sum(x['seconds'] for x in nl[:-1]))
+
+    mpi = [x for x in rows if x['section'] == MPI]
+    assert [x['region'] for x in mpi] == ['Message Passage: 2D halo exchanges',
+                                          'Message Passage: data broadcast', 'Total']
+    assert rows[-1] == {'section': 'Summary', 'grid': None, 'region': 'Total',
+                        'seconds': 24.745, 'percent': 100.0}
+
+def test_profilesummary():
+    s = r.profilesummary(r.parseromsprofile(PROFILE.splitlines()[1:]))
+    assert s['total'] == 24.745
+    assert s['io'] == pytest.approx(3.5)
+    assert s['mpi'] == pytest.approx(1.5)
+    assert s['compute'] == pytest.approx(18.112)
+    assert s['iofrac'] == pytest.approx(3.5/24.745)
+    assert s['mpifrac'] == pytest.approx(1.5/24.745)
+
+    # Without the summary line, fractions are of the profiled time
+    rows = [x for x in r.parseromsprofile(PROFILE.splitlines()[1:]) if x['section'] != 'Summary']
+    assert r.profilesummary(rows)['total'] == pytest.approx(23.112)
+    assert r.profilesummary([])['iofrac'] is None
+
+@pytest.mark.parametrize('tailsize', [64, 1024**2])
+def test_readromsprofile(tmp_path, tailsize):
+    fn = tmp_path/'log.txt'
+    fn.write_text(' STEP   Day HH:MM:SS  KINETIC_ENRG\n' + 'x'*5000 + '\n' + PROFILE)
+    assert r.readromsprofile(str(fn), tailsize=tailsize) == r.parseromsprofile(PROFILE.splitlines()[1:])
+
+    fn.write_text('no report here\n')
+    assert r.readromsprofile(str(fn), tailsize=tailsize) == []
+
+def test_compareprofiles(tmp_path):
+    fn = tmp_path/'log.txt'
+    fn.write_text(PROFILE)
+    other = [x for x in r.parseromsprofile(PROFILE.splitlines()[1:]) if x['region'] != 'Main algorithm']
+    table = r.compareprofiles([str(fn), other], labels=['a', 'b'])
+    main = [x for x in table if x['region'] == 'Main algorithm']
+    assert main == [{'section': NONLINEAR, 'grid': 1, 'region': 'Main algorithm', 'a': 10.0, 'b': None}]
+    assert len(table) == len(other) + 1
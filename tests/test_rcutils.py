@@ -0,0 +1,114 @@
+import json
+import os
+from datetime import datetime
+
+import netCDF4 as nc
+import numpy as np
+import pytest
+
+import romscom.rcutils as r
+
+
+def _his(fname, days):
+    with nc.Dataset(fname, 'w') as f:
+        f.createDimension('ocean_time', None)
+        v = f.createVariable('ocean_time', 'f8', ('ocean_time',))
+        v.units = 'days since 2001-01-01 00:00:00'
+        v.calendar = 'proleptic_gregorian'
+        v[:] = days
+    return str(fname)
+
+def test_timeindex_json_cache(tmp_path):
+    _his(tmp_path/'sim_his_01.nc', np.arange(0, 5))
+    _his(tmp_path/'sim_his_02.nc', np.arange(5, 10))
+    idx = r.timeindex(str(tmp_path), nproc=1)
+    cachefile = tmp_path/'.romscom_timeindex.json'
+    with open(cachefile) as f:
+        cache = json.load(f)
+    assert sorted(cache) == idx['files']
+    assert len(idx['time']) == 10
+
+    # Cached entries are reused as-is for unchanged files
+    fn = idx['files'][0]
+    cache[fn]['time'] = [0.0]
+    with open(cachefile, 'w') as f:
+        json.dump(cache, f)
+    assert len(r.timeindex(str(tmp_path), nproc=1)['time']) == 6
+
+def test_timeindex_ignores_bad_cache(tmp_path):
+    _his(tmp_path/'sim_his_01.nc', np.arange(0, 5))
+    cachefile = tmp_path/'.romscom_timeindex.json'
+    for junk in (b'\x80\x04\x95junk', b'[1, 2]', b'{"x": {"unit": 1}}'):
+        cachefile.write_bytes(junk)
+        assert len(r.timeindex(str(tmp_path), nproc=1)['time']) == 5
+
+def test_findclosesttime(tmp_path):
+    _his(tmp_path/'sim_his_01.nc', np.arange(0, 5))
+    _his(tmp_path/'sim_his_02.nc', np.arange(5, 10))
+    res = r.findclosesttime(str(tmp_path), datetime(2001, 1, 7, 5), cachefile=False)
+    assert os.path.basename(res['filename']) == 'sim_his_02.nc'
+    assert res['idx'] == 1
+    assert res['dt'].total_seconds() == 5*3600
+
+def test_findclosesttime_ties_go_to_first_match(tmp_path):
+    # Overlapping files (day 4 in both), as after a restart
+    _his(tmp_path/'sim_his_01.nc', np.arange(0, 5))
+    _his(tmp_path/'sim_his_02.nc', np.arange(4, 10))
+    res = r.findclosesttime(str(tmp_path), datetime(2001, 1, 5), cachefile=False)
+    assert os.path.basename(res['filename']) == 'sim_his_01.nc'
+    assert res['idx'] == 4
+
+    # Midway between records: the earlier one
+    res = r.findclosesttime(str(tmp_path), [datetime(2001, 1, 2, 12), datetime(2001, 1, 5, 12)],
+                            cachefile=False)
+    assert [(os.path.basename(x['filename']), x['idx']) for x in res] == \
+           [('sim_his_01.nc', 1), ('sim_his_01.nc', 4)]
+
+    # Past either end
+    res = r.findclosesttime(str(tmp_path), [datetime(2000, 1, 1), datetime(2002, 1, 1)],
+                            cachefile=False)
+    assert [(os.path.basename(x['filename']), x['idx']) for x in res] == \
+           [('sim_his_01.nc', 0), ('sim_his_02.nc', 5)]
+
+def test_timeindex_patterns_share_sidecar(tmp_path, monkeypatch):
+    _his(tmp_path/'sim_his_01.nc', np.arange(0, 5))
+    _his(tmp_path/'sim_avg_01.nc', np.arange(0, 5) + 0.5)
+    reads = []
+    readtimeaxis = r._readtimeaxis
+    monkeypatch.setattr(r, '_readtimeaxis', lambda fn: reads.append(fn) or readtimeaxis(fn))
+
+    r.timeindex(str(tmp_path), pattern='*his*.nc', nproc=1)
+    r.timeindex(str(tmp_path), pattern='*avg*.nc', nproc=1)
+    assert len(reads) == 2
+
+    his = r.timeindex(str(tmp_path), pattern='*his*.nc', nproc=1)
+    avg = r.timeindex(str(tmp_path), pattern='*avg*.nc', nproc=1)
+    assert len(reads) == 2
+    assert [os.path.basename(f) for f in his['files'] + avg['files']] == \
+           ['sim_his_01.nc', 'sim_avg_01.nc']
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_list2str_small_lists(monkeypatch, vectorized):
+    monkeypatch.setattr(r, '_list2strvectorized', 0 if vectorized else 10**9)
+    assert r.list2str([1, True]) == '1 1'
+    assert r.list2str([True, 1, 1], consecstep=0) == '3*1'
+    assert r.list2str([True, True, False], consecstep=0) == '2*T F'
+    assert r.list2str([1.0, 1.0, 2.5], consecstep=0) == '2*1.0d0 2.5d0'
+    assert r.list2str([1, 2, 3, 5], consecstep=1) == '3*1 5'
+    assert r.list2str(['a', 'b']) == 'a b'
+
+@pytest.mark.parametrize('n', [255, 256, 257, 1000])
+@pytest.mark.parametrize('kind', ['bool', 'int', 'float', 'intbool'])
+def test_list2str_threshold(monkeypatch, n, kind):
+    # The pure python and numpy paths agree on either side of the threshold
+    rng = np.random.default_rng(n)
+    x = rng.integers(0, 3, n)
+    tmp = {'bool': (x > 0).tolist(), 'int': x.tolist(), 'float': (x/4).tolist(),
+           'intbool': [bool(v) if ii % 3 else int(v) for ii, v in enumerate(x)]}[kind]
+    for step in (-99999, 0, 1):
+        out = r.list2str(tmp, consecstep=step)
+        monkeypatch.setattr(r, '_list2strvectorized', 0)
+        assert r.list2str(tmp, consecstep=step) == out
+        monkeypatch.setattr(r, '_list2strvectorized', 10**9)
+        assert r.list2str(tmp, consecstep=step) == out
+        monkeypatch.undo()
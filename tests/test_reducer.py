@@ -0,0 +1,87 @@
+import os
+
+import netCDF4 as nc
+import numpy as np
+
+import romscom.romscom as rc
+from romscom.reducer import Exceedance, Moments, reduceoutput
+
+
+def _avg(fname, times, x):
+    with nc.Dataset(fname, 'w') as f:
+        f.createDimension('ocean_time', None)
+        f.createDimension('eta_rho', x.shape[1])
+        f.createDimension('xi_rho', x.shape[2])
+        t = f.createVariable('ocean_time', 'f8', ('ocean_time',))
+        t.units = 'days since 2001-01-01'
+        t[:] = times
+        v = f.createVariable('temp', 'f8', ('ocean_time', 'eta_rho', 'xi_rho'), fill_value=1e37)
+        v.units = 'Celsius'
+        v[:] = x
+
+def _members(tmp_path, rng):
+    # Two simulations, each split over two files; the second one reran its
+    # last two records in its second file (dedupe should drop the first copy)
+    data = []
+    sims = []
+    for im, nt in enumerate((9, 12)):
+        x = rng.normal(10, 2, (nt, 3, 4))
+        x[1, 0, 0] = np.nan
+        sim = str(tmp_path/f"m{im}")
+        out = rc.simfolders(sim, create=True)['out']
+        if im == 0:
+            _avg(os.path.join(out, 'sim_01_avg.nc'), np.arange(0, 5), x[:5])
+            _avg(os.path.join(out, 'sim_02_avg.nc'), np.arange(5, nt), x[5:])
+        else:
+            stale = rng.normal(0, 1, (2, 3, 4))
+            _avg(os.path.join(out, 'sim_01_avg.nc'), np.arange(0, 8),
+                 np.concatenate([x[:6], stale]))
+            _avg(os.path.join(out, 'sim_02_avg.nc'), np.arange(6, nt), x[6:])
+        sims.append(sim)
+        data.append(x)
+    return sims, data
+
+def test_reduceoutput_matches_numpy(tmp_path):
+    rng = np.random.default_rng(0)
+    sims, data = _members(tmp_path, rng)
+
+    # Chunks of 4 records, so files are split mid-way and partial results
+    # are merged both within and across files
+    res = reduceoutput(sims, 'temp', outfile=str(tmp_path/'summary.nc'),
+                       reducers=[Moments(ddof=1), Exceedance(11.0)], nproc=2,
+                       chunkbytes=4*3*4*8)
+
+    allx = np.concatenate(data)
+    for im, x in enumerate(data):
+        assert np.array_equal(res['temp_count'][im], np.isfinite(x).sum(axis=0))
+        assert np.allclose(res['temp_mean'][im], np.nanmean(x, axis=0))
+        assert np.allclose(res['temp_var'][im], np.nanvar(x, axis=0, ddof=1))
+        assert np.allclose(res['temp_min'][im], np.nanmin(x, axis=0))
+        assert np.allclose(res['temp_max'][im], np.nanmax(x, axis=0))
+        frac = (x > 11.0).sum(axis=0)/np.isfinite(x).sum(axis=0)
+        assert np.allclose(res['temp_gt11'][im], frac)
+    assert np.allclose(res['temp_mean_ensemble'], np.nanmean(allx, axis=0))
+    assert np.allclose(res['temp_var_ensemble'], np.nanvar(allx, axis=0, ddof=1))
+
+    with nc.Dataset(tmp_path/'summary.nc') as f:
+        assert list(f.variables['nrec'][:]) == [9, 12]
+        assert np.allclose(f.variables['temp_mean'][:], res['temp_mean'])
+
+def test_moments_merge_order():
+    rng = np.random.default_rng(1)
+    x = rng.normal(0, 1, (50, 3))
+    m = Moments()
+    parts = [m.chunk(np.ma.masked_invalid(x[a:b])) for a, b in ((0, 7), (7, 31), (31, 50))]
+    fwd = m.finalize(m.merge(m.merge(parts[0], parts[1]), parts[2]))
+    rev = m.finalize(m.merge(parts[2], m.merge(parts[1], parts[0])))
+    for k in ('mean', 'var'):
+        assert np.allclose(fwd[k], rev[k])
+    assert np.allclose(fwd['var'], x.var(axis=0))
+
+def test_plan_keeps_history_index(tmp_path):
+    rng = np.random.default_rng(2)
+    sims, _ = _members(tmp_path, rng)
+    out = rc.simfolders(sims[0])['out']
+    reduceoutput(sims[0], 'temp', nproc=1)
+    assert os.path.isfile(os.path.join(out, '.romscom_timeindex_avg_nc.json'))
+    assert not os.path.exists(os.path.join(out, '.romscom_timeindex.json'))
@@ -0,0 +1,93 @@
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import romscom.rcutils as r
+
+HEADER = " STEP   Day HH:MM:SS  KINETIC_ENRG   POTEN_ENRG    TOTAL_ENRG    NET_VOLUME\n"
+
+def _row(step, ke):
+    return f"{step:9d} {step//24:5d} 00:00:00  {ke:.6E}  6.469846E+02  6.469846E+02  8.000000E+03\n"
+
+
+def test_watchromslog_stops_on_nan(tmp_path):
+    # A stand-in process that reports NaN energy, then hangs (as an MPI job
+    # often does after a blowup)
+    fname = tmp_path/'log.txt'
+    text = HEADER + _row(0, 1e-3) + _row(1, 1e-3) + _row(2, float('nan'))
+    script = f"import sys, time; sys.stdout.write({text!r}); sys.stdout.flush(); time.sleep(60)"
+    with open(fname, 'w') as f:
+        proc = subprocess.Popen([sys.executable, '-c', script], stdout=f, start_new_session=True)
+        t0 = time.time()
+        res = r.watchromslog(proc, str(fname), pollinterval=0.1, grace=5)
+    assert time.time() - t0 < 30
+    assert res['killed']
+    assert 'NaN' in res['reason']
+    assert res['laststep'] == 2
+
+    # The returned log resumes where the watcher stopped
+    log = r.readromslog(str(fname), log=res['log'])
+    full = r.readromslog(str(fname))
+    assert np.array_equal(log['step'], full['step'])
+    assert log['offset'] == full['offset']
+
+def test_watchromslog_clean_exit(tmp_path):
+    fname = tmp_path/'log.txt'
+    script = "print(%r + %r + ' ROMS/TOMS: DONE...')" % (HEADER, _row(0, 1e-3))
+    with open(fname, 'w') as f:
+        proc = subprocess.Popen([sys.executable, '-c', script], stdout=f, start_new_session=True)
+        res = r.watchromslog(proc, str(fname), pollinterval=0.1)
+    assert not res['killed'] and res['reason'] == ''
+    assert res['log']['cleanrun']
+
+def _logtext():
+    # Preamble, an energy table with file events between rows, a NaN row,
+    # and the end-of-run report
+    lines = [" Model Input Parameters:  ROMS/TOMS version 4.1\n", " STEP 12 text that is not a row\n",
+             HEADER]
+    for step in range(30):
+        lines.append(_row(step, float('nan') if step == 17 else 1e-3*(1 + step)))
+        if step % 10 == 0:
+            lines.append(f"       DEF_HIS     - creating history file, Grid 01: ocean_his_{step:04d}.nc\n")
+    lines += ["      DEF_RST     - creating restart file,  Grid 01: ocean_rst.nc\n",
+              " Elapsed CPU time (seconds):\n", "      0     1 00:00:00  9.0E+00  9.0E+00  9.0E+00  9.0E+00\n",
+              " ROMS/TOMS: DONE... Thursday - January 1, 2026 - 12:00:00 AM\n"]
+    return ''.join(lines)
+
+def _samelog(a, b):
+    for k in ('step', 'day', 'time'):
+        assert np.array_equal(a[k], b[k])
+    for k in ('kinetic', 'potential', 'total', 'volume'):
+        assert np.array_equal(a[k], b[k], equal_nan=True)
+    for k in ('events', 'cleanrun', 'blowup', 'abort', 'offset'):
+        assert a[k] == b[k]
+
+@pytest.mark.parametrize('chunksize', [1, 7, 80, 1000, 16*1024**2])
+def test_readromslog_chunksize(tmp_path, chunksize):
+    fname = tmp_path/'log.txt'
+    fname.write_text(_logtext())
+    ref = r.readromslog(str(fname))
+    assert list(ref['step']) == list(range(30))
+    assert np.isnan(ref['kinetic'][17])
+    assert [(e['event'], e['step'], e['file']) for e in ref['events']] == \
+           [('DEF_HIS', s, f"ocean_his_{s:04d}.nc") for s in (0, 10, 20)] + [('DEF_RST', 29, 'ocean_rst.nc')]
+    assert ref['cleanrun']
+    _samelog(r.readromslog(str(fname), chunksize=chunksize), ref)
+
+@pytest.mark.parametrize('chunksize', [7, 1000])
+@pytest.mark.parametrize('frac', [0.1, 0.37, 0.5, 0.9])
+def test_readromslog_resume(tmp_path, chunksize, frac):
+    # A log read while partly written (cut mid-line), then resumed
+    text = _logtext()
+    fname = tmp_path/'log.txt'
+    ncut = int(len(text)*frac)
+    fname.write_text(text[:ncut])
+    part = r.readromslog(str(fname), chunksize=chunksize)
+    assert part['offset'] == text.rfind('\n', 0, ncut) + 1
+    with open(fname, 'a') as f:
+        f.write(text[ncut:])
+    log = r.readromslog(str(fname), log=part, chunksize=chunksize)
+    _samelog(log, r.readromslog(str(fname)))
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import romscom.romscom as rc
+
+
+def test_runtodate_updates_callers_dict(tmp_path, ocean, romscmd):
+    ini = ocean['ININAME']
+    res = rc.runtodate(ocean, str(tmp_path/'sim'), 'sim', datetime(2001, 1, 3, 12),
+                       romscmd=romscmd, dryrunflag=False)
+    assert res == 'success'
+    assert not isinstance(ocean, rc.ParamDict)
+    assert ocean['ININAME'] != ini
+    assert ocean['ININAME'].startswith(str(tmp_path/'sim'/'Out'))
+    assert ocean['NRREC'] == -1
+    assert ocean['NTIMES'] == timedelta(days=2)
+
+def test_runtodate_records_blowup(tmp_path, ocean, romscmd, monkeypatch):
+    monkeypatch.setenv('FAKE_BLOWUP_AT', str(1.5*86400))
+    monkeypatch.setenv('FAKE_FULLDT', '3600')
+    res = rc.runtodate(ocean, str(tmp_path/'sim'), 'sim', datetime(2001, 1, 4, 12),
+                       romscmd=romscmd, dryrunflag=False)
+    assert res == 'success'
+    m = rc.r.readmanifest(str(tmp_path/'sim'/'Log'/'sim_manifest.json'))
+    assert [b['status'] for b in m['blocks']] == ['blowup', 'success']
+    assert m['slowsteps'][0][2] == 1800
+    assert ocean['DT'] == timedelta(minutes=30)  # still in the slow-step period
+
+def test_runtodate_monitor(tmp_path, ocean, romscmd, monkeypatch):
+    monkeypatch.setenv('FAKE_BLOWUP_AT', str(1.5*86400))
+    monkeypatch.setenv('FAKE_FULLDT', '3600')
+    res = rc.runtodate(ocean, str(tmp_path/'sim'), 'sim', datetime(2001, 1, 4, 12),
+                       romscmd=romscmd, dryrunflag=False, monitor=True)
+    assert res == 'success'
+    m = rc.r.readmanifest(str(tmp_path/'sim'/'Log'/'sim_manifest.json'))
+    assert [b['status'] for b in m['blocks']] == ['blowup', 'success']
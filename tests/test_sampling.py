@@ -0,0 +1,54 @@
+import csv
+import os
+from datetime import datetime, timedelta
+
+import romscom.romscom as rc
+from romscom.sampling import design, runsamples
+
+BIO = os.path.join(os.path.dirname(__file__), '..', 'examples', 'bio_toy', 'npzd_Powell.yaml')
+
+
+def test_design_lhs_strata():
+    samples = design({'a': [0.0, 1.0], 'b': {'low': 1.0, 'high': 100.0, 'scale': 'log'}},
+                     8, method='lhs', seed=1)
+    assert len(samples) == 8
+    assert sorted(int(s['a']*8) for s in samples) == list(range(8))
+    assert all(1.0 <= s['b'] <= 100.0 for s in samples)
+
+def test_design_grid():
+    samples = design({'a': [0.0, 1.0], 'b': {'values': ['x', 'y']}}, method='grid', levels=3)
+    assert [tuple(s.values()) for s in samples] == [
+        (0.0, 'x'), (0.0, 'y'), (0.5, 'x'), (0.5, 'y'), (1.0, 'x'), (1.0, 'y')]
+
+def test_runsamples(tmp_path, ocean, romscmd, monkeypatch):
+    # Runs at the full 1-hour time step blow up 1.5 days in, so only the
+    # members using it need a slow-step period
+    monkeypatch.setenv('FAKE_BLOWUP_AT', str(1.5*86400))
+    monkeypatch.setenv('FAKE_FULLDT', '3600')
+
+    bio = rc.readparamfile(BIO)
+    samples = design({'DT': {'values': [timedelta(hours=1), timedelta(minutes=30)]},
+                      'BPARNAM/PhyIS': {'values': [0.01, 0.05]}}, method='grid')
+    simdir = str(tmp_path/'sens')
+    rows = runsamples(ocean, samples, simdir, datetime(2001, 1, 4, 12), files={'BPARNAM': bio},
+                      romscmd=romscmd, dryrunflag=False, ncores=2)
+
+    names = [f"member{ii:03d}" for ii in range(4)]
+    assert [row['member'] for row in rows] == names
+    for name, sample in zip(names, samples):
+        for sub in ('In', 'Log', 'Out'):
+            assert os.path.isdir(os.path.join(simdir, name, sub))
+        bfile = os.path.join(simdir, name, 'In', f"{name}_bparnam.in")
+        assert rc.standardin2dict(bfile)['PhyIS'] == sample['BPARNAM/PhyIS']
+
+    assert [row['status'] for row in rows] == ['success']*4
+    assert [row['blowups'] for row in rows] == [1, 1, 0, 0]
+    assert [row['modeltime'] for row in rows] == ['2001-01-04T12:00:00']*4
+
+    with open(os.path.join(simdir, 'member_samples.csv')) as f:
+        table = list(csv.DictReader(f))
+    assert list(table[0]) == ['member', 'simdir', 'DT', 'BPARNAM/PhyIS', 'status', 'error',
+                              'walltime', 'modeltime', 'blocks', 'blowups']
+    assert [t['member'] for t in table] == names
+    assert [t['blowups'] for t in table] == ['1', '1', '0', '0']
+    assert [float(t['BPARNAM/PhyIS']) for t in table] == [0.01, 0.05, 0.01, 0.05]
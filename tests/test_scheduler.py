@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+import romscom.rcutils as r
+from romscom.scheduler import Scheduler, romscores
+
+
+@pytest.mark.parametrize('cmd, n', [
+    (['romsS'], 1),
+    (['mpirun', '-np', '4', 'romsM'], 4),
+    (['mpirun', '-np4', 'romsM'], 4),
+    (['mpiexec', '-n', '8', 'romsM'], 8),
+    (['srun', '--ntasks=16', 'romsM'], 16),
+    (['srun', '--ntasks', '16', 'romsM'], 16),
+    (['srun', '-n', '2', '-c', '4', 'romsM'], 2),
+    (['srun', '-c', '4', 'romsM'], 1),
+    (['srun', '-c4', 'romsM'], 1),
+])
+def test_romscores(cmd, n):
+    assert romscores(cmd) == n
+
+def _overlap(status, t):
+    # Cores in use at time t
+    return sum(j['ncores'] for j in status if j['start'] <= t < j['end'])
+
+def test_run_core_budget_and_order(tmp_path, ocean, romscmd, monkeypatch):
+    monkeypatch.setenv('FAKE_SLEEP', '0.05')
+    s = Scheduler(4)
+    for ii, n in enumerate([3, 2, 1, 2]):
+        s.add(ocean, str(tmp_path/f"sim{ii}"), "sim", datetime(2001, 1, 3, 12),
+              romscmd=romscmd + ['-np', str(n)], dryrunflag=False)
+    assert [j['ncores'] for j in s.status()] == [3, 2, 1, 2]
+    assert s.corefree() == 4
+
+    status = s.run()
+    assert [j['state'] for j in status] == ['done']*4
+    assert [j['result'] for j in status] == ['success']*4
+    assert all(j['error'] is None for j in status)
+
+    # Never more than 4 cores busy; the 2-core job that didn't fit next to
+    # the 3-core one was passed over in favor of the 1-core job
+    assert max(_overlap(status, j['start']) for j in status) <= 4
+    assert status[2]['start'] < status[1]['start']
+    assert status[0]['start'] <= status[2]['start']
+    assert status[1]['start'] >= min(status[0]['end'], status[2]['end'])
+
+    for ii in range(4):
+        m = r.readmanifest(str(tmp_path/f"sim{ii}"/"Log"/"sim_manifest.json"))
+        assert m['restart']['time'] == '2001-01-03T12:00:00'
+
+def test_run_reports_exceptions_per_job(tmp_path, ocean, romscmd):
+    bad = dict(ocean)
+    del bad['ININAME']
+    s = Scheduler(2)
+    s.add(ocean, str(tmp_path/"good"), "sim", datetime(2001, 1, 2, 12), romscmd=romscmd,
+          dryrunflag=False)
+    s.add(bad, str(tmp_path/"bad"), "sim", datetime(2001, 1, 2, 12), romscmd=romscmd,
+          dryrunflag=False)
+    status = s.run()
+    assert status[0]['result'] == 'success'
+    assert status[1]['result'] == 'exception'
+    assert 'ININAME' in status[1]['error']
+    assert all(j['state'] == 'done' and j['end'] >= j['start'] for j in status)
+
+def test_add_rejects_oversized_job(ocean, romscmd):
+    s = Scheduler(2)
+    with pytest.raises(ValueError):
+        s.add(ocean, "sim", "sim", datetime(2001, 1, 2), romscmd=romscmd + ['-np', '4'])
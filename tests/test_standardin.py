@@ -0,0 +1,92 @@
+import copy
+import glob
+import io
+import os
+
+import pytest
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+
+EXAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'examples', '**', '*.yaml'),
+                            recursive=True))
+PARAMFILES = [f for f in EXAMPLES if not f.endswith('yaml_header.yaml')]
+ROMSFILE = [f for f in PARAMFILES if f.endswith('roms_bio_toy_npzd.yaml')][0]
+
+
+def _render(strdict, no_plural):
+    # Standard input text from a dictionary of formatted values
+    return ''.join(line for ky, val in strdict.items() if ky != 'no_plural'
+                   for line in r.formatentry(ky, val, no_plural))
+
+@pytest.mark.parametrize('fname', EXAMPLES, ids=os.path.basename)
+@pytest.mark.parametrize('compress', [False, True])
+def test_stringifyvalues_matches_reference(fname, compress):
+    d = rc.readparamfile(fname)
+    new = rc.stringifyvalues(d, compress=compress)
+    ref = rc.stringifyvalues_reference(d, compress=compress)
+    assert list(new) == list(ref)
+    no_plural = d.get('no_plural', [])
+    assert _render(new, no_plural).encode() == _render(ref, no_plural).encode()
+    assert rc.dict2standardin(d, compress=compress) == _render(ref, no_plural)
+
+@pytest.mark.parametrize('fname', PARAMFILES, ids=os.path.basename)
+@pytest.mark.parametrize('compress', [False, True])
+def test_standardin_roundtrip(fname, compress):
+    d = rc.readparamfile(fname)
+    txt = rc.dict2standardin(d, compress=compress)
+    back = rc.standardin2dict(io.StringIO(txt))
+    assert rc.dict2standardin(back, compress=compress) == txt
+    for ky in ('LBC', 'ad_LBC'):
+        if ky in d:
+            assert back[ky] == d[ky]
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_standardin_roundtrip_multifile_stations(compress):
+    d = rc.readparamfile(ROMSFILE)
+    d['FRCNAME'] = [['a1.nc', 'a2.nc'], 'b.nc', ['c1.nc', 'c2.nc', 'c3.nc']]
+    d['NFFILES'] = 3
+    d['POS'] = [[1, 1, -150.5, 58.25], [1, 0, 10, 20], [1, 1, -151.0, 59.0]]
+    txt = rc.dict2standardin(d, compress=compress)
+    assert '|' in txt
+    assert '\\' in txt  # LBC rows continue over several lines
+    back = rc.standardin2dict(io.StringIO(txt))
+    assert rc.dict2standardin(back, compress=compress) == txt
+    for ky in ('FRCNAME', 'POS', 'LBC', 'ad_LBC'):
+        assert back[ky] == d[ky]
+
+@pytest.mark.parametrize('tconvert', [False, True])
+@pytest.mark.parametrize('compress', [False, True])
+def test_ensemble2standardin_matches_dict2standardin(tmp_path, tconvert, compress):
+    base = rc.readparamfile(ROMSFILE, tconvert=tconvert)
+    overrides = [{},
+                 {'DT': base['DT']/2, 'NTIMES': base['NTIMES']*2},
+                 {'LBC': base['LBC'] | {'isTvar': ['Clo']*len(base['LBC']['isTvar'])}},
+                 {'TNU2': [1.0, 2.0], 'NEWKEY': 'x'},
+                 {'FRCNAME': [['a1.nc', 'a2.nc'], 'b.nc']}]
+    files = [str(tmp_path/f'ocean_{i:02d}.in') for i in range(len(overrides))]
+
+    out = rc.ensemble2standardin(base, overrides, files, compress=compress, nproc=2)
+    assert out == files
+    for o, f in zip(overrides, files):
+        with open(f) as fid:
+            assert fid.read() == rc.dict2standardin(base | o, compress=compress)
+
+@pytest.mark.parametrize('tconvert', [False, True])
+@pytest.mark.parametrize('compress', [False, True])
+def test_writestandardin_matches_dict2standardin(tmp_path, tconvert, compress):
+    d = rc.readparamfile(ROMSFILE, tconvert=tconvert)
+    d['POS'] = [[1, 1, -150.5, 58.25], [1, 0, 10, 20]]
+    d['FRCNAME'] = [['a1.nc', 'a2.nc'], 'b.nc']
+    before = copy.deepcopy(d)
+    expected = rc.dict2standardin(d, compress=compress)
+
+    fn = tmp_path/'ocean.in'
+    rc.writestandardin(d, str(fn), compress=compress)
+    assert fn.read_text() == expected
+
+    buf = io.StringIO()
+    rc.writestandardin(d, buf, compress=compress)
+    assert buf.getvalue() == expected
+    assert ''.join(rc.iterstandardin(d, compress=compress)) == expected
+    assert d == before  # time fields are converted on a copy
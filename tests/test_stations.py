@@ -0,0 +1,71 @@
+import os
+
+import netCDF4 as nc
+import numpy as np
+import pytest
+
+import romscom.rcutils as r
+import romscom.romscom as rc
+
+ROWS = [[1, 1, -150.5, 58.25], [1, 0, 10, 20], [2, 1, -151.0, 59.0]]
+
+
+def test_pos_formatting_matches_reference():
+    expected = rc.stringifyvalues_reference({'POS': [list(x) for x in ROWS]})['POS']
+    assert rc.formatvalue('POS', ROWS) == expected
+    assert rc.formatvalue('POS', np.array(ROWS)) == expected
+    assert rc.formatvalue('POS', np.array(ROWS).ravel()) == expected
+    assert rc.formatvalue('POS', []).split('\n') == [expected.split('\n')[0]]
+
+@pytest.mark.parametrize('rows', [[[1.5, 1, 0, 0]], [[1, 2, 0, 0]], [[1, 0, 1.5, 2]]])
+def test_pos_bad_rows(rows):
+    with pytest.raises(ValueError):
+        rc.formatvalue('POS', rows)
+
+def test_readstationtable_csv(tmp_path):
+    fn = tmp_path/'stations.csv'
+    fn.write_text('\n'.join(','.join(str(v) for v in row) for row in ROWS) + '\n')
+    assert np.array_equal(r.readstationtable(str(fn)), ROWS)
+
+    # Named columns, in any order, with extra columns
+    fn.write_text('name,Y,X,Flag,grid\n' +
+                  ''.join(f"st{ii},{y},{x},{f},{g}\n" for ii, (g, f, x, y) in enumerate(ROWS)))
+    assert np.array_equal(r.readstationtable(str(fn)), ROWS)
+
+    fn.write_text('name,lon,lat\nst0,1,2\n')
+    with pytest.raises(ValueError):
+        r.readstationtable(str(fn))
+
+def test_readstationtable_npy(tmp_path):
+    fn = str(tmp_path/'stations.npy')
+    np.save(fn, np.array(ROWS))
+    assert np.array_equal(r.readstationtable(fn), ROWS)
+
+    tbl = np.zeros(len(ROWS), dtype=[('ypos', 'f8'), ('xpos', 'f8'), ('grid', 'i4'), ('flag', 'i4')])
+    for ii, (g, f, x, y) in enumerate(ROWS):
+        tbl[ii] = (y, x, g, f)
+    np.save(fn, tbl)
+    assert np.array_equal(r.readstationtable(fn), ROWS)
+
+def test_readstationtable_nc(tmp_path):
+    fn = str(tmp_path/'stations.nc')
+    with nc.Dataset(fn, 'w') as f:
+        f.createDimension('station', len(ROWS))
+        for ii, x in enumerate(('grid', 'flag', 'xpos', 'ypos')):
+            f.createVariable(x, 'f8', ('station',))[:] = [row[ii] for row in ROWS]
+    assert np.array_equal(r.readstationtable(fn), ROWS)
+
+def test_readstationtable_unknown(tmp_path):
+    with pytest.raises(ValueError):
+        r.readstationtable(str(tmp_path/'stations.txt'))
+
+def test_pos_from_file(tmp_path):
+    fn = tmp_path/'stations.csv'
+    fn.write_text('grid,flag,xpos,ypos\n' + ''.join(f"{g},{f},{x},{y}\n" for g, f, x, y in ROWS))
+    assert rc.formatvalue('POS', str(fn)) == rc.formatvalue('POS', ROWS)
+
+    # A changed file is reread
+    st = os.stat(fn)
+    fn.write_text('grid,flag,xpos,ypos\n1,0,3,4\n')
+    os.utime(fn, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert rc.formatvalue('POS', str(fn)) == rc.formatvalue('POS', [[1, 0, 3, 4]])
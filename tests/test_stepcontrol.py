@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+from romscom.stepcontrol import AdaptiveStepControl
+
+
+def test_adaptive_period_doubles_up_to_max():
+    s = AdaptiveStepControl(period=timedelta(days=5), maxperiod=timedelta(days=30))
+    t = datetime(2000, 1, 1)
+    dt = timedelta(hours=1)
+    periods = []
+    lengths = []
+    for ii in range(4):
+        end, dtnew = s.blowup(t, dt, dt, periods)
+        lengths.append(end - t)
+        periods.append([t, end, dtnew])
+        t += timedelta(hours=1)
+    assert lengths == [timedelta(days=d) for d in (5, 10, 20, 30)]
+
+def test_adaptive_many_blowups_within_memory():
+    # Regression: period*2**nrecent overflowed timedelta after ~30 blowups
+    s = AdaptiveStepControl(period=timedelta(days=5), maxperiod=timedelta(days=30),
+                            memory=timedelta(days=60))
+    t = datetime(2000, 1, 1)
+    dt = timedelta(hours=1)
+    periods = []
+    for ii in range(200):
+        end, dtnew = s.blowup(t, dt, dt, periods)
+        assert timedelta(0) < end - t <= s.maxperiod
+        periods.append([t, end, dtnew])
+        t += timedelta(hours=6)
+    assert end - t + timedelta(hours=6) == s.maxperiod
+
+def test_adaptive_stops_at_smallest_level():
+    s = AdaptiveStepControl(factors=(2, 4))
+    t = datetime(2000, 1, 1)
+    dt = timedelta(hours=1)
+    assert s.blowup(t, dt, dt, [])[1] == dt/2
+    assert s.blowup(t, dt/2, dt, [])[1] == dt/4
+    assert s.blowup(t, dt/4, dt, []) is None
+
+def test_adaptive_stable_needs_several_blocks_and_minimum_length():
+    s = AdaptiveStepControl(nstable=3, minfrac=0.5)
+    t0 = datetime(2000, 1, 1)
+    period = [t0, t0 + timedelta(days=10), timedelta(minutes=30)]
+    steady = {'kinetic': [1.0, 1.01, 1.0]}
+    noisy = {'kinetic': [1.0, 2.0, 1.0]}
+
+    day = lambda n: t0 + timedelta(days=n)
+    assert not s.stable(day(1), steady, period)
+    assert not s.stable(day(2), noisy, period)   # resets the count
+    assert not s.stable(day(3), steady, period)
+    assert not s.stable(day(4), steady, period)
+    assert not s.stable(day(4.5), steady, period) # 3 in a row, but too early
+    assert s.stable(day(5), steady, period)
+
+def test_adaptive_stable_counts_per_period():
+    s = AdaptiveStepControl(nstable=2, minfrac=0)
+    t0 = datetime(2000, 1, 1)
+    p1 = [t0, t0 + timedelta(days=5), timedelta(minutes=30)]
+    p2 = [t0 + timedelta(days=1), t0 + timedelta(days=6), timedelta(minutes=15)]
+    steady = {'kinetic': [1.0, 1.0]}
+    assert not s.stable(t0 + timedelta(days=1), steady, p1)
+    assert not s.stable(t0 + timedelta(days=2), steady, p2)
+    assert s.stable(t0 + timedelta(days=3), steady, p2)
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import netCDF4 as nc
+import numpy as np
+import pytest
+
+import romscom.romscom as rc
+
+
+def _forcing(fname, var, units, days, calendar='standard'):
+    with nc.Dataset(fname, 'w') as f:
+        f.createDimension('t', None)
+        v = f.createVariable(var, 'f8', ('t',))
+        v.units = units
+        v.calendar = calendar
+        v[:] = days
+    return str(fname)
+
+def _ocean(**files):
+    d = {'DT': timedelta(hours=1), 'DSTART': datetime(2001, 1, 1),
+         'TIME_REF': datetime(1900, 1, 1)}
+    d.update(files)
+    return d
+
+def test_split_series_checked_as_a_whole(tmp_path):
+    f1 = _forcing(tmp_path/'a1.nc', 'time', 'days since 2001-01-01', np.arange(0, 20))
+    f2 = _forcing(tmp_path/'a2.nc', 'time', 'days since 2001-01-01', np.arange(20, 40))
+    rep = rc.validateinputs(_ocean(FRCNAME=[[f1, f2]]),
+                            start=datetime(2001, 1, 2), end=datetime(2001, 2, 1))
+    assert rep['ok'] and not rep['gaps']
+
+def test_entries_sharing_a_variable_name_checked_separately(tmp_path):
+    # Same time variable name, but unrelated files: the second doesn't cover
+    # the period, even though the two together would
+    f1 = _forcing(tmp_path/'wind.nc', 'time', 'days since 2001-01-01', np.arange(0, 20))
+    f2 = _forcing(tmp_path/'heat.nc', 'time', 'days since 2001-01-01', np.arange(20, 40))
+    rep = rc.validateinputs(_ocean(FRCNAME=[f1, f2]),
+                            start=datetime(2001, 1, 2), end=datetime(2001, 2, 1))
+    assert not rep['ok']
+    assert [g['files'] for g in rep['gaps']] == [[f1], [f2]]
+    assert rep['gaps'][1]['late'] == timedelta(days=19)
+
+@pytest.mark.parametrize('calendar', ['noleap', '360_day'])
+def test_nonstandard_calendars(tmp_path, calendar):
+    f1 = _forcing(tmp_path/'frc.nc', 'time', 'days since 2001-01-01', np.arange(0, 20),
+                  calendar=calendar)
+    rep = rc.validateinputs(_ocean(FRCNAME=f1), start=datetime(2001, 1, 2),
+                            end=datetime(2001, 1, 15))
+    assert rep['ok'] and not rep['unreadable']
+
+    rep = rc.validateinputs(_ocean(FRCNAME=f1), start=datetime(2001, 1, 2),
+                            end=datetime(2001, 2, 1))
+    assert not rep['unreadable']
+    assert rep['gaps'][0]['early'] is not None
+
+def test_nonstandard_calendar_missing_date_skipped(tmp_path):
+    f1 = _forcing(tmp_path/'frc.nc', 'time', 'days since 2004-01-01', np.arange(0, 90),
+                  calendar='noleap')
+    with pytest.warns(UserWarning, match='not checked'):
+        rep = rc.validateinputs(_ocean(FRCNAME=f1), start=datetime(2004, 2, 29),
+                                end=datetime(2004, 3, 15))
+    assert rep['ok']
@@ -0,0 +1,100 @@
+import pytest
+
+import romscom.varinfo as vi
+
+YAML = """# ROMS Input/Output metadata
+metadata:
+
+  - variable:       u                                  # Input/Output
+    long_name:      u-momentum component: averaged
+    units:          meter second-1                     # [m/s]
+    data:           [1, 2]
+    opts:           {a: 1, b: [x, y]}
+    flag:           [unclosed
+    scale:          1.0d0
+"""
+
+def test_yaml_values(tmp_path):
+    fn = tmp_path/'varinfo.yaml'
+    fn.write_text(YAML)
+    v = vi.readfile(str(fn), type='yaml', cache=False)
+    rec = v['u']
+    assert rec['long_name'] == 'u-momentum component: averaged'
+    assert rec['data'] == [1, 2]
+    assert rec['opts'] == {'a': 1, 'b': ['x', 'y']}
+    assert rec['flag'] == '[unclosed'
+
+def test_yaml_roundtrip(tmp_path):
+    fn = tmp_path/'varinfo.yaml'
+    fn.write_text(YAML)
+    v = vi.readfile(str(fn), type='yaml', cache=False)
+    out = tmp_path/'out.yaml'
+    vi.writefile(v, str(out), type='yaml')
+    text = out.read_text()
+    assert 'data:           [1, 2]' in text
+    assert '# [m/s]' in text
+    w = vi.readfile(str(out), type='yaml', cache=False)
+    assert list(w) == list(v)
+
+CLASSIC = """! Input/Output variable information
+
+'ocean_time'                                       ! Input/Output
+  'time since initialization'
+  'second'                                         ! [s]
+  'time, scalar, series'
+  'ocean_time'
+  'idtime'
+  'nulvar'
+  1.0d0
+
+'zeta'
+  'free-surface'
+  'meter'
+  'free-surface, scalar, series'
+  'ocean_time'
+  'idFsur'
+  'r2dvar'
+  1.0d0
+
+'u'
+  'u-momentum component'
+  'meter second-1'
+  'u-velocity, scalar, series'
+  'ocean_time'
+  'idUvel'
+  'u3dvar'
+  1.0E+00
+"""
+
+def test_classic_roundtrip(tmp_path):
+    fn = tmp_path/'varinfo.dat'
+    fn.write_text(CLASSIC)
+    v = vi.readfile(str(fn))
+    assert v.names() == ['ocean_time', 'zeta', 'u']
+    assert v['zeta']['units'] == 'meter'
+    assert v['u']['scale'] == '1.0E+00'
+
+    out = tmp_path/'out.dat'
+    vi.writefile(v, str(out))
+    w = vi.readfile(str(out))
+    assert w == v
+    vi.writefile(w, str(tmp_path/'out2.dat'))
+    assert (tmp_path/'out2.dat').read_text() == out.read_text()
+
+def test_classic_sequence(tmp_path):
+    # A VarInfo table behaves like the list of dictionaries readfile used to
+    # return
+    fn = tmp_path/'varinfo.dat'
+    fn.write_text(CLASSIC)
+    v = vi.readfile(str(fn))
+    recs = list(v)
+    assert len(v) == 3
+    assert isinstance(recs[0], dict) and recs[0]['variable'] == 'ocean_time'
+    assert v[0] == recs[0] and v[-1] == recs[-1]
+    assert v[1:] == recs[1:]
+    assert v == recs
+    assert [x['variable'] for x in reversed(v)] == ['u', 'zeta', 'ocean_time']
+    assert v.index(recs[2]) == 2
+    assert 'zeta' in v
+    with pytest.raises(IndexError):
+        v[3]